@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+from distributed import DistributedModel
+from frame_server import FrameServer
+from profiling import Profiler, JSONLinesSink
+from sir_model import SIRModel
+
+
+COLUMNS = ('step', 'susceptible', 'infected', 'recovered', 'quarantined')
+
+
+def run_model(model, steps, until_clear=True):
+    """
+    Step a model and record its status counts after every step.
+
+    Parameters
+    ----------
+    model : SIRModel
+        The model to run.
+    steps : int
+        The largest number of steps to run.
+    until_clear : bool, optional
+        Whether to stop early once no Node is infected or
+        quarantined, by default True.
+
+    Returns
+    -------
+    ndarray
+        Int64 array with one row per step (starting with the initial
+        state at step 0) and the columns of `COLUMNS`.
+    """
+    series = np.zeros((steps + 1, len(COLUMNS)), np.int64)
+    series[:, 0] = np.arange(steps + 1)
+    series[0, 1:] = model.status_counts()
+
+    for step in range(1, steps + 1):
+        model.model_step()
+        series[step, 1:] = counts = model.status_counts()
+        if until_clear and counts[1] + counts[3] == 0:
+            return series[:step + 1]
+    return series
+
+
+def write_series(path, series):
+    """
+    Write a time series of status counts to CSV, NPZ or Parquet,
+    chosen by the file extension.
+
+    Parameters
+    ----------
+    path : str
+        Output file path ending in `.csv`, `.npz` or `.parquet`.
+    series : ndarray
+        Output of `run_model`.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.csv':
+        np.savetxt(path, series, fmt='%d', delimiter=',',
+                   header=','.join(COLUMNS), comments='')
+    elif ext == '.npz':
+        np.savez(path, **dict(zip(COLUMNS, series.T)))
+    elif ext == '.parquet':
+        try:
+            import pandas as pd
+        except ImportError:
+            raise ImportError('writing Parquet requires pandas and pyarrow')
+        pd.DataFrame(series, columns=COLUMNS).to_parquet(path, index=False)
+    else:
+        raise ValueError(f'unsupported output format: {path}')
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description='Run the spatial SIR model without a GUI.')
+    parser.add_argument('mapfile', help='map image to simulate on')
+    parser.add_argument('-n', '--steps', type=int, default=1000,
+                        help='largest number of steps to run')
+    parser.add_argument('-o', '--output',
+                        help='time series output (.csv, .npz or .parquet)')
+    parser.add_argument('--population', type=int, default=400)
+    parser.add_argument('--carriers', type=int, default=8)
+    parser.add_argument('--attack-rate', type=float, default=0.8)
+    parser.add_argument('--recovery-rate', type=float, default=0.02)
+    parser.add_argument('--miasma-decay', type=int, default=2)
+    parser.add_argument('--miasma-diffusion', type=float, default=0.0)
+    parser.add_argument('--miasma-tile', type=int,
+                        help='store the miasma in tiles of this side')
+    parser.add_argument('--contact-radius', type=float, default=0)
+    parser.add_argument('--no-contact', action='store_true',
+                        help='disable person-to-person transmission')
+    parser.add_argument('--pathfinder', default='jps')
+    parser.add_argument('--path-workers', type=int,
+                        help='batch the path requests of every phase and '
+                             'plan them on this many processes (0: inline)')
+    parser.add_argument('--strips', type=int,
+                        help='split the map into this many row strips, '
+                             'each simulated by its own process')
+    parser.add_argument('--seed', type=int,
+                        help='seed that reproduces the run exactly')
+    parser.add_argument('--vectorized', action='store_true',
+                        help='use the structure-of-arrays population')
+    parser.add_argument('--event-driven', action='store_true',
+                        help='draw waiting times for recoveries and moves '
+                             'instead of rolling them every step '
+                             '(needs --vectorized or --strips)')
+    parser.add_argument('--map-cache',
+                        help='compiled map cache directory')
+    parser.add_argument('--no-map-cache', action='store_true',
+                        help='always recompile the map image')
+    parser.add_argument('--profile', action='store_true',
+                        help='print per-phase timings and counters')
+    parser.add_argument('--profile-log',
+                        help='write per-step timings as JSON lines')
+    parser.add_argument('--cprofile', action='store_true',
+                        help='print the functions the steps spent most time in')
+    parser.add_argument('--serve', type=int, metavar='PORT',
+                        help='stream the run to a browser viewer served '
+                             'on this port')
+    parser.add_argument('--serve-host', default='127.0.0.1',
+                        help='address the viewer is served on')
+    parser.add_argument('--serve-tile', type=int, default=16,
+                        help='side of the miasma tiles sent to the '
+                             'viewer (0: do not send miasma)')
+    parser.add_argument('--keep-going', action='store_true',
+                        help='run all steps even once no one is infected')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    if args.strips and (args.profile or args.profile_log or args.cprofile
+                        or args.path_workers is not None):
+        build_parser().error('--strips cannot be combined with profiling '
+                             'or --path-workers')
+    if args.strips and args.serve is not None:
+        build_parser().error('--strips cannot be combined with --serve')
+
+    start = time.perf_counter()
+    if args.strips:
+        model = DistributedModel(
+            args.mapfile, workers=args.strips,
+            population=args.population, carriers=args.carriers,
+            attack_rate=args.attack_rate, recovery_rate=args.recovery_rate,
+            miasma_decay=args.miasma_decay,
+            miasma_diffusion=args.miasma_diffusion,
+            miasma_tile=args.miasma_tile or 64,
+            pathfinder=args.pathfinder,
+            contact_transmission=not args.no_contact,
+            contact_radius=args.contact_radius,
+            event_driven=args.event_driven,
+            seed=args.seed,
+            map_cache=False if args.no_map_cache else args.map_cache or True)
+    else:
+        model = SIRModel(
+            args.mapfile,
+            population=args.population, carriers=args.carriers,
+            attack_rate=args.attack_rate, recovery_rate=args.recovery_rate,
+            vectorized=args.vectorized,
+            event_driven=args.event_driven,
+            miasma_decay=args.miasma_decay,
+            miasma_diffusion=args.miasma_diffusion,
+            miasma_tile=args.miasma_tile,
+            pathfinder=args.pathfinder,
+            contact_transmission=not args.no_contact,
+            contact_radius=args.contact_radius,
+            seed=args.seed,
+            map_cache=False if args.no_map_cache else args.map_cache or True,
+            path_workers=args.path_workers)
+    setup_time = time.perf_counter() - start
+
+    profiler = None
+    if args.profile or args.profile_log or args.cprofile:
+        sinks = [JSONLinesSink(args.profile_log)] if args.profile_log else []
+        profiler = Profiler(*sinks, cprofile=args.cprofile)
+        model.attach_profiler(profiler)
+
+    server = None
+    if args.serve is not None:
+        server = FrameServer(model.sir_map, args.serve_host, args.serve,
+                             args.serve_tile or None)
+        server.start()
+        print(f'Serving the viewer on http://{server.host}:{server.port}/')
+        model.attach_recorder(server)
+
+    start = time.perf_counter()
+    try:
+        series = run_model(model, args.steps, until_clear=not args.keep_going)
+    finally:
+        model.close()
+        if server is not None:
+            server.close()
+    run_time = time.perf_counter() - start
+    steps = len(series) - 1
+
+    if profiler is not None:
+        profiler.close()
+        if args.profile:
+            print(profiler.report())
+        if args.cprofile:
+            print(profiler.cprofile_stats())
+
+    if args.output:
+        write_series(args.output, series)
+
+    print(f'Setup time: {setup_time:.3f} s')
+    print(f'Steps: {steps} in {run_time:.3f} s '
+          f'({steps / run_time if run_time else float("inf"):.1f} steps/s)')
+    print('Final ' + ', '.join(
+        f'{name}: {count}' for name, count in zip(COLUMNS[1:], series[-1, 1:])))
+    return series
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
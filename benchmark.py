@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from map_generator import generate_floor_plan, save_map
+from pathing import Terrain, create_graph
+from sir_model import SIRMap, SIRModel
+
+
+def timed(func, *args, **kwargs):
+    """
+    Call a function and measure its wall time.
+
+    Returns
+    -------
+    (object, float)
+        The result and the seconds taken.
+    """
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def bench_case(mapfile, population, steps=50, warmup=5, vectorized=True,
+               pathfinder='jps', seed=0, memory=True):
+    """
+    Benchmark the setup and stepping of one model configuration.
+
+    The timings are taken first without tracing; peak memory is then
+    measured in a second, traced setup and `warmup` steps, since
+    tracemalloc slows allocation-heavy code down.
+
+    Parameters
+    ----------
+    mapfile : str
+        File path to map image.
+    population : int
+        Number of nodes.
+    steps : int, optional
+        Number of timed steady-state steps, by default 50.
+    warmup : int, optional
+        Number of untimed steps before them, by default 5.
+    vectorized : bool, optional
+        Whether to use the structure-of-arrays population, by default True.
+    pathfinder : str, optional
+        Path search backend, by default 'jps'.
+    seed : int, optional
+        Model seed, by default 0.
+    memory : bool, optional
+        Whether to measure peak memory, by default True.
+
+    Returns
+    -------
+    dict
+        Seconds for `map_load` (decoding, masks and graph),
+        `graph_build` (the graph alone), `flow_fields` and
+        `initial_paths` (placing the nodes and their first paths),
+        `steps_per_s` over the timed steps and `peak_mb`.
+    """
+    sir_map, map_load = timed(SIRMap, mapfile, pathfinder=pathfinder,
+                              cache=False)
+    _, graph_build = timed(create_graph, sir_map.walls)
+    compiled, flow_fields = timed(sir_map.compile)
+
+    def build():
+        return SIRModel(compiled, population=population,
+                        vectorized=vectorized, pathfinder=pathfinder,
+                        seed=seed)
+
+    model, initial_paths = timed(build)
+    for _ in range(warmup):
+        model.model_step()
+    start = time.perf_counter()
+    for _ in range(steps):
+        model.model_step()
+    step_time = time.perf_counter() - start
+
+    result = dict(
+        map_load=map_load, graph_build=graph_build,
+        flow_fields=flow_fields, initial_paths=initial_paths,
+        steps_per_s=steps / step_time if step_time else float('inf'),
+        peak_mb=None)
+
+    if memory:
+        tracemalloc.start()
+        try:
+            model = SIRModel(mapfile, population=population,
+                             vectorized=vectorized, pathfinder=pathfinder,
+                             seed=seed, map_cache=False)
+            for _ in range(warmup):
+                model.model_step()
+            result['peak_mb'] = tracemalloc.get_traced_memory()[1] / 2**20
+        finally:
+            tracemalloc.stop()
+    return result
+
+
+def run_suite(sizes, room_sizes, clutters, populations, steps=50, warmup=5,
+              backends=('vectorized',), pathfinder='jps', seed=0,
+              memory=True, workdir=None):
+    """
+    Benchmark every combination of map and model parameters.
+
+    Parameters
+    ----------
+    sizes, room_sizes, clutters : sequence
+        Map sides, room sizes and clutter levels of the generated maps.
+    populations : sequence of int
+        Population sizes to run on every map.
+    backends : sequence of str, optional
+        'vectorized' and/or 'object', by default ('vectorized',).
+    workdir : str, optional
+        Directory for the generated map images, by default a
+        temporary one.
+
+    Other parameters are passed to `bench_case`.
+
+    Yields
+    ------
+    dict
+        One record per case, holding its parameters, the map's
+        measured wall fraction and the `bench_case` results.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = workdir or tmp
+        for size, room_size, clutter in itertools.product(
+                sizes, room_sizes, clutters):
+            mapfile = os.path.join(
+                workdir, f'plan_{size}_{room_size}_{clutter}_{seed}.png')
+            img = generate_floor_plan(size, room_size, clutter, seed=seed)
+            save_map(img, mapfile)
+            walls = float(np.mean(np.all(img == Terrain.WALL, axis=2)))
+
+            for population, backend in itertools.product(
+                    populations, backends):
+                record = dict(
+                    size=size, room_size=room_size, clutter=clutter,
+                    wall_fraction=walls, population=population,
+                    backend=backend, pathfinder=pathfinder, steps=steps)
+                record.update(bench_case(
+                    mapfile, population, steps, warmup,
+                    backend == 'vectorized', pathfinder, seed, memory))
+                yield record
+
+
+def environment():
+    """
+    Describe the machine and library versions of a run.
+
+    Returns
+    -------
+    dict
+        Python and numpy versions, platform and start time.
+    """
+    return dict(python=platform.python_version(), numpy=np.__version__,
+                platform=platform.platform(), processor=platform.processor(),
+                time=time.strftime('%Y-%m-%dT%H:%M:%S'))
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the SIR model on generated floor plans.')
+    parser.add_argument('-o', '--output',
+                        help='JSON lines file to write, by default stdout')
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[100, 250, 500, 1000, 2000])
+    parser.add_argument('--room-sizes', type=int, nargs='+', default=[16])
+    parser.add_argument('--clutter', type=float, nargs='+', default=[0.0])
+    parser.add_argument('--populations', type=int, nargs='+',
+                        default=[100, 400, 1600])
+    parser.add_argument('--backends', nargs='+', default=['vectorized'],
+                        choices=['vectorized', 'object'])
+    parser.add_argument('--pathfinder', default='jps')
+    parser.add_argument('-n', '--steps', type=int, default=50)
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-memory', action='store_true',
+                        help='skip the traced peak memory pass')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    out = open(args.output, 'w') if args.output else sys.stdout
+    env = environment()
+    try:
+        for record in run_suite(
+                args.sizes, args.room_sizes, args.clutter, args.populations,
+                args.steps, args.warmup, args.backends, args.pathfinder,
+                args.seed, not args.no_memory):
+            out.write(json.dumps({**env, **record}) + '\n')
+            out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
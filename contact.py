@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+
+class SpatialHash:
+    """Points binned into square cells of the map grid
+
+       The points are sorted by the flat index of their bin, so all the
+       points of a bin are one contiguous run that can be found with a
+       binary search. Finding every pair within a radius then costs
+       O(N log N) plus the number of pairs.
+
+       Attributes
+        ----------
+        cell_size : integer
+            The side of a bin, at least the query radius
+        keys : ndarray
+            The sorted bin keys of the points
+        order : ndarray
+            The original index of every sorted point
+        x : ndarray
+            The sorted X coordinates of the points
+        y : ndarray
+            The sorted Y coordinates of the points
+    """
+    def __init__(self, x, y, cell_size=1):
+        self.cell_size = max(int(cell_size), 1)
+        self.stride = int(np.max(y, initial=0)) // self.cell_size + 3
+
+        keys = self._key(np.asarray(x), np.asarray(y))
+        self.order = np.argsort(keys, kind='stable')
+        self.keys = keys[self.order]
+        self.x = np.asarray(x)[self.order]
+        self.y = np.asarray(y)[self.order]
+
+    def _key(self, x, y, dx=0, dy=0):
+        bx = x // self.cell_size + 1 + dx
+        by = np.clip(y // self.cell_size + 1 + dy, 0, self.stride - 1)
+        return bx * self.stride + by
+
+    def pairs(self, x, y, radius=0):
+        """Finds all pairs of query and stored points within a radius
+
+        Parameters
+        ----------
+        x : ndarray
+            The X coordinates of the query points
+        y : ndarray
+            The Y coordinates of the query points
+        radius : float, optional
+            The largest Euclidean distance of a pair, by default 0
+            (points on the same position)
+
+        Returns
+        -------
+        (ndarray, ndarray)
+            The index of the query point and the original index of the
+            stored point of every pair
+        """
+        if radius > self.cell_size:
+            raise ValueError('radius is larger than the cell size')
+        x, y = np.asarray(x), np.asarray(y)
+        reach = (0,) if radius < 1 else (-1, 0, 1)
+
+        queries, points = [], []
+        for dx in reach:
+            for dy in reach:
+                keys = self._key(x, y, dx, dy)
+                lo = np.searchsorted(self.keys, keys, 'left')
+                hi = np.searchsorted(self.keys, keys, 'right')
+                counts = hi - lo
+                query = np.repeat(np.arange(x.size), counts)
+                point = np.arange(counts.sum()) + np.repeat(
+                    lo - (np.cumsum(counts) - counts), counts)
+
+                near = ((self.x[point] - x[query]) ** 2
+                        + (self.y[point] - y[query]) ** 2) <= radius ** 2
+                queries.append(query[near])
+                points.append(self.order[point[near]])
+
+        return np.concatenate(queries), np.concatenate(points)
+
+    def count(self, x, y, radius=0):
+        """Counts the stored points within a radius of each query point
+
+        Parameters
+        ----------
+        x : ndarray
+            The X coordinates of the query points
+        y : ndarray
+            The Y coordinates of the query points
+        radius : float, optional
+            The largest Euclidean distance counted, by default 0
+
+        Returns
+        -------
+        ndarray
+            The number of stored points near every query point
+        """
+        queries, _ = self.pairs(x, y, radius)
+        return np.bincount(queries, minlength=np.size(x))
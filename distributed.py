@@ -0,0 +1,439 @@
+# -*- coding: utf-8 -*-
+
+import multiprocessing
+import os
+import traceback
+
+import numpy as np
+
+from rng import BlockRandom, spawn_seeds
+from sharedmem import share_arrays, attach_arrays, release_arrays
+from sir_model import SIRMap, SIRModel, SIRStatus
+
+
+STATE_FIELDS = ('x', 'y', 'status', 'urgency')
+
+
+def partition_rows(walkable, parts, min_rows=1):
+    """
+    Split the rows of a map into strips holding similar amounts of floor.
+
+    Parameters
+    ----------
+    walkable : ndarray
+        Boolean mask in 2d of the cells nodes can stand on.
+    parts : int
+        Number of strips.
+    min_rows : int, optional
+        Fewest rows of a strip, by default 1.
+
+    Returns
+    -------
+    ndarray
+        The `parts + 1` strip bounds; strip `k` is the rows
+        `bounds[k]:bounds[k + 1]`.
+    """
+    rows = walkable.shape[0]
+    if parts * min_rows > rows:
+        raise ValueError(
+            f'cannot split {rows} rows into {parts} strips of {min_rows}')
+    floor = np.cumsum(walkable.sum(axis=1))
+    cuts = np.searchsorted(floor, floor[-1] * np.arange(1, parts) / parts) + 1
+    bounds = np.concatenate(([0], cuts, [rows])).astype(np.intp)
+    for k in range(1, parts):
+        bounds[k] = max(bounds[k], bounds[k - 1] + min_rows)
+    for k in range(parts - 1, 0, -1):
+        bounds[k] = min(bounds[k], bounds[k + 1] - min_rows)
+    return bounds
+
+
+def split_state(state, n):
+    """
+    Split the state of nodes from `Population.take` after `n` nodes.
+
+    Returns
+    -------
+    (dict, dict)
+        The state of the first `n` nodes and of the rest.
+    """
+    cut = int(state['path_lengths'][:n].sum())
+    head = {name: state[name][:n] for name in STATE_FIELDS}
+    tail = {name: state[name][n:] for name in STATE_FIELDS}
+    head['path_lengths'] = state['path_lengths'][:n]
+    tail['path_lengths'] = state['path_lengths'][n:]
+    head['waypoints'] = state['waypoints'][:cut]
+    tail['waypoints'] = state['waypoints'][cut:]
+    return head, tail
+
+
+def merge_states(*states):
+    """
+    Join the states of nodes from `Population.take`, skipping Nones.
+    """
+    states = [state for state in states if state is not None]
+    return {name: np.concatenate([state[name] for state in states])
+            for name in STATE_FIELDS + ('waypoints', 'path_lengths')}
+
+
+class StripWorker:
+    """The nodes and miasma of one strip of map rows
+
+       Steps like `SIRModel.model_step` on the nodes standing in rows
+       `x0:x1`, swapping with the workers of the strips above and
+       below, in turn:
+
+       * the edge rows of the miasma, once it has been spread, which
+         is all the exposure and the diffusion of the strip reads
+         from outside it,
+       * the contagious nodes within contact range of the edges,
+       * and finally the nodes that left the strip.
+
+       Nodes move at most one cell per step, so they never end a step
+       past the row next to their strip.
+
+       Attributes
+        ----------
+        model : SIRModel
+            The vectorized model holding the nodes of the strip; its
+            map and miasma are full size, but only the strip rows are
+            kept up to date
+        rank : integer
+            The number of the strip, from the top
+        bounds : ndarray
+            The bounds of all strips, as from `partition_rows`
+        x0, x1 : integer
+            The rows of this strip
+        up, down : Connection or None
+            Pipes to the workers of the strips above and below
+        reach : integer
+            How far past a strip edge contacts are looked for
+    """
+    def __init__(self, compiled, bounds, rank, up, down, seed, params,
+                 population=0, carriers=0):
+        self.model = SIRModel(compiled, population=population,
+                              carriers=carriers, vectorized=True,
+                              seed=seed, **params)
+        self.population = self.model.population
+        self.field = self.model.sir_map.miasma_field
+        self.rank = rank
+        self.bounds = bounds
+        self.x0, self.x1 = int(bounds[rank]), int(bounds[rank + 1])
+        self.up, self.down = up, down
+        self.reach = int(np.ceil(self.model.contact_radius)) + 1
+
+    def _exchange(self, to_up, to_down):
+        # the lower strip of every pair sends first, so the swaps run
+        # down the chain of strips and never wait on each other
+        from_up = from_down = None
+        if self.up is not None:
+            from_up = self.up.recv()
+            self.up.send(to_up)
+        if self.down is not None:
+            self.down.send(to_down)
+            from_down = self.down.recv()
+        return from_up, from_down
+
+    def place(self, state):
+        """Adds new nodes and sends them towards the target region
+
+        Parameters
+        ----------
+        state : dict
+            The state of the nodes, as from `Population.take`
+
+        Returns
+        -------
+        ndarray
+            The status counts of the strip
+        """
+        first = len(self.population)
+        self.population.extend(state)
+        for i in range(first, len(self.population)):
+            self.population[i].pathfind_region('target')
+        return self.model.status_counts()
+
+    def status_counts(self):
+        """Counts the nodes of every status in the strip
+        """
+        return self.model.status_counts()
+
+    def step(self):
+        """Steps the nodes of the strip forward one iteration
+
+        Returns
+        -------
+        ndarray
+            The status counts of the strip
+        """
+        model, population = self.model, self.population
+        population.droplet_spread()
+        self._swap_halo()
+        population.convalesce(model.recovery_rate)
+        model.plan_paths()
+        population.move()
+        population.droplet_expose()
+        self.field.ventilate()
+        self._clear_outside()
+
+        if model.contact_transmission:
+            population.contact_expose(
+                model.attack_rate, model.contact_radius, self._swap_sources())
+
+        model.plan_paths()
+        model.steps += 1
+        self._migrate()
+        return model.status_counts()
+
+    def _swap_halo(self):
+        x0, x1 = self.x0, self.x1
+        above, below = self._exchange(
+            self.field.rows(x0, x0 + 1), self.field.rows(x1 - 1, x1))
+        if above is not None:
+            self.field.load_rows(x0 - 1, above)
+        if below is not None:
+            self.field.load_rows(x1, below)
+
+    def _clear_outside(self):
+        # the halo rows diffused one row further out; both are stale
+        height, width = self.model.sir_map.shape
+        for start, stop in ((max(self.x0 - 2, 0), self.x0),
+                            (self.x1, min(self.x1 + 2, height))):
+            if stop > start:
+                self.field.load_rows(
+                    start, np.zeros((stop - start, width), np.uint8))
+
+    def _swap_sources(self):
+        population = self.population
+        contagious = population.members(SIRStatus.INFECTED)
+        x, y = population.x[contagious], population.y[contagious]
+        top = x < self.x0 + self.reach
+        bottom = x >= self.x1 - self.reach
+        above, below = self._exchange((x[top], y[top]),
+                                      (x[bottom], y[bottom]))
+        sources = [s for s in (above, below) if s is not None]
+        if not sources:
+            return None
+        return (np.concatenate([s[0] for s in sources]),
+                np.concatenate([s[1] for s in sources]))
+
+    def _migrate(self):
+        x = self.population.x
+        up = np.flatnonzero(x < self.x0)
+        down = np.flatnonzero(x >= self.x1)
+        owner = np.searchsorted(self.bounds, x[up], 'right') - 1
+        owner = np.concatenate(
+            (owner, np.searchsorted(self.bounds, x[down], 'right') - 1))
+        if np.any(np.abs(owner - self.rank) > 1):
+            raise RuntimeError('a node moved past the neighbouring strip')
+
+        # taking or adding nodes rebuilds the status index, so it is
+        # skipped when none cross, as a lone strip never sees
+        to_up = to_down = None
+        if up.size or down.size:
+            state = self.population.take(np.concatenate((up, down)))
+            to_up, to_down = split_state(state, up.size)
+        above, below = self._exchange(to_up if up.size else None,
+                                      to_down if down.size else None)
+        if above is not None or below is not None:
+            self.population.extend(merge_states(above, below))
+
+    def state_arrays(self):
+        """Copies the coordinates, statuses and urgencies of the strip
+        """
+        return tuple(np.array(a) for a in self.model.state_arrays())
+
+    def miasma(self):
+        """Copies the miasma of the strip rows
+        """
+        return self.field.rows(self.x0, self.x1)
+
+
+def _serve(specs, bounds, rank, conn, up, down, seed, params, placed):
+    blocks, compiled = attach_arrays(specs)
+    try:
+        worker = StripWorker(compiled, bounds, rank, up, down, seed, params,
+                             *placed)
+        while True:
+            command, args = conn.recv()
+            if command == 'close':
+                break
+            conn.send(('ok', getattr(worker, command)(*args)))
+    except Exception:
+        # exiting closes the pipes, which fails the neighbours in turn
+        conn.send(('error', traceback.format_exc()))
+    finally:
+        release_arrays(blocks)
+
+
+class DistributedModel:
+    """One simulation split over worker processes by map rows
+
+       The map is cut into horizontal strips, each simulated by a
+       StripWorker in its own process over the shared compiled map.
+       Every step the workers swap the miasma rows, contagious nodes
+       and leaving nodes at their edges with their neighbours through
+       pipes, so each process holds and steps only its share of the
+       nodes. Each strip draws from its own random stream, so a run
+       is statistically equivalent to, but not the same as, a
+       single-process SIRModel with the same seed. A single worker
+       places the nodes itself from the seed and runs exactly like a
+       vectorized SIRModel with it.
+
+       With the default tiled miasma every worker also allocates
+       miasma only inside its strip.
+
+       Attributes
+        ----------
+        bounds : ndarray
+            The strip bounds, as from `partition_rows`
+        steps : integer
+            The number of steps simulated so far
+        counts : ndarray
+            The status counts after the last step
+    """
+    def __init__(self, mapfile, workers=None, population=400, carriers=8,
+                 seed=None, miasma_tile=64, map_cache=False, **params):
+        """
+        Parameters
+        ----------
+        mapfile : str or dict
+            File path to map image, or the arrays of a compiled map.
+        workers : int, optional
+            Number of strips and processes, by default one per CPU.
+        population, carriers, seed, miasma_tile, map_cache
+            As for SIRModel, except that the miasma is tiled by default.
+        **params
+            Other SIRModel parameters; the population is always
+            vectorized.
+        """
+        workers = workers or os.cpu_count()
+        params['miasma_tile'] = miasma_tile
+        sir_map = SIRMap(mapfile, cache=map_cache)
+        reach = int(np.ceil(params.get('contact_radius', 0))) + 1
+        self.bounds = partition_rows(~sir_map.walls, workers, reach + 1)
+        self.steps = 0
+
+        seeds = spawn_seeds(seed, workers + 1)
+        # a lone strip holds the whole map and builds the model as is
+        alone = workers == 1
+        if alone:
+            seeds[1] = seed
+        self._blocks, specs = share_arrays(sir_map.compile())
+        links = [multiprocessing.Pipe() for _ in range(workers - 1)]
+        self._conns, self._processes = [], []
+        try:
+            for rank in range(workers):
+                conn, child = multiprocessing.Pipe()
+                up = links[rank - 1][1] if rank > 0 else None
+                down = links[rank][0] if rank < workers - 1 else None
+                process = multiprocessing.Process(
+                    target=_serve, daemon=True,
+                    args=(specs, self.bounds, rank, child, up, down,
+                          seeds[rank + 1], params,
+                          (population, carriers) if alone else (0, 0)))
+                process.start()
+                self._conns.append(conn)
+                self._processes.append(process)
+            if alone:
+                self.counts = self._call('status_counts')[0]
+            else:
+                self._place(
+                    sir_map, population, carriers, BlockRandom(seeds[0]))
+        except BaseException:
+            self.close()
+            raise
+
+    def _place(self, sir_map, population, carriers, rng):
+        x, y = sir_map.sample('start', population, rng)
+        status = np.full(population, SIRStatus.SUSCEPTIBLE.value, np.uint8)
+        status[:carriers] = SIRStatus.INFECTED.value
+        urgency = rng.uniform(0.4, 0.95, population)
+
+        owner = np.searchsorted(self.bounds, x, 'right') - 1
+        states = []
+        for rank in range(len(self._conns)):
+            mine = owner == rank
+            states.append(dict(
+                x=x[mine], y=y[mine], status=status[mine],
+                urgency=urgency[mine], waypoints=np.zeros(0, np.int32),
+                path_lengths=np.zeros(mine.sum(), np.int64)))
+        self.counts = np.sum(self._call('place', states), axis=0)
+
+    def _call(self, command, per_worker=None):
+        for k, conn in enumerate(self._conns):
+            conn.send((command, () if per_worker is None
+                       else (per_worker[k],)))
+        results, errors = [], []
+        for rank, conn in enumerate(self._conns):
+            try:
+                status, result = conn.recv()
+            except EOFError:
+                status, result = 'error', 'worker exited'
+            if status == 'error':
+                errors.append(f'strip {rank}: {result}')
+            results.append(result)
+        if errors:
+            self.close()
+            raise RuntimeError('strip worker failed\n' + '\n'.join(errors))
+        return results
+
+    def model_step(self):
+        """Steps the simulation forward one iteration
+        """
+        self.counts = np.sum(self._call('step'), axis=0)
+        self.steps += 1
+
+    def status_counts(self):
+        """Counts the Nodes of every status
+
+        Returns
+        -------
+        ndarray
+            The number of Nodes of each SIRStatus, in definition order
+        """
+        return self.counts.copy()
+
+    def state_arrays(self):
+        """Collects the per-node state of all strips
+
+        Returns
+        -------
+        (ndarray, ndarray, ndarray, ndarray)
+            The X and Y coordinates, SIRStatus values and urgencies
+            of all Nodes, strip by strip
+        """
+        return tuple(np.concatenate(arrays)
+                     for arrays in zip(*self._call('state_arrays')))
+
+    def miasma(self):
+        """Collects the miasma of all strips
+
+        Returns
+        -------
+        ndarray
+            uint8 matrix the size of the map
+        """
+        return np.concatenate(self._call('miasma'))
+
+    def close(self):
+        """Stops the workers and frees the shared map
+        """
+        for conn in self._conns:
+            try:
+                conn.send(('close', ()))
+            except OSError:
+                pass
+        for process in self._processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        self._conns, self._processes = [], []
+        release_arrays(self._blocks, unlink=True)
+        self._blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
@@ -6,26 +6,59 @@ Created on Tue May  5 13:22:16 2020
 """
 
 import sys
-import threading, time
+import queue, threading, time
 
-from PyQt5.QtCore import Qt
+import numpy as np
+from PyQt5.QtCore import Qt, QTimer
 from PyQt5.QtWidgets import QApplication, QWidget, QPushButton
 from PyQt5.QtGui import QPainter, QPen, QColor
 from PyQt5.QtCore import QPoint, QLine
 
 from mpl_widget import MplWidget
-from sir_model import SIRModel
+from sir_model import SIRModel, SIRStatus
 
 
 class SIRViewer(MplWidget):
     """The frontend viewer for the simulation
-    """   
-    def __init__(self, parent):
+
+    The model runs in a producer thread as fast as it can and copies
+    the agent coordinates of every step into a frame. Frames go through
+    a bounded queue to a timer on the Qt main thread, which draws only
+    the newest one at a fixed rate; older frames are dropped, so the
+    simulation never waits for the renderer. Only the main thread
+    touches Qt and matplotlib.
+
+    With `blit` the map image and axes are rendered once into a cached
+    background, and every frame only redraws the agent markers over it.
+    The snapshot buffers of the frames are recycled, though matplotlib
+    still copies the coordinates into the artists on every render.
+    """
+    # statuses drawn by each of the agent artists
+    GROUPS = (
+        (SIRStatus.SUSCEPTIBLE,),
+        (SIRStatus.INFECTED, SIRStatus.QUARANTINED),
+        (SIRStatus.RECOVERED,))
+
+    def __init__(self, parent, blit=True, fps=30, queue_size=2):
         super().__init__(parent)
+        self.model = None
         self._plot_ref = None
+        self.blit = blit
+        self._background = None
+
+        self.frames = queue.Queue(maxsize=queue_size)
+        self._free = queue.Queue()
+        self.timer = QTimer(self)
+        self.timer.setInterval(int(1000 / fps))
+        self.timer.timeout.connect(self.consume)
 
         self.n_iter = 0
+        self.n_frames = 0
+        self.n_dropped = 0
+        # frames are dropped by both the producer and the Qt thread
+        self._drop_lock = threading.Lock()
         self.model_time = 0
+        self.snapshot_time = 0
         self.plot_time = 0
         self.gui_time = 0
         self.start_time = time.perf_counter()
@@ -33,30 +66,104 @@ class SIRViewer(MplWidget):
     def draw_init(self):
         ref_s = self.plot(
             *self.prepare(self.model.list_susceptible()), 
-            fmt='o', ms=4, c=[0.7, 0.7, 0], mec="black")
+            fmt='o', ms=4, c=[0.7, 0.7, 0], mec="black", animated=self.blit)
         ref_i = self.plot(
             *self.prepare(self.model.list_infected()), 
-            fmt='o', ms=4, c=[1, 0, 0], mec="black")
+            fmt='o', ms=4, c=[1, 0, 0], mec="black", animated=self.blit)
         ref_r = self.plot(
             *self.prepare(self.model.list_recovered()), 
-            fmt='o', ms=4, c=[0, 1, 0], mec="black")
+            fmt='o', ms=4, c=[0, 1, 0], mec="black", animated=self.blit)
         self._plot_ref = [ref_s[0], ref_i[0], ref_r[0]]
 
+        if self.blit:
+            self.canvas.mpl_connect('draw_event', self._cache_background)
+
         self.canvas.draw()
         self.canvas.flush_events()
-        
-    def draw(self):
-        """Updates the QPoint lists with new values of locations of Nodes
+
+    def _cache_background(self, event):
+        """Caches the freshly drawn map and axes, then draws the agents
         """
-        for idx, method in enumerate([
-            self.model.list_susceptible,
-            self.model.list_infected,
-            self.model.list_recovered]):
-            self._plot_ref[idx].set_data(*self.prepare(method()))
+        self._background = self.canvas.copy_from_bbox(self.canvas.ax.bbox)
+        for line in self._plot_ref:
+            self.canvas.ax.draw_artist(line)
 
-        self.canvas.draw()
+    def snapshot(self):
+        """Copies the coordinates of every drawn group out of the model
+
+        Returns
+        -------
+        (integer, ndarray, list)
+            The model step, a `(2, n)` array holding the X and Y
+            coordinates of all groups one after another, and the
+            offsets where each group starts and the last one ends
+        """
+        try:
+            coords = self._free.get_nowait()
+        except queue.Empty:
+            coords = np.empty((2, len(self.model.population)), np.intp)
+
+        bounds = [0]
+        for statuses in self.GROUPS:
+            bounds.append(bounds[-1] + self.model.fill_coordinates(
+                coords[:, bounds[-1]:], *statuses))
+        return self.model.steps, coords, bounds
+
+    def _recycle(self, frame):
+        self._free.put(frame[1])
+
+    def _drop(self, frame):
+        self._recycle(frame)
+        with self._drop_lock:
+            self.n_dropped += 1
+
+    def publish(self, frame):
+        """Queues a frame, dropping the oldest one if the queue is full
+
+        Parameters
+        ----------
+        frame : tuple
+            A frame made by `snapshot`
+        """
+        while True:
+            try:
+                self.frames.put_nowait(frame)
+                return
+            except queue.Full:
+                pass
+            try:
+                self._drop(self.frames.get_nowait())
+            except queue.Empty:
+                pass
+
+    def render(self, frame):
+        """Moves the agent markers to the positions of a frame
+
+        Parameters
+        ----------
+        frame : tuple
+            A frame made by `snapshot`
+        """
+        _, coords, bounds = frame
+        for line, lo, hi in zip(self._plot_ref, bounds, bounds[1:]):
+            line.set_data(coords[1, lo:hi], coords[0, lo:hi])
+
+        if self.blit:
+            self.canvas.restore_region(self._background)
+            for line in self._plot_ref:
+                self.canvas.ax.draw_artist(line)
+            self.canvas.blit(self.canvas.ax.bbox)
+        else:
+            self.canvas.draw()
         self.canvas.flush_events()
 
+    def draw(self):
+        """Draws the current state of the model
+        """
+        frame = self.snapshot()
+        self.render(frame)
+        self._recycle(frame)
+
     def prepare(self, data):
         if data.shape == (0,):
             return data.reshape(2, -1)
@@ -75,9 +182,11 @@ class SIRViewer(MplWidget):
         self.draw_init()
         
     def force_update(self):
-        """Steps and updates the model and viewer
+        """Steps the model and draws the result on the calling thread
         """
         if self.model:
+            # stepped here rather than with `step`, whose queued frame
+            # no timer would consume
             self.n_iter += 1
             start = time.perf_counter()
             self.model.model_step()
@@ -88,54 +197,103 @@ class SIRViewer(MplWidget):
             start = time.perf_counter()
             self.update()
             self.gui_time += time.perf_counter() - start
+            self.n_frames += 1
+
+    def step(self):
+        """Steps the model once and queues the resulting frame
+        """
+        self.n_iter += 1
+        start = time.perf_counter()
+        self.model.model_step()
+        self.model_time += time.perf_counter() - start
+        start = time.perf_counter()
+        frame = self.snapshot()
+        self.snapshot_time += time.perf_counter() - start
+        self.publish(frame)
+
+    def consume(self):
+        """Draws the newest queued frame and drops the older ones
+        """
+        frame = None
+        while True:
+            try:
+                newer = self.frames.get_nowait()
+            except queue.Empty:
+                break
+            if frame is not None:
+                self._drop(frame)
+            frame = newer
+        if frame is None:
+            return
+
+        start = time.perf_counter()
+        self.render(frame)
+        self._recycle(frame)
+        self.plot_time += time.perf_counter() - start
+        start = time.perf_counter()
+        self.update()
+        self.gui_time += time.perf_counter() - start
+        self.n_frames += 1
 
     def run_sim(self, stop):
-        print(type(stop))
-        """Runs the simulation while the stop event is not set
+        """Steps the simulation while the stop event is not set
 
         Parameters
         ----------
         stop : threading.Event
             The Event that stops the thread
         """
-        while not stop.isSet():
-            # time.sleep(0.1)
-            self.force_update()
+        while not stop.is_set():
+            self.step()
 
     def thread_start(self):
-        """Starts the thread for simulation
+        """Starts the simulation thread and the display timer
         """
         self.stop = threading.Event()
         self.c_thread = threading.Thread(target=self.run_sim, args=(self.stop,))
-        self.c_thread.start() 
+        self.start_time = time.perf_counter()
+        self.c_thread.start()
+        self.timer.start()
 
     def thread_cancel(self):
         """Kills the thread and ends the program
         """
+        self.stop.set()
+        self.c_thread.join()
+        self.timer.stop()
+        run_time = time.perf_counter() - self.start_time
+        n_iter, n_frames = max(self.n_iter, 1), max(self.n_frames, 1)
+
         print('='*50)
         print('Simulation Statistics')
         print('-'*50)
-        print(f'Final susceptible: {len(self.model.list_susceptible())}')
-        print(f'Final infected: {len(self.model.list_infected())}')
-        print(f'Final recovered: {len(self.model.list_recovered())}')
+        susceptible, infected, recovered, quarantined = \
+            self.model.status_counts()
+        print(f'Final susceptible: {susceptible}')
+        print(f'Final infected: {infected + quarantined}')
+        print(f'Final recovered: {recovered}')
 
         print('='*50)
         print('Performance Statistics')
         print('-'*50)
         print(f'Total iterations: {self.n_iter}')
-        print(f'Total run time: {time.perf_counter()-self.start_time}')
+        print(f'Total frames drawn: {self.n_frames}')
+        print(f'Total frames dropped: {self.n_dropped}')
+        print(f'Total run time: {run_time}')
         print(f'Total model step time: {self.model_time}')
+        print(f'Total snapshot time: {self.snapshot_time}')
         print(f'Total plotting time: {self.plot_time}')
         print(f'Total gui update time: {self.gui_time}')
 
         print('-'*50)
-        print(f'Avg iter time: {(time.perf_counter()-self.start_time)/self.n_iter}')
-        print(f'Avg model step time: {self.model_time/self.n_iter}')
-        print(f'Avg plotting time: {self.plot_time/self.n_iter}')
-        print(f'Avg gui update time: {self.gui_time/self.n_iter}')
+        print(f'Avg iter time: {run_time/n_iter}')
+        print(f'Avg model step time: {self.model_time/n_iter}')
+        print(f'Avg snapshot time: {self.snapshot_time/n_iter}')
+        print(f'Avg frame time: {run_time/n_frames}')
+        print(f'Avg plotting time: {self.plot_time/n_frames}')
+        print(f'Avg gui update time: {self.gui_time/n_frames}')
         print('='*50)
 
-        self.stop.set()
         self.close()
         sys.exit() 
 
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+
+import itertools
+import multiprocessing
+
+import numpy as np
+
+from batch_runner import run_model
+from rng import spawn_seeds
+from sharedmem import share_arrays, attach_arrays, release_arrays
+from sir_model import SIRMap, SIRModel
+
+
+# compiled map of this worker process, attached by _attach
+_MAP = None
+_BLOCKS = []
+
+
+def _attach(specs):
+    global _MAP, _BLOCKS
+    _BLOCKS, _MAP = attach_arrays(specs)
+
+
+def _run(task):
+    key, params, seed, steps, until_clear = task
+    model = SIRModel(_MAP, seed=seed, **params)
+    try:
+        return key, run_model(model, steps, until_clear)
+    finally:
+        model.close()
+
+
+def parameter_grid(**axes):
+    """
+    Build every combination of the given parameter values.
+
+    Parameters
+    ----------
+    **axes : list
+        Values to sweep for every SIRModel parameter,
+        e.g. `attack_rate=[0.4, 0.8]`.
+
+    Returns
+    -------
+    list of dict
+        One dict of SIRModel keyword arguments per combination.
+    """
+    names = list(axes)
+    return [dict(zip(names, values))
+            for values in itertools.product(*axes.values())]
+
+
+class CurveAggregator:
+    """
+    Replicate time series of one parameter set and their percentiles.
+
+    Runs that end early (once no one is infected) are held at their
+    final counts up to the length of the longest run.
+
+    Attributes
+    ----------
+    params : dict
+        The SIRModel parameters of the runs.
+    series : list of ndarray
+        The `batch_runner.run_model` output of every run so far.
+    """
+    def __init__(self, params):
+        self.params = params
+        self.series = []
+
+    def __len__(self):
+        return len(self.series)
+
+    def add(self, series):
+        self.series.append(series)
+
+    def stacked(self):
+        """
+        Stack the status counts of all runs.
+
+        Returns
+        -------
+        ndarray
+            Array of shape `(runs, steps + 1, 4)` of S/I/R/Q counts.
+        """
+        length = max(len(s) for s in self.series)
+        stacked = np.empty((len(self.series), length, 4), np.int64)
+        for run, series in enumerate(self.series):
+            stacked[run, :len(series)] = series[:, 1:]
+            stacked[run, len(series):] = series[-1, 1:]
+        return stacked
+
+    def percentiles(self, q=(5, 50, 95)):
+        """
+        Compute percentile curves over the runs so far.
+
+        Parameters
+        ----------
+        q : sequence of float, optional
+            Percentiles to compute, by default (5, 50, 95).
+
+        Returns
+        -------
+        ndarray
+            Array of shape `(len(q), steps + 1, 4)` of S/I/R/Q counts.
+        """
+        return np.percentile(self.stacked(), q, axis=0)
+
+
+def run_ensemble(
+        mapfile, grid=({},), replicates=100, steps=1000,
+        processes=None, seed=None, until_clear=True, callback=None,
+        map_cache=True, **model_kwargs):
+    """
+    Run replicates of the model for every parameter set on a process
+    pool.
+
+    The map is compiled once and shared with the workers through
+    read-only shared memory, so no worker parses the map image.
+
+    Parameters
+    ----------
+    mapfile : str
+        File path to map image.
+    grid : list of dict, optional
+        SIRModel parameter sets to sweep, e.g. from `parameter_grid`,
+        by default only `model_kwargs`.
+    replicates : int, optional
+        Number of runs per parameter set, by default 100.
+    steps : int, optional
+        Largest number of steps per run, by default 1000.
+    processes : int, optional
+        Number of worker processes, by default one per CPU.
+    seed : int, optional
+        Seed of the independent per-run random streams,
+        by default fresh entropy.
+    until_clear : bool, optional
+        Whether runs stop once no one is infected, by default True.
+    callback : callable, optional
+        Called as `callback(aggregator, series)` as every run arrives.
+    map_cache : bool or str, optional
+        Compiled map cache as for `SIRMap`, by default True, the
+        default cache directory.
+    **model_kwargs
+        SIRModel parameters shared by all parameter sets.
+
+    Returns
+    -------
+    list of CurveAggregator
+        The runs of every parameter set, in the order of `grid`.
+    """
+    sir_map = SIRMap(mapfile, cache=map_cache)
+    blocks, specs = share_arrays(sir_map.compile())
+
+    results = [CurveAggregator({**model_kwargs, **params}) for params in grid]
+    seeds = spawn_seeds(seed, len(results) * replicates)
+    tasks = [
+        (key, agg.params, seeds[key * replicates + run], steps, until_clear)
+        for key, agg in enumerate(results) for run in range(replicates)]
+
+    try:
+        with multiprocessing.Pool(
+                processes, initializer=_attach, initargs=(specs,)) as pool:
+            for key, series in pool.imap_unordered(_run, tasks):
+                results[key].add(series)
+                if callback is not None:
+                    callback(results[key], series)
+    finally:
+        release_arrays(blocks, unlink=True)
+
+    return results
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+
+from collections import defaultdict
+
+import numpy as np
+
+
+# `due` markers of nodes without a scheduled event
+UNSCHEDULED = -1
+HELD = -2
+
+
+def geometric(rng, chance):
+    """Draws the number of steps up to the first success of per-step rolls
+
+    Parameters
+    ----------
+    rng : BlockRandom
+        Source of randomness
+    chance : ndarray
+        The chance of success of every roll, one per draw
+
+    Returns
+    -------
+    ndarray
+        Float waiting times of at least 1, inf where the chance is 0
+    """
+    chance = np.asarray(chance, np.float64)
+    u = rng.random(chance.size)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        steps = np.floor(np.log1p(-u) / np.log1p(-chance)) + 1
+    steps[chance <= 0] = np.inf
+    steps[chance >= 1] = 1
+    return steps
+
+
+class EventCalendar:
+    """Nodes waiting for an event, bucketed by the step it is due
+
+       Only the buckets of steps with events exist, so popping a step
+       costs as much as the events due in it. Rescheduling or
+       cancelling an event only updates `due`; entries left behind in
+       other buckets are dropped when their step comes.
+
+       Nodes whose event cannot be drawn yet, e.g. because the chance
+       of it is only known later in the step, are held until the
+       caller schedules them with `take_held`.
+
+       Attributes
+        ----------
+        due : ndarray
+            The step of the event of every node, `UNSCHEDULED` or
+            `HELD` if none
+        buckets : dict
+            The node arrays scheduled for every step
+    """
+    def __init__(self, size):
+        self.due = np.full(size, UNSCHEDULED, np.int64)
+        self.buckets = defaultdict(list)
+        self._held = []
+
+    def schedule(self, nodes, steps):
+        """Sets the events of nodes, replacing any they had
+
+        Parameters
+        ----------
+        nodes : ndarray
+            Indices of the nodes
+        steps : ndarray
+            The step every event is due
+        """
+        if nodes.size == 0:
+            return
+        self.due[nodes] = steps
+        order = np.argsort(steps, kind='stable')
+        steps, nodes = steps[order], nodes[order]
+        starts = np.flatnonzero(np.diff(steps, prepend=steps[0] - 1))
+        for step, group in zip(steps[starts].tolist(),
+                               np.split(nodes, starts[1:])):
+            self.buckets[step].append(group)
+
+    def cancel(self, nodes):
+        """Drops the events of nodes, including held ones
+        """
+        self.due[nodes] = UNSCHEDULED
+
+    def hold(self, nodes):
+        """Marks nodes to be scheduled by the next `take_held`
+        """
+        self.due[nodes] = HELD
+        self._held.append(nodes)
+
+    def take_held(self):
+        """Lists the held nodes, unmarking them
+
+        Returns
+        -------
+        ndarray
+            Indices of the held nodes, to pass to `schedule`
+        """
+        if not self._held:
+            return np.zeros(0, np.intp)
+        held = np.unique(np.concatenate(self._held))
+        held = held[self.due[held] == HELD]
+        self.due[held] = UNSCHEDULED
+        self._held = []
+        return held
+
+    def pop(self, step):
+        """Removes the events due in a step
+
+        Parameters
+        ----------
+        step : integer
+            The step to pop; earlier steps must have been popped
+
+        Returns
+        -------
+        ndarray
+            Sorted indices of the nodes whose event is due
+        """
+        groups = self.buckets.pop(step, None)
+        if groups is None:
+            return np.zeros(0, np.intp)
+        nodes = np.unique(np.concatenate(groups))
+        nodes = nodes[self.due[nodes] == step]
+        self.due[nodes] = UNSCHEDULED
+        return nodes
+
+    def select(self, nodes):
+        """Keeps only some nodes, renumbered in the given order
+
+        Parameters
+        ----------
+        nodes : ndarray
+            Indices of the nodes to keep
+        """
+        self.load(self.due[nodes])
+
+    def extend(self, n):
+        """Adds nodes without events after the existing ones
+        """
+        self.due = np.concatenate(
+            (self.due, np.full(n, UNSCHEDULED, np.int64)))
+
+    def load(self, due):
+        """Replaces all events
+
+        Parameters
+        ----------
+        due : ndarray
+            The `due` array of a calendar, e.g. from a checkpoint
+        """
+        self.due = np.array(due, np.int64)
+        self.buckets = defaultdict(list)
+        self._held = [np.flatnonzero(self.due == HELD)]
+        scheduled = np.flatnonzero(self.due >= 0)
+        due = self.due[scheduled]
+        self.due[scheduled] = UNSCHEDULED
+        self.schedule(scheduled, due)
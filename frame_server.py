@@ -0,0 +1,401 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import base64
+import hashlib
+import os
+import struct
+import threading
+import zlib
+
+import numpy as np
+
+
+# first byte of every message; the rest is zlib compressed
+MAP_MESSAGE = 0
+FRAME_MESSAGE = 1
+
+# terrain codes of the map message, in the order the masks are applied
+TERRAIN_CODES = (('walls', 1), ('start', 2), ('target', 3), ('quarantine', 4))
+
+MAP_HEADER = struct.Struct('<IIII')    # height, width, miasma tile, 0
+FRAME_HEADER = struct.Struct('<iIII')  # step, agents, nodes, tiles
+
+WEBSOCKET_GUID = b'258EAFA5-E914-47DA-95CA-C5AB0DC11B85'
+VIEWER_PAGE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           'frame_viewer.html')
+
+
+def terrain_codes(sir_map):
+    """Collapses the terrain masks of a map into one code per cell
+
+    Parameters
+    ----------
+    sir_map : SIRMap
+        The map
+
+    Returns
+    -------
+    ndarray
+        uint8 matrix the size of the map, 0 where the cell is open and
+        the code of `TERRAIN_CODES` otherwise
+    """
+    codes = np.zeros(sir_map.shape, np.uint8)
+    for name, code in TERRAIN_CODES:
+        codes[getattr(sir_map, name)] = code
+    return codes
+
+
+class FrameClient:
+    """A connected browser and the changes it has not been sent yet
+
+       Changes pile up in the masks until the client is ready for the
+       next frame, so a slow client gets fewer frames holding the
+       latest state instead of a backlog.
+
+       Attributes
+        ----------
+        nodes : ndarray
+            Whether every node changed since the last frame
+        tiles : ndarray
+            Whether every miasma tile changed since the last frame
+        wake : asyncio.Event
+            Set when there are changes to send
+        frames : integer
+            The number of frames sent
+    """
+    def __init__(self, agents, tiles):
+        self.nodes = np.ones(agents, bool)
+        self.tiles = tiles.copy()
+        self.wake = asyncio.Event()
+        self.frames = 0
+
+
+class FrameServer:
+    """Serves the run of a model to browsers over HTTP and websockets
+
+       An asyncio loop in a background thread answers `GET /` with the
+       viewer page and upgrades `/ws` to a websocket. A new websocket
+       gets the terrain of the map once, then per-step delta frames:
+       the nodes whose position or status changed as packed arrays,
+       and optionally the miasma tiles that changed.
+
+       Attach it to a model with `SIRModel.attach_recorder`. Recording
+       only copies the state arrays into a slot the server thread takes
+       from, so the model never waits for the network; steps recorded
+       while the server is busy are merged into one, and each client
+       gets its changes merged likewise while it is still receiving
+       the previous frame.
+
+       Frames are a `FRAME_MESSAGE` byte and the zlib compressed body
+       of a `FRAME_HEADER` followed by the uint32 node ids, the uint32
+       tile ids, the uint16 X and Y coordinates and the uint8 statuses
+       of the nodes, and the `tile * tile` miasma levels of every tile.
+
+       Attributes
+        ----------
+        sir_map : SIRMap
+            The map the model runs on
+        host : str
+            The address listened on
+        port : integer
+            The port listened on, assigned once started if 0
+        tile : integer or None
+            The side of the miasma tiles sent, None to not send miasma
+        clients : set
+            The connected FrameClients
+    """
+    def __init__(self, sir_map, host='127.0.0.1', port=8765, miasma_tile=16):
+        if max(sir_map.shape) > np.iinfo(np.uint16).max:
+            raise ValueError('map too large for uint16 frame coordinates')
+        self.sir_map = sir_map
+        self.host = host
+        self.port = port
+        self.tile = miasma_tile
+        self.clients = set()
+
+        self.step = 0
+        self.x = self.y = np.zeros(0, np.uint16)
+        self.status = np.zeros(0, np.uint8)
+        if miasma_tile:
+            grid = -(-np.array(sir_map.shape) // miasma_tile)
+            self.miasma = np.zeros(grid * miasma_tile, np.uint8)
+            self.grid = tuple(grid)
+        else:
+            self.grid = (0, 0)
+        self.nonzero = np.zeros(self.grid, bool)
+
+        self._map_message = None
+        self._lock = threading.Lock()
+        self._latest = None
+        self._loop = None
+        self._thread = None
+        self._server = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def start(self):
+        """Starts serving in a background thread
+
+        Returns once the server listens, so `port` holds the actual
+        port.
+        """
+        if self._thread is not None:
+            return
+        terrain = terrain_codes(self.sir_map)
+        self._map_message = self._message(MAP_MESSAGE, MAP_HEADER.pack(
+            *terrain.shape, self.tile or 0, 0) + terrain.tobytes())
+        with open(VIEWER_PAGE, 'rb') as f:
+            self._page = f.read()
+
+        self._loop = asyncio.new_event_loop()
+        ready = threading.Event()
+        errors = []
+        self._thread = threading.Thread(
+            target=self._run, args=(ready, errors), daemon=True)
+        self._thread.start()
+        ready.wait()
+        if errors:
+            self._thread.join()
+            self._thread = None
+            raise errors[0]
+
+    def _run(self, ready, errors):
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._server = self._loop.run_until_complete(
+                asyncio.start_server(self._handle, self.host, self.port))
+        except OSError as e:
+            errors.append(e)
+            ready.set()
+            self._loop.close()
+            return
+        self.port = self._server.sockets[0].getsockname()[1]
+        ready.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            self._loop.close()
+
+    def close(self):
+        """Disconnects the clients and stops the server thread
+        """
+        if self._thread is None:
+            return
+        future = asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop)
+        future.result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._thread = None
+
+    async def _shutdown(self):
+        self._server.close()
+        tasks = [t for t in asyncio.all_tasks()
+                 if t is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self._server.wait_closed()
+
+    def record(self, model):
+        """Hands the current state of a model to the server thread
+
+        Parameters
+        ----------
+        model : SIRModel
+            The model to serve
+        """
+        self.start()
+        x, y, status, _ = model.state_arrays()
+        state = (model.steps, x.astype(np.uint16), y.astype(np.uint16),
+                 status.copy(),
+                 model.sir_map.miasma.copy() if self.tile else None)
+        with self._lock:
+            pending = self._latest is not None
+            self._latest = state
+        if not pending:
+            self._loop.call_soon_threadsafe(self._ingest)
+
+    def _ingest(self):
+        with self._lock:
+            step, x, y, status, miasma = self._latest
+            self._latest = None
+
+        self.step = step
+        if x.size != self.x.size:
+            changed = np.ones(x.size, bool)
+            for client in self.clients:
+                client.nodes = np.zeros(x.size, bool)
+        else:
+            changed = (x != self.x) | (y != self.y) | (status != self.status)
+        self.x, self.y, self.status = x, y, status
+
+        tiles = np.zeros(self.grid, bool)
+        if self.tile:
+            T = self.tile
+            padded = np.zeros_like(self.miasma)
+            padded[:miasma.shape[0], :miasma.shape[1]] = miasma
+            blocks = (padded != self.miasma).reshape(
+                self.grid[0], T, self.grid[1], T)
+            tiles = blocks.any(axis=(1, 3))
+            self.miasma = padded
+            self.nonzero = padded.reshape(
+                self.grid[0], T, self.grid[1], T).any(axis=(1, 3))
+
+        for client in self.clients:
+            client.nodes |= changed
+            client.tiles |= tiles
+            client.wake.set()
+
+    def _frame(self, client):
+        """Packs the pending changes of a client, clearing them
+        """
+        nodes = np.flatnonzero(client.nodes).astype(np.uint32)
+        tiles = np.flatnonzero(client.tiles).astype(np.uint32)
+        client.nodes[:] = False
+        client.tiles[:] = False
+
+        parts = [FRAME_HEADER.pack(self.step, self.x.size, nodes.size,
+                                   tiles.size),
+                 nodes.tobytes(), tiles.tobytes(),
+                 self.x[nodes].tobytes(), self.y[nodes].tobytes(),
+                 self.status[nodes].tobytes()]
+        if tiles.size:
+            T = self.tile
+            tx, ty = np.divmod(tiles, self.grid[1])
+            blocks = self.miasma.reshape(self.grid[0], T, self.grid[1], T)
+            parts.append(blocks[tx, :, ty].tobytes())
+        return self._message(FRAME_MESSAGE, b''.join(parts))
+
+    @staticmethod
+    def _message(kind, body):
+        return bytes((kind,)) + zlib.compress(body, 1)
+
+    async def _handle(self, reader, writer):
+        try:
+            request = await reader.readuntil(b'\r\n\r\n')
+            lines = request.decode('latin-1').split('\r\n')
+            path = lines[0].split(' ')[1] if lines[0].count(' ') >= 2 else ''
+            headers = {}
+            for line in lines[1:]:
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+
+            if path == '/ws' and 'sec-websocket-key' in headers:
+                await self._serve_websocket(
+                    reader, writer, headers['sec-websocket-key'])
+            elif path in ('/', '/index.html'):
+                writer.write(
+                    b'HTTP/1.1 200 OK\r\n'
+                    b'Content-Type: text/html; charset=utf-8\r\n'
+                    b'Content-Length: %d\r\n'
+                    b'Connection: close\r\n\r\n' % len(self._page)
+                    + self._page)
+                await writer.drain()
+            else:
+                writer.write(b'HTTP/1.1 404 Not Found\r\n'
+                             b'Content-Length: 0\r\n'
+                             b'Connection: close\r\n\r\n')
+                await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                ConnectionError, asyncio.CancelledError):
+            # cancelled only by `close`, which ends the connection anyway
+            pass
+        finally:
+            writer.close()
+
+    async def _serve_websocket(self, reader, writer, key):
+        accept = base64.b64encode(
+            hashlib.sha1(key.encode('latin-1') + WEBSOCKET_GUID).digest())
+        writer.write(b'HTTP/1.1 101 Switching Protocols\r\n'
+                     b'Upgrade: websocket\r\n'
+                     b'Connection: Upgrade\r\n'
+                     b'Sec-WebSocket-Accept: ' + accept + b'\r\n\r\n')
+        send_frame(writer, 0x2, self._map_message)
+        await writer.drain()
+
+        client = FrameClient(self.x.size, self.nonzero)
+        client.wake.set()
+        self.clients.add(client)
+        listener = asyncio.ensure_future(listen(reader, writer))
+        try:
+            while not listener.done():
+                waker = asyncio.ensure_future(client.wake.wait())
+                await asyncio.wait((waker, listener),
+                                   return_when=asyncio.FIRST_COMPLETED)
+                waker.cancel()
+                if listener.done():
+                    break
+                client.wake.clear()
+                send_frame(writer, 0x2, self._frame(client))
+                client.frames += 1
+                # changes arriving while this drains go into one frame
+                await writer.drain()
+        finally:
+            self.clients.discard(client)
+            listener.cancel()
+
+
+def send_frame(writer, opcode, payload):
+    """Writes one unmasked websocket frame
+
+    Parameters
+    ----------
+    writer : asyncio.StreamWriter
+        The connection
+    opcode : integer
+        The websocket opcode, e.g. 0x2 for binary data
+    payload : bytes
+        The payload
+    """
+    n = len(payload)
+    if n < 126:
+        header = struct.pack('!BB', 0x80 | opcode, n)
+    elif n < 1 << 16:
+        header = struct.pack('!BBH', 0x80 | opcode, 126, n)
+    else:
+        header = struct.pack('!BBQ', 0x80 | opcode, 127, n)
+    writer.write(header + payload)
+
+
+async def listen(reader, writer):
+    """Reads the frames of a websocket client until it closes
+
+    Answers pings and close frames and ignores everything else.
+
+    Parameters
+    ----------
+    reader : asyncio.StreamReader
+        The connection
+    writer : asyncio.StreamWriter
+        The connection, for the answers
+    """
+    try:
+        while True:
+            first, second = await reader.readexactly(2)
+            n = second & 0x7f
+            if n == 126:
+                n, = struct.unpack('!H', await reader.readexactly(2))
+            elif n == 127:
+                n, = struct.unpack('!Q', await reader.readexactly(8))
+            mask = await reader.readexactly(4) if second & 0x80 else b''
+            payload = await reader.readexactly(n)
+            if mask:
+                payload = bytes(
+                    b ^ mask[i % 4] for i, b in enumerate(payload))
+
+            opcode = first & 0x0f
+            if opcode == 0x8:
+                send_frame(writer, 0x8, payload[:2])
+                await writer.drain()
+                return
+            if opcode == 0x9:
+                send_frame(writer, 0xA, payload)
+                await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        return
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+
+# bumped whenever the arrays of SIRMap.compile change, which orphans
+# every cache entry written by older code
+MAP_CACHE_VERSION = 3
+
+
+def default_cache_dir():
+    """
+    Get the directory compiled maps are cached in.
+
+    Returns
+    -------
+    str
+        `$SIR_MAP_CACHE` if set, otherwise `~/.cache/sir_model/maps`.
+    """
+    return os.environ.get('SIR_MAP_CACHE') or os.path.join(
+        os.path.expanduser('~'), '.cache', 'sir_model', 'maps')
+
+
+def map_key(mapfile):
+    """
+    Compute the cache key of a map image.
+
+    Parameters
+    ----------
+    mapfile : str
+        File path to map image.
+
+    Returns
+    -------
+    str
+        The sha256 of the file contents and the cache format version.
+    """
+    digest = hashlib.sha256()
+    with open(mapfile, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return f'{digest.hexdigest()}-v{MAP_CACHE_VERSION}'
+
+
+def store_arrays(directory, arrays):
+    """
+    Write named arrays as a directory of .npy files.
+
+    The files are written into a temporary sibling that is renamed into
+    place, so readers never see a partial entry. If another process
+    stored the same entry first, its copy is kept.
+
+    Parameters
+    ----------
+    directory : str
+        The entry to create.
+    arrays : dict
+        Named ndarrays to store.
+    """
+    parent = os.path.dirname(directory)
+    os.makedirs(parent, exist_ok=True)
+    staging = tempfile.mkdtemp(dir=parent, prefix='.staging-')
+    try:
+        for name, array in arrays.items():
+            np.save(os.path.join(staging, name + '.npy'), array)
+        os.rename(staging, directory)
+    except OSError:
+        if not os.path.isdir(directory):
+            raise
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+
+def load_arrays(directory):
+    """
+    Memory-map the arrays of a directory written by `store_arrays`.
+
+    Parameters
+    ----------
+    directory : str
+        The entry to read.
+
+    Returns
+    -------
+    dict
+        Named read-only arrays backed by the files.
+    """
+    arrays = {}
+    for filename in os.listdir(directory):
+        name, ext = os.path.splitext(filename)
+        if ext != '.npy':
+            continue
+        path = os.path.join(directory, filename)
+        try:
+            arrays[name] = np.load(path, mmap_mode='r').view(np.ndarray)
+        except ValueError:
+            # empty arrays cannot be mapped
+            arrays[name] = np.load(path)
+            arrays[name].flags.writeable = False
+    return arrays
+
+
+def cached_arrays(mapfile, compile, cache_dir=None):
+    """
+    Get the compiled arrays of a map image, compiling it on a miss.
+
+    Parameters
+    ----------
+    mapfile : str
+        File path to map image.
+    compile : callable
+        Called as `compile(mapfile)` to build the named arrays when
+        the cache has no entry for the image.
+    cache_dir : str, optional
+        Directory of the cache, by default `default_cache_dir()`.
+
+    Returns
+    -------
+    dict
+        Named read-only arrays, memory-mapped from the cache unless
+        it could not be written.
+    """
+    directory = os.path.join(cache_dir or default_cache_dir(), map_key(mapfile))
+    if not os.path.isdir(directory):
+        arrays = compile(mapfile)
+        try:
+            store_arrays(directory, arrays)
+        except OSError:
+            return arrays
+    return load_arrays(directory)
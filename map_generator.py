@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+
+import argparse
+import sys
+
+import numpy as np
+from matplotlib import image
+
+from pathing import Terrain
+
+
+def split_rooms(walls, room_size, door_width, rng):
+    """
+    Recursively divide the open area of a map into rooms.
+
+    Every split draws a wall across the current area, with a doorway
+    of `door_width` cells at a random position, until both sides of
+    the area are shorter than two rooms.
+
+    Parameters
+    ----------
+    walls : ndarray
+        Boolean mask in 2d with a border of walls; split walls are
+        drawn into it.
+    room_size : int
+        Smallest side of a room.
+    door_width : int
+        Width of the doorway of every split wall.
+    rng : numpy.random.Generator
+        Source of randomness.
+
+    Returns
+    -------
+    list of (int, int, int, int)
+        The `(x0, y0, x1, y1)` interior bounds of every room,
+        end-exclusive.
+    """
+    rooms = []
+    stack = [(1, 1, walls.shape[0] - 1, walls.shape[1] - 1)]
+    while stack:
+        x0, y0, x1, y1 = stack.pop()
+        height, width = x1 - x0, y1 - y0
+        if max(height, width) < 2 * room_size + 1:
+            rooms.append((x0, y0, x1, y1))
+            continue
+
+        if height >= width:
+            x = int(rng.integers(x0 + room_size, x1 - room_size))
+            door = int(rng.integers(y0, max(y1 - door_width, y0) + 1))
+            walls[x, y0:y1] = True
+            walls[x, door:door + door_width] = False
+            stack += [(x0, y0, x, y1), (x + 1, y0, x1, y1)]
+        else:
+            y = int(rng.integers(y0 + room_size, y1 - room_size))
+            door = int(rng.integers(x0, max(x1 - door_width, x0) + 1))
+            walls[x0:x1, y] = True
+            walls[door:door + door_width, y] = False
+            stack += [(x0, y0, x1, y), (x0, y + 1, x1, y1)]
+    return rooms
+
+
+def generate_floor_plan(size, room_size=16, clutter=0.0, door_width=2,
+                        targets=0.1, seed=None):
+    """
+    Generate a synthetic floor plan in the `Terrain` colours.
+
+    The map is divided into rooms joined by doorways. One room is the
+    start area, one the quarantine area and a fraction of the others
+    are target areas. `clutter` scatters single wall cells over the
+    open floor, which raises the wall density and can cut off pockets
+    of floor.
+
+    Parameters
+    ----------
+    size : int or (int, int)
+        Side or shape of the map in cells.
+    room_size : int, optional
+        Smallest side of a room, by default 16; smaller rooms mean
+        more walls.
+    clutter : float, optional
+        Chance of every floor cell becoming a wall, by default 0.0.
+    door_width : int, optional
+        Width of the doorways, by default 2.
+    targets : float, optional
+        Fraction of the rooms that are target areas, by default 0.1.
+    seed : int, optional
+        Seed of the layout, by default fresh entropy.
+
+    Returns
+    -------
+    ndarray
+        Float32 RGB image of shape `(M, N, 3)`, as read by `SIRMap`.
+
+    Raises
+    ------
+    ValueError
+        If the map is split into fewer than three rooms.
+    """
+    shape = (size, size) if np.isscalar(size) else tuple(size)
+    if min(shape) < room_size + 2:
+        raise ValueError('map is smaller than one room')
+    rng = np.random.default_rng(seed)
+
+    walls = np.zeros(shape, bool)
+    walls[[0, -1], :] = True
+    walls[:, [0, -1]] = True
+    rooms = split_rooms(walls, room_size, door_width, rng)
+    if len(rooms) < 3:
+        raise ValueError('map too small for a start, quarantine and '
+                         'target room')
+    if clutter:
+        walls |= rng.random(shape) < clutter
+
+    img = np.ones(shape + (3,), np.float32)
+    img[walls] = Terrain.WALL
+    order = rng.permutation(len(rooms))
+    n_targets = max(1, int(round(targets * len(rooms))))
+    regions = ([Terrain.START, Terrain.QUARANTINE]
+               + [Terrain.TARGET] * n_targets)
+    for k, rgb in zip(order, regions):
+        x0, y0, x1, y1 = rooms[k]
+        floor = ~walls[x0:x1, y0:y1]
+        img[x0:x1, y0:y1][floor] = rgb
+    return img
+
+
+def save_map(img, path):
+    """
+    Write a generated map as an image file `SIRMap` can load.
+
+    Parameters
+    ----------
+    img : ndarray
+        Float32 RGB image from `generate_floor_plan`.
+    path : str
+        File path to write, usually a .png.
+    """
+    image.imsave(path, img)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description='Generate a synthetic floor plan map image.')
+    parser.add_argument('output', help='image file to write (.png)')
+    parser.add_argument('--size', type=int, nargs='+', default=[500],
+                        help='side, or height and width, in cells')
+    parser.add_argument('--room-size', type=int, default=16)
+    parser.add_argument('--clutter', type=float, default=0.0)
+    parser.add_argument('--door-width', type=int, default=2)
+    parser.add_argument('--targets', type=float, default=0.1)
+    parser.add_argument('--seed', type=int)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    size = args.size[0] if len(args.size) == 1 else args.size[:2]
+    img = generate_floor_plan(
+        size, args.room_size, args.clutter, args.door_width,
+        args.targets, args.seed)
+    save_map(img, args.output)
+    print(f'Wrote {args.output}: {img.shape[0]}x{img.shape[1]}, '
+          f'{np.mean(np.all(img == Terrain.WALL, axis=2)):.1%} walls')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,479 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+
+def retention(open_, rate):
+    """
+    Compute the fraction of miasma each cell keeps while diffusing.
+
+    Parameters
+    ----------
+    open_ : ndarray
+        Boolean mask in 2d of cells air can flow through, padded
+        by one cell on every side, or a stack of such masks.
+    rate : float
+        Fraction of a cell's miasma that spreads out per step
+        if all four of its neighbours are open.
+
+    Returns
+    -------
+    ndarray
+        Unpadded float32 array of retained fractions.
+    """
+    neighbours = (
+        open_[..., :-2, 1:-1].astype(np.float32) + open_[..., 2:, 1:-1]
+        + open_[..., 1:-1, :-2] + open_[..., 1:-1, 2:])
+    return 1 - (rate / 4) * neighbours
+
+
+def diffuse(level, open_, rate, retain, out):
+    """
+    Spread miasma from every cell into its open 4-neighbours.
+
+    Airflow into closed cells is blocked, so a cell only loses miasma
+    to the neighbours that can receive it. The padding of `level` is
+    read but not updated, and `level` is used as scratch space.
+
+    Parameters
+    ----------
+    level : ndarray
+        Float32 miasma levels padded by one cell on every side;
+        zero outside open cells. A stack of padded tiles is diffused
+        tile by tile.
+    open_ : ndarray
+        Boolean mask of cells air can flow through, padded like `level`.
+    rate : float
+        Fraction of a cell's miasma that spreads out per step
+        if all four of its neighbours are open.
+    retain : ndarray
+        Output of `retention` for `open_` and `rate`.
+    out : ndarray
+        Unpadded float32 array receiving the new levels.
+
+    Returns
+    -------
+    ndarray
+        `out`
+    """
+    np.add(level[..., :-2, 1:-1], level[..., 2:, 1:-1], out=out)
+    out += level[..., 1:-1, :-2]
+    out += level[..., 1:-1, 2:]
+    out *= rate / 4
+
+    interior = level[..., 1:-1, 1:-1]
+    interior *= retain
+    out += interior
+    out *= open_[..., 1:-1, 1:-1]
+    return out
+
+
+class MiasmaField:
+    """Residue disease in the air over the whole map
+
+       All updates work on the whole array in place, so the cost of a
+       step depends on the map size only.
+
+       Attributes
+        ----------
+        data : ndarray
+            uint8 matrix of the miasma level at every position
+        decay_shift : integer
+            Number of bits the miasma level is shifted down every step
+        diffusion : float
+            Fraction of a cell's miasma that spreads to its open
+            neighbours every step
+    """
+    def __init__(self, shape, walls=None, decay_shift=2, diffusion=0.0):
+        self.data = np.zeros(shape, np.uint8)
+        self.decay_shift = decay_shift
+        self.diffusion = diffusion
+
+        if diffusion:
+            self._open = np.zeros((shape[0] + 2, shape[1] + 2), bool)
+            self._open[1:-1, 1:-1] = True if walls is None else ~walls
+            self._retain = retention(self._open, diffusion)
+            self._level = np.zeros(self._open.shape, np.float32)
+            self._out = np.zeros(shape, np.float32)
+
+    def contaminate(self, x, y, concentration=0b01111111):
+        """Marks one or many positions as infectious
+
+        Parameters
+        ----------
+        x : integer or ndarray
+            The X coordinates.
+        y : integer or ndarray
+            The Y coordinates.
+        concentration : integer, optional
+            The bits of miasma to set, by default 0b01111111
+        """
+        self.data[x, y] |= np.uint8(concentration)
+
+    def virus_level(self, x, y):
+        """Samples the miasma level at one or many positions
+
+        Parameters
+        ----------
+        x : integer or ndarray
+            The X coordinates.
+        y : integer or ndarray
+            The Y coordinates.
+
+        Returns
+        -------
+        integer or ndarray
+            The miasma levels
+        """
+        return self.data[x, y]
+
+    def ventilate(self):
+        """Decays and diffuses the miasma for one step
+        """
+        if self.decay_shift:
+            np.right_shift(self.data, self.decay_shift, out=self.data)
+
+        if self.diffusion:
+            self._level[1:-1, 1:-1] = self.data
+            diffuse(self._level, self._open, self.diffusion,
+                    self._retain, self._out)
+            self._out += 0.5
+            np.copyto(self.data, self._out, casting='unsafe')
+
+    def to_dense(self):
+        """Gets the miasma level of every position
+
+        Returns
+        -------
+        ndarray
+            uint8 matrix the size of the map; `data` itself
+        """
+        return self.data
+
+    def load_dense(self, levels):
+        """Sets the miasma level of every position
+
+        Parameters
+        ----------
+        levels : ndarray
+            uint8 matrix the size of the map
+        """
+        self.data[...] = levels
+
+    def rows(self, start, stop):
+        """Gets the miasma level of a band of rows
+
+        Parameters
+        ----------
+        start, stop : integer
+            The first row and the end of the band
+
+        Returns
+        -------
+        ndarray
+            A new uint8 matrix of `stop - start` rows
+        """
+        return self.data[start:stop].copy()
+
+    def load_rows(self, start, levels):
+        """Sets the miasma level of a band of rows
+
+        Parameters
+        ----------
+        start : integer
+            The first row of the band
+        levels : ndarray
+            uint8 matrix of the rows, as wide as the map
+        """
+        self.data[start:start + len(levels)] = levels
+
+
+class TiledMiasmaField:
+    """Residue disease in the air, stored only where there is some
+
+       The map is cut into square tiles, and only tiles holding miasma
+       are allocated, as slots of one pool array. Decay, lookups and
+       diffusion run over the allocated tiles at once (when diffusing,
+       tiles that an edge spreads into are allocated first), and tiles
+       that decay to zero are freed, so memory and the cost of a step
+       follow the contaminated area instead of the map size. Levels
+       match `MiasmaField` exactly.
+
+       Attributes
+        ----------
+        shape : (int, int)
+            The shape of the map
+        tile : integer
+            The side of a tile
+        grid : (int, int)
+            The number of tile rows and columns
+        count : integer
+            The number of allocated tiles
+        pool : ndarray
+            uint8 `(capacity, tile, tile)` levels; slots below `count`
+            hold the allocated tiles
+        keys : ndarray
+            The tile `tx * grid[1] + ty` of every slot, for tile row
+            `tx` and column `ty`
+        slot_of : ndarray
+            The slot of every tile, -1 if not allocated
+        decay_shift : integer
+            Number of bits the miasma level is shifted down every step
+        diffusion : float
+            Fraction of a cell's miasma that spreads to its open
+            neighbours every step
+    """
+    def __init__(self, shape, walls=None, decay_shift=2, diffusion=0.0,
+                 tile=64, capacity=16):
+        self.shape = tuple(shape)
+        self.tile = tile
+        self.grid = (-(-self.shape[0] // tile), -(-self.shape[1] // tile))
+        self.walls = walls
+        self.decay_shift = decay_shift
+        self.diffusion = diffusion
+
+        self.count = 0
+        self.slot_of = np.full(self.grid[0] * self.grid[1], -1, np.intp)
+        self.keys = np.zeros(capacity, np.intp)
+        self.pool = np.zeros((capacity, tile, tile), np.uint8)
+        if diffusion:
+            self._open = np.zeros((capacity, tile + 2, tile + 2), bool)
+            self._retain = np.zeros((capacity, tile, tile), np.float32)
+
+    def _keys(self, x, y):
+        return (x // self.tile) * self.grid[1] + y // self.tile
+
+    def _grow(self, size):
+        capacity = max(size, 2 * len(self.keys))
+        self.keys = np.resize(self.keys, capacity)
+        self.pool = np.resize(self.pool, (capacity,) + self.pool.shape[1:])
+        if self.diffusion:
+            self._open = np.resize(
+                self._open, (capacity,) + self._open.shape[1:])
+            self._retain = np.resize(
+                self._retain, (capacity,) + self._retain.shape[1:])
+
+    def _allocate(self, keys):
+        """Gives zeroed slots to the tiles of `keys` that have none"""
+        keys = np.unique(keys[self.slot_of[keys] < 0])
+        if keys.size == 0:
+            return
+        lo, hi = self.count, self.count + keys.size
+        if hi > len(self.keys):
+            self._grow(hi)
+        self.keys[lo:hi] = keys
+        self.slot_of[keys] = np.arange(lo, hi)
+        self.pool[lo:hi] = 0
+        self.count = hi
+
+        if self.diffusion:
+            T = self.tile
+            for slot, key in zip(range(lo, hi), keys.tolist()):
+                tx, ty = divmod(key, self.grid[1])
+                x0, y0 = tx * T - 1, ty * T - 1
+                x1 = min(x0 + T + 2, self.shape[0])
+                y1 = min(y0 + T + 2, self.shape[1])
+                bx, by = max(x0, 0), max(y0, 0)
+                open_ = self._open[slot]
+                open_[...] = False
+                open_[bx - x0:x1 - x0, by - y0:y1 - y0] = (
+                    True if self.walls is None
+                    else ~self.walls[bx:x1, by:y1])
+            self._retain[lo:hi] = retention(
+                self._open[lo:hi], self.diffusion)
+
+    def _free_empty(self):
+        """Frees the tiles whose levels are all zero"""
+        n = self.count
+        keep = self.pool[:n].any(axis=(1, 2))
+        if keep.all():
+            return
+        self.slot_of[self.keys[:n][~keep]] = -1
+        m = int(keep.sum())
+        self.keys[:m] = self.keys[:n][keep]
+        self.pool[:m] = self.pool[:n][keep]
+        if self.diffusion:
+            self._open[:m] = self._open[:n][keep]
+            self._retain[:m] = self._retain[:n][keep]
+        self.slot_of[self.keys[:m]] = np.arange(m)
+        self.count = m
+
+    def contaminate(self, x, y, concentration=0b01111111):
+        """Marks one or many positions as infectious
+
+        Parameters
+        ----------
+        x : integer or ndarray
+            The X coordinates.
+        y : integer or ndarray
+            The Y coordinates.
+        concentration : integer, optional
+            The bits of miasma to set, by default 0b01111111
+        """
+        T = self.tile
+        if np.ndim(x) == 0:
+            key = self._keys(x, y)
+            if self.slot_of[key] < 0:
+                self._allocate(np.array([key]))
+            self.pool[self.slot_of[key], x % T, y % T] |= np.uint8(concentration)
+            return
+
+        x, y = np.asarray(x).reshape(-1), np.asarray(y).reshape(-1)
+        keys = self._keys(x, y)
+        self._allocate(keys)
+        self.pool[self.slot_of[keys], x % T, y % T] |= np.uint8(concentration)
+
+    def virus_level(self, x, y):
+        """Samples the miasma level at one or many positions
+
+        Parameters
+        ----------
+        x : integer or ndarray
+            The X coordinates.
+        y : integer or ndarray
+            The Y coordinates.
+
+        Returns
+        -------
+        integer or ndarray
+            The miasma levels
+        """
+        T = self.tile
+        if np.ndim(x) == 0:
+            slot = self.slot_of[self._keys(x, y)]
+            return np.uint8(0) if slot < 0 else self.pool[slot, x % T, y % T]
+
+        slot = self.slot_of[self._keys(np.asarray(x), np.asarray(y))]
+        levels = self.pool[np.maximum(slot, 0), x % T, y % T]
+        levels[slot < 0] = 0
+        return levels
+
+    def ventilate(self):
+        """Decays and diffuses the miasma for one step
+        """
+        if self.decay_shift:
+            tiles = self.pool[:self.count]
+            np.right_shift(tiles, self.decay_shift, out=tiles)
+
+        if self.diffusion:
+            self._diffuse()
+
+        self._free_empty()
+
+    def _neighbours(self, keys):
+        """Gets the up, down, left and right tiles of tiles, -1 if none"""
+        rows, cols = self.grid
+        tx, ty = np.divmod(keys, cols)
+        return (np.where(tx > 0, keys - cols, -1),
+                np.where(tx < rows - 1, keys + cols, -1),
+                np.where(ty > 0, keys - 1, -1),
+                np.where(ty < cols - 1, keys + 1, -1))
+
+    def _diffuse(self):
+        # diffusion also reaches the tiles next to a non-zero edge
+        n = self.count
+        tiles, keys = self.pool[:n], self.keys[:n]
+        up, down, left, right = self._neighbours(keys)
+        edges = (tiles[:, 0].any(1), tiles[:, -1].any(1),
+                 tiles[:, :, 0].any(1), tiles[:, :, -1].any(1))
+        reached = np.concatenate([
+            nbr[edge & (nbr >= 0)]
+            for nbr, edge in zip((up, down, left, right), edges)])
+        self._allocate(reached)
+
+        n = self.count
+        T = self.tile
+        tiles, keys = self.pool[:n], self.keys[:n]
+        level = np.zeros((n, T + 2, T + 2), np.float32)
+        level[:, 1:-1, 1:-1] = tiles
+        for nbr, halo, edge in zip(
+                self._neighbours(keys),
+                ((slice(None), 0, slice(1, -1)),
+                 (slice(None), -1, slice(1, -1)),
+                 (slice(None), slice(1, -1), 0),
+                 (slice(None), slice(1, -1), -1)),
+                ((-1, slice(None)), (0, slice(None)),
+                 (slice(None), -1), (slice(None), 0))):
+            slot = np.where(nbr >= 0, self.slot_of[np.maximum(nbr, 0)], -1)
+            has = np.flatnonzero(slot >= 0)
+            level[(has,) + halo[1:]] = tiles[(slot[has],) + edge]
+
+        out = np.empty((n, T, T), np.float32)
+        diffuse(level, self._open[:n], self.diffusion, self._retain[:n], out)
+        out += 0.5
+        np.copyto(tiles, out, casting='unsafe')
+
+    def to_dense(self):
+        """Gets the miasma level of every position
+
+        Returns
+        -------
+        ndarray
+            A new uint8 matrix the size of the map
+        """
+        T = self.tile
+        dense = np.zeros((self.grid[0] * T, self.grid[1] * T), np.uint8)
+        for slot, key in enumerate(self.keys[:self.count].tolist()):
+            tx, ty = divmod(key, self.grid[1])
+            dense[tx * T:(tx + 1) * T, ty * T:(ty + 1) * T] = self.pool[slot]
+        return dense[:self.shape[0], :self.shape[1]]
+
+    def load_dense(self, levels):
+        """Sets the miasma level of every position
+
+        Parameters
+        ----------
+        levels : ndarray
+            uint8 matrix the size of the map
+        """
+        self.slot_of[:] = -1
+        self.count = 0
+        x, y = np.nonzero(levels)
+        keys = self._keys(x, y)
+        self._allocate(keys)
+        self.pool[self.slot_of[keys], x % self.tile, y % self.tile] = \
+            levels[x, y]
+
+    def _band(self, start, stop):
+        x = np.repeat(np.arange(start, stop), self.shape[1])
+        y = np.tile(np.arange(self.shape[1]), stop - start)
+        return x, y
+
+    def rows(self, start, stop):
+        """Gets the miasma level of a band of rows
+
+        Parameters
+        ----------
+        start, stop : integer
+            The first row and the end of the band
+
+        Returns
+        -------
+        ndarray
+            A new uint8 matrix of `stop - start` rows
+        """
+        levels = self.virus_level(*self._band(start, stop))
+        return levels.reshape(stop - start, self.shape[1])
+
+    def load_rows(self, start, levels):
+        """Sets the miasma level of a band of rows
+
+        Only tiles the band has miasma in are allocated; zeros are
+        written to tiles that exist already and freed with them once
+        empty.
+
+        Parameters
+        ----------
+        start : integer
+            The first row of the band
+        levels : ndarray
+            uint8 matrix of the rows, as wide as the map
+        """
+        x, y = self._band(start, start + len(levels))
+        levels = np.asarray(levels, np.uint8).reshape(-1)
+        keys = self._keys(x, y)
+        self._allocate(keys[levels > 0])
+        slot = self.slot_of[keys]
+        has = slot >= 0
+        T = self.tile
+        self.pool[slot[has], x[has] % T, y[has] % T] = levels[has]
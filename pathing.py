@@ -5,8 +5,10 @@ Created on Wed May 13 10:48:32 2020
 @author: Philip Ciunkiewicz
 """
 
+from array import array
+from heapq import heappush, heappop
+
 import numpy as np
-import networkx as nx
 
 
 class Terrain:
@@ -21,7 +23,7 @@ class Terrain:
     QUARANTINE = np.array([1,0,0])
 
 
-def random_idx(mask):
+def random_idx(mask, rng=None):
     """
     Get random `(x,y)` index tuple from valid points in boolean mask.
 
@@ -29,6 +31,8 @@ def random_idx(mask):
     ----------
     mask : ndarray
         Boolean mask in 2 dimensions
+    rng : numpy.random.Generator, optional
+        Source of randomness, by default fresh entropy
 
     Returns
     -------
@@ -36,7 +40,9 @@ def random_idx(mask):
         Tuple of `(x,y)` indices.
     """    
     idx = np.argwhere(mask)
-    rand = np.random.randint(0, idx.shape[0] - 1)
+    if rng is None:
+        rng = np.random.default_rng()
+    rand = rng.integers(0, idx.shape[0])
     return tuple(idx[rand])
 
 
@@ -61,7 +67,232 @@ def dist(a, b):
     return ((x1 - x2) ** 2 + (y1 - y2) ** 2) ** 0.5
 
 
+class GridGraph:
+    """
+    Compact 4-neighbour graph over the walkable cells of a grid.
+
+    Wall cells are left out entirely. Nodes are numbered compactly
+    and adjacency is stored in CSR form, so the graph costs a few
+    integers per cell instead of Python objects.
+
+    Attributes
+    ----------
+    shape : (int, int)
+        Shape of the grid.
+    cells : ndarray
+        Flat grid index `x * N + y` of every node.
+    node_id : ndarray
+        Node of every flat grid index, -1 for walls.
+    indptr : ndarray
+        CSR row pointers; the neighbours of node `n` are
+        `indices[indptr[n]:indptr[n+1]]`.
+    indices : ndarray
+        CSR column indices of the neighbouring nodes.
+    """
+    def __init__(self, walls):
+        M, N = walls.shape
+        self.shape = walls.shape
+        self.cells = np.flatnonzero(~walls)
+        self.node_id = np.full(walls.size, -1, np.int32)
+        self.node_id[self.cells] = np.arange(self.cells.size)
+
+        x, y = np.divmod(self.cells, N)
+        neighbours = np.full((self.cells.size, 4), -1, np.int32)
+        for k, (dx, dy) in enumerate(((-1, 0), (1, 0), (0, -1), (0, 1))):
+            i, j = x + dx, y + dy
+            inside = (i >= 0) & (i < M) & (j >= 0) & (j < N)
+            neighbours[inside, k] = self.node_id[i[inside] * N + j[inside]]
+
+        linked = neighbours >= 0
+        self.indptr = np.zeros(self.cells.size + 1, np.int64)
+        np.cumsum(linked.sum(axis=1), out=self.indptr[1:])
+        self.indices = neighbours[linked]
+
+    @classmethod
+    def from_arrays(cls, shape, cells, node_id, indptr, indices):
+        """
+        Rebuild a graph from the arrays of a previously built one.
+
+        Parameters
+        ----------
+        shape : (int, int)
+            Shape of the grid.
+        cells, node_id, indptr, indices : ndarray
+            The attributes of the same name; they are used as-is,
+            so they may be read-only or shared memory.
+
+        Returns
+        -------
+        GridGraph
+            The rebuilt graph.
+        """
+        graph = cls.__new__(cls)
+        graph.shape = tuple(int(n) for n in shape)
+        graph.cells = cells
+        graph.node_id = node_id
+        graph.indptr = indptr
+        graph.indices = indices
+        return graph
+
+    def __len__(self):
+        return self.cells.size
+
+    def node(self, xy):
+        """
+        Get the node at a grid coordinate.
+
+        Parameters
+        ----------
+        xy : (int, int)
+            `(x,y)` coordinate tuple.
+
+        Returns
+        -------
+        int
+            Node id, -1 for walls.
+        """
+        return int(self.node_id[int(xy[0]) * self.shape[1] + int(xy[1])])
+
+    def coords(self, node):
+        """
+        Get the grid coordinate of a node.
+
+        Parameters
+        ----------
+        node : int
+            Node id.
+
+        Returns
+        -------
+        (int, int)
+            `(x,y)` coordinate tuple.
+        """
+        return divmod(int(self.cells[node]), self.shape[1])
+
+    def neighbours(self, node):
+        """
+        Get the neighbouring nodes of a node.
+
+        Parameters
+        ----------
+        node : int
+            Node id.
+
+        Returns
+        -------
+        ndarray
+            Node ids of the neighbours.
+        """
+        return self.indices[self.indptr[node]:self.indptr[node + 1]]
+
+    def expand(self, nodes):
+        """
+        Gather the neighbours of many nodes at once.
+
+        Parameters
+        ----------
+        nodes : ndarray
+            Node ids to expand.
+
+        Returns
+        -------
+        (ndarray, ndarray)
+            The neighbouring node ids and, for each of them,
+            the node of `nodes` it was reached from.
+        """
+        starts = self.indptr[nodes]
+        counts = self.indptr[nodes + 1] - starts
+        offsets = np.arange(counts.sum()) - np.repeat(
+            np.cumsum(counts) - counts, counts)
+        edges = np.repeat(starts, counts) + offsets
+        return self.indices[edges], np.repeat(nodes, counts)
+
+    def search(self, sources, stop=-1):
+        """
+        Breadth-first search outward from a set of source nodes.
+
+        Parameters
+        ----------
+        sources : ndarray
+            Node ids at distance zero.
+        stop : int or ndarray, optional
+            Node id(s) at which to end the search early, once all of
+            them are reached, by default none (-1).
+
+        Returns
+        -------
+        (ndarray, ndarray)
+            Int32 step distance of every node (-1 if not reached) and
+            the neighbour it was reached from, a step closer to the
+            sources (sources point to themselves).
+        """
+        distance = np.full(len(self), -1, np.int32)
+        parent = np.full(len(self), -1, np.int32)
+        frontier = np.unique(np.asarray(sources, np.int32))
+        distance[frontier] = 0
+        parent[frontier] = frontier
+
+        stop = np.atleast_1d(stop)
+        stop = stop[stop >= 0]
+        steps = 0
+        while frontier.size and (stop.size == 0 or (distance[stop] < 0).any()):
+            steps += 1
+            nodes, froms = self.expand(frontier)
+            fresh = distance[nodes] < 0
+            frontier, first = np.unique(nodes[fresh], return_index=True)
+            distance[frontier] = steps
+            parent[frontier] = froms[fresh][first]
+
+        return distance, parent
+
+    def components(self):
+        """
+        Label the connected components of the graph.
+
+        Every node is hooked onto the smallest label among its
+        neighbours and the labels are then shortcut to their roots,
+        until no edge joins two labels.
+
+        Returns
+        -------
+        ndarray
+            Int32 component of every node, numbered from 0.
+        """
+        label = np.arange(len(self))
+        src = np.repeat(label, np.diff(self.indptr))
+        dst = self.indices
+        while True:
+            hooked = label.copy()
+            np.minimum.at(hooked, label[src], label[dst])
+            while True:
+                root = hooked[hooked]
+                if np.array_equal(root, hooked):
+                    break
+                hooked = root
+            if np.array_equal(hooked, label):
+                break
+            label = hooked
+        return np.unique(label, return_inverse=True)[1].astype(np.int32)
+
+
 def create_graph(walls):
+    """
+    Create a compact grid graph from boolean mask.
+
+    Parameters
+    ----------
+    walls : ndarray
+        Boolean mask in 2d of invalid points (walls).
+
+    Returns
+    -------
+    GridGraph
+        Graph of the cells that are not walls.
+    """    
+    return GridGraph(walls)
+
+
+def create_nx_graph(walls):
     """
     Create networkx graph from boolean mask.
 
@@ -73,19 +304,1016 @@ def create_graph(walls):
     Returns
     -------
     Graph
-        networkx graph; edges connected to wall nodes have
-        effectively infinite cost associated with them.
-    """    
-    M, N = walls.shape
-    G = nx.grid_2d_graph(M, N)
-    
-    weights = {}
-    for e in G.edges():
-        if walls[e[0]] or walls[e[1]]:
-            weights[e] = walls.size
+        networkx grid graph of the cells that are not walls.
+    """
+    try:
+        import networkx as nx
+    except ImportError:
+        raise ImportError('the networkx graph requires networkx')
+    G = nx.grid_2d_graph(*walls.shape)
+    G.remove_nodes_from(map(tuple, np.argwhere(walls).tolist()))
+    return G
+
+
+def shortest_path(graph, start, target):
+    """
+    Find a shortest path between two points of a grid graph.
+
+    Parameters
+    ----------
+    graph : GridGraph
+        Graph to search.
+    start : (int, int)
+        `(x,y)` coordinate tuple to path from.
+    target : (int, int)
+        `(x,y)` coordinate tuple to path to.
+
+    Returns
+    -------
+    list of (int, int)
+        Path from `start` to `target` inclusive, or an empty list
+        if `target` cannot be reached.
+    """
+    return shortest_paths(graph, [start], target)[0]
+
+
+def shortest_paths(graph, starts, target):
+    """
+    Find shortest paths from many points to one with a single
+    breadth-first search outward from the target.
+
+    Parameters
+    ----------
+    graph : GridGraph
+        Graph to search.
+    starts : list of (int, int)
+        `(x,y)` coordinate tuples to path from.
+    target : (int, int)
+        `(x,y)` coordinate tuple to path to.
+
+    Returns
+    -------
+    list of list of (int, int)
+        Path from every start to `target` inclusive, or an empty list
+        if `target` cannot be reached from it.
+    """
+    goal = graph.node(target)
+    sources = np.array([graph.node(start) for start in starts], np.int64)
+    if goal < 0:
+        return [[] for _ in starts]
+
+    distance, parent = graph.search([goal], stop=sources)
+    paths = []
+    for source in sources.tolist():
+        if source < 0 or distance[source] < 0:
+            paths.append([])
+            continue
+        path = [graph.coords(source)]
+        node = source
+        while node != goal:
+            node = int(parent[node])
+            path.append(graph.coords(node))
+        paths.append(path)
+    return paths
+
+
+def flow_field(graph, sources):
+    """
+    Compute distances towards the nearest source cell with
+    a multi-source breadth-first search.
+
+    Parameters
+    ----------
+    graph : GridGraph
+        Graph of the walkable cells.
+    sources : ndarray
+        Boolean mask in 2d of the destination region.
+
+    Returns
+    -------
+    ndarray
+        Int32 step distances to the region (-1 where unreachable).
+    """
+    nodes = graph.node_id[np.flatnonzero(sources)]
+    distance, _ = graph.search(nodes[nodes >= 0])
+
+    field = np.full(graph.shape, -1, np.int32)
+    field.flat[graph.cells] = distance
+    return field
+
+
+def follow_flow(distance, start, rng=None):
+    """
+    Walk down the gradient of a flow field from a start point,
+    breaking ties between equally short steps at random.
+
+    Parameters
+    ----------
+    distance : ndarray
+        Distance field from `flow_field`.
+    start : (int, int)
+        `(x,y)` coordinate tuple to walk from.
+    rng : numpy.random.Generator, optional
+        Source of randomness for breaking ties, by default fresh entropy.
+
+    Returns
+    -------
+    list of (int, int)
+        Path from `start` into the destination region, or None if the
+        region cannot be reached from `start`.
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    M, N = distance.shape
+    x, y = int(start[0]), int(start[1])
+    d = distance[x, y]
+    if d < 0:
+        return None
+
+    path = [(x, y)]
+    rolls = rng.random(d)
+    for step in range(d):
+        d -= 1
+        downhill = [
+            (i, j) for i, j in ((x-1, y), (x+1, y), (x, y-1), (x, y+1))
+            if 0 <= i < M and 0 <= j < N and distance[i, j] == d]
+        x, y = downhill[int(rolls[step] * len(downhill))]
+        path.append((x, y))
+    return path
+
+
+class Pathfinder:
+    """
+    Base class of the point-to-point path search backends of a map.
+
+    Subclasses implement `find_path`; every flat backend returns paths
+    of the same (shortest) length over the same graph.
+
+    Attributes
+    ----------
+    graph : GridGraph
+        Graph of the walkable cells.
+    expanded : int
+        Total number of nodes taken off the open list, for the
+        backends that keep count.
+    """
+    expanded = 0
+
+    def __init__(self, graph):
+        self.graph = graph
+
+    def find_path(self, start, target):
+        """
+        Find a shortest path between two points.
+
+        Parameters
+        ----------
+        start : (int, int)
+            `(x,y)` coordinate tuple to path from.
+        target : (int, int)
+            `(x,y)` coordinate tuple to path to.
+
+        Returns
+        -------
+        list of (int, int)
+            Path from `start` to `target` inclusive, or an empty list
+            if `target` cannot be reached.
+        """
+        raise NotImplementedError
+
+    def plan(self, start, target):
+        """
+        Find a path whose tail may be computed later, as it is walked.
+
+        Parameters
+        ----------
+        start : (int, int)
+            `(x,y)` coordinate tuple to path from.
+        target : (int, int)
+            `(x,y)` coordinate tuple to path to.
+
+        Returns
+        -------
+        (list of (int, int), iterator or None)
+            The first waypoints of the path, and the segments that
+            follow them (each starting at the previous segment's last
+            waypoint) or None if the path is complete.
+        """
+        return self.find_path(start, target), None
+
+
+class BFSPathfinder(Pathfinder):
+    """
+    Frontier-at-a-time breadth-first search over the CSR graph.
+    """
+    def find_path(self, start, target):
+        return shortest_path(self.graph, start, target)
+
+
+class AStarPathfinder(Pathfinder):
+    """
+    A* search over the flat indices of the grid.
+
+    The grid is padded by a ring of walls so neighbours are fixed
+    index offsets, and g-scores live in arrays that are reused
+    between searches by stamping them with a search counter.
+    """
+    def __init__(self, graph):
+        super().__init__(graph)
+        M, N = graph.shape
+        self.width = N + 2
+
+        passable = np.zeros((M + 2, N + 2), np.uint8)
+        passable[1:-1, 1:-1] = graph.node_id.reshape(graph.shape) >= 0
+        self.passable = bytearray(passable.tobytes())
+
+        self.g_score = array('i', bytes(4 * passable.size))
+        self.parent = array('i', bytes(4 * passable.size))
+        self.visited = array('i', bytes(4 * passable.size))
+        self.stamp = 0
+
+    def _index(self, xy):
+        return (int(xy[0]) + 1) * self.width + int(xy[1]) + 1
+
+    def _trace(self, source, goal):
+        """
+        Walk the parent pointers back from the goal.
+
+        Returns
+        -------
+        list of (int, int)
+            Path from `source` to `goal` inclusive.
+        """
+        path = []
+        node = goal
+        while node != source:
+            path.append(node)
+            node = self.parent[node]
+        path.append(source)
+        path.reverse()
+        return [(i // self.width - 1, i % self.width - 1) for i in path]
+
+    def find_path(self, start, target):
+        source, goal = self._index(start), self._index(target)
+        passable = self.passable
+        if not (passable[source] and passable[goal]):
+            return []
+
+        W = self.width
+        gx, gy = divmod(goal, W)
+        g_score, parent, visited = self.g_score, self.parent, self.visited
+        self.stamp += 1
+        stamp = self.stamp
+
+        visited[source] = stamp
+        g_score[source] = 0
+        parent[source] = source
+        h = abs(source // W - gx) + abs(source % W - gy)
+        heap = [(h, h, source)]
+        expanded = 0
+
+        while heap:
+            f, h, node = heappop(heap)
+            if node == goal:
+                self.expanded += expanded
+                return self._trace(source, goal)
+            g = f - h
+            if g > g_score[node]:
+                continue
+
+            expanded += 1
+            g += 1
+            for nbr in (node - W, node + W, node - 1, node + 1):
+                if passable[nbr] and (
+                        visited[nbr] != stamp or g < g_score[nbr]):
+                    visited[nbr] = stamp
+                    g_score[nbr] = g
+                    parent[nbr] = node
+                    x, y = divmod(nbr, W)
+                    h = abs(x - gx) + abs(y - gy)
+                    heappush(heap, (g + h, h, nbr))
+
+        self.expanded += expanded
+        return []
+
+
+class JumpPointPathfinder(AStarPathfinder):
+    """
+    Jump Point Search for 4-connected grids.
+
+    Symmetric paths are pruned with a horizontal-first canonical
+    ordering: after a horizontal step a path may continue or turn
+    vertical, after a vertical step it may only turn horizontal where
+    the cell beside the previous one is blocked. Straight runs are
+    jumped over and only their end points enter the open list.
+    """
+    def _jump_vertical(self, node, d, goal):
+        passable = self.passable
+        while True:
+            node += d
+            if not passable[node]:
+                return -1
+            if node == goal:
+                return node
+            if ((passable[node - 1] and not passable[node - d - 1]) or
+                    (passable[node + 1] and not passable[node - d + 1])):
+                return node
+
+    def _jump_horizontal(self, node, d, goal):
+        passable = self.passable
+        W = self.width
+        while True:
+            node += d
+            if not passable[node]:
+                return -1
+            if node == goal:
+                return node
+            if (self._jump_vertical(node, -W, goal) >= 0 or
+                    self._jump_vertical(node, W, goal) >= 0):
+                return node
+
+    def _directions(self, node):
+        """
+        List the directions a canonical path may leave a node in.
+        """
+        W = self.width
+        prev = self.parent[node]
+        if prev == node:
+            return (-W, W, -1, 1)
+        if abs(node - prev) < W:
+            d = 1 if node > prev else -1
+            return (d, -W, W)
+
+        d = W if node > prev else -W
+        passable = self.passable
+        dirs = [d]
+        for h in (-1, 1):
+            if passable[node + h] and not passable[node - d + h]:
+                dirs.append(h)
+        return dirs
+
+    def _trace(self, source, goal):
+        jump_points = super()._trace(source, goal)
+        path = jump_points[:1]
+        for x, y in jump_points[1:]:
+            px, py = path[-1]
+            if px == x:
+                step = 1 if y > py else -1
+                path.extend((x, j) for j in range(py + step, y + step, step))
+            else:
+                step = 1 if x > px else -1
+                path.extend((i, y) for i in range(px + step, x + step, step))
+        return path
+
+    def find_path(self, start, target):
+        source, goal = self._index(start), self._index(target)
+        passable = self.passable
+        if not (passable[source] and passable[goal]):
+            return []
+
+        W = self.width
+        gx, gy = divmod(goal, W)
+        g_score, parent, visited = self.g_score, self.parent, self.visited
+        self.stamp += 1
+        stamp = self.stamp
+
+        visited[source] = stamp
+        g_score[source] = 0
+        parent[source] = source
+        h = abs(source // W - gx) + abs(source % W - gy)
+        heap = [(h, h, source)]
+        expanded = 0
+
+        while heap:
+            f, h, node = heappop(heap)
+            if node == goal:
+                self.expanded += expanded
+                return self._trace(source, goal)
+            g = f - h
+            if g > g_score[node]:
+                continue
+
+            expanded += 1
+            for d in self._directions(node):
+                if abs(d) == 1:
+                    jump = self._jump_horizontal(node, d, goal)
+                    if jump < 0:
+                        continue
+                    cost = g + abs(jump - node)
+                else:
+                    jump = self._jump_vertical(node, d, goal)
+                    if jump < 0:
+                        continue
+                    cost = g + abs(jump - node) // W
+
+                if visited[jump] != stamp or cost < g_score[jump]:
+                    visited[jump] = stamp
+                    g_score[jump] = cost
+                    parent[jump] = node
+                    x, y = divmod(jump, W)
+                    h = abs(x - gx) + abs(y - gy)
+                    heappush(heap, (cost + h, h, jump))
+
+        self.expanded += expanded
+        return []
+
+
+class NetworkXPathfinder(Pathfinder):
+    """
+    networkx A* search, kept as a reference backend.
+
+    The networkx graph is only built on the first search.
+    """
+    def __init__(self, graph):
+        super().__init__(graph)
+        self.nx_graph = None
+
+    def find_path(self, start, target):
+        import networkx as nx
+        if self.nx_graph is None:
+            self.nx_graph = create_nx_graph(
+                self.graph.node_id.reshape(self.graph.shape) < 0)
+        try:
+            return nx.astar_path(
+                self.nx_graph, tuple(map(int, start)), tuple(map(int, target)),
+                heuristic=dist)
+        except (nx.NetworkXNoPath, nx.NodeNotFound):
+            return []
+
+
+class HierarchicalPathfinder(AStarPathfinder):
+    """
+    Hierarchical A* (HPA*) over square clusters of the grid.
+
+    Every run of open cell pairs across the border of two clusters,
+    i.e. a doorway or gap in the walls, is an entrance with one
+    transition at its middle. The transition cells are the nodes of
+    an abstract graph, joined across borders at cost 1 and within a
+    cluster by their precomputed in-cluster distance. A long query
+    only searches the abstract graph and refines the hops between
+    transitions with A* as they are needed, so its cost grows with
+    the number of clusters crossed. Queries within neighbouring
+    clusters use plain A*.
+
+    Paths are close to, but not always, the shortest.
+
+    Attributes
+    ----------
+    cluster_size : int
+        Side of a cluster.
+    cells : ndarray
+        Padded flat index of every abstract node.
+    cluster : ndarray
+        Cluster of every abstract node.
+    edges : list of list of (int, int)
+        Neighbours and costs of every abstract node.
+    members : dict
+        Padded flat index -> abstract node of the transitions of
+        every cluster.
+    """
+    def __init__(self, graph, cluster_size=32):
+        super().__init__(graph)
+        self.cluster_size = cluster_size
+        self.columns = -(-graph.shape[1] // cluster_size)
+        self._build()
+
+    def _cluster_of(self, x, y):
+        C = self.cluster_size
+        return (x // C) * self.columns + y // C
+
+    def _transitions(self, pairs, along):
+        """
+        Pick the middle pair of every run of open pairs.
+
+        Parameters
+        ----------
+        pairs : ndarray
+            Boolean `(borders, length)` mask of open cell pairs.
+        along : ndarray
+            Position of every column of `pairs` along the border.
+
+        Returns
+        -------
+        (ndarray, ndarray)
+            The border and position of every transition.
+        """
+        C = self.cluster_size
+        previous = np.zeros_like(pairs)
+        previous[:, 1:] = pairs[:, :-1]
+        starts = pairs & (~previous | (along % C == 0))
+
+        border, pos = np.nonzero(pairs)
+        run = np.cumsum(starts[border, pos]) - 1
+        _, first, counts = np.unique(
+            run, return_index=True, return_counts=True)
+        middle = first + counts // 2
+        return border[middle], pos[middle]
+
+    def _build(self):
+        M, N = self.graph.shape
+        C = self.cluster_size
+        W = self.width
+        open_ = (self.graph.node_id >= 0).reshape(M, N)
+
+        # transitions across horizontal then vertical cluster borders
+        rows = np.arange(C - 1, M - 1, C)
+        border, y = self._transitions(
+            open_[rows] & open_[rows + 1], np.arange(N))
+        xa, ya, xb, yb = rows[border], y, rows[border] + 1, y
+        cols = np.arange(C - 1, N - 1, C)
+        border, x = self._transitions(
+            (open_[:, cols] & open_[:, cols + 1]).T, np.arange(M))
+        xa = np.concatenate((xa, x))
+        ya = np.concatenate((ya, cols[border]))
+        xb = np.concatenate((xb, x))
+        yb = np.concatenate((yb, cols[border] + 1))
+
+        flat_a, flat_b = xa * N + ya, xb * N + yb
+        flat, inverse = np.unique(
+            np.concatenate((flat_a, flat_b)), return_inverse=True)
+        a, b = np.split(inverse, 2)
+        x, y = np.divmod(flat, N)
+        self.cells = (x + 1) * W + y + 1
+        self.cluster = self._cluster_of(x, y)
+        self.edges = [[] for _ in range(flat.size)]
+        for u, v in zip(a.tolist(), b.tolist()):
+            self.edges[u].append((v, 1))
+            self.edges[v].append((u, 1))
+
+        self.members = {}
+        for node, (cluster, cell) in enumerate(
+                zip(self.cluster.tolist(), self.cells.tolist())):
+            self.members.setdefault(cluster, {})[cell] = node
+
+        # in-cluster distances: search from the k-th transition of
+        # every cluster at once over a graph without cross-cluster edges
+        gx, gy = np.divmod(self.graph.cells, N)
+        node_cluster = self._cluster_of(gx, gy)
+        src = np.repeat(np.arange(len(self.graph)), np.diff(self.graph.indptr))
+        inside = node_cluster[src] == node_cluster[self.graph.indices]
+        indptr = np.zeros(len(self.graph) + 1, np.int64)
+        np.cumsum(np.bincount(src[inside], minlength=len(self.graph)),
+                  out=indptr[1:])
+        local = GridGraph.from_arrays(
+            self.graph.shape, self.graph.cells, self.graph.node_id,
+            indptr, self.graph.indices[inside])
+
+        order = np.argsort(self.cluster, kind='stable')
+        first = np.searchsorted(self.cluster[order], self.cluster[order])
+        rank = np.empty_like(order)
+        rank[order] = np.arange(order.size) - first
+        graph_node = self.graph.node_id[flat]
+        for k in range(int(rank.max(initial=-1)) + 1):
+            sources = np.flatnonzero(rank == k)
+            distance, _ = local.search(graph_node[sources])
+            source_of = dict(zip(self.cluster[sources].tolist(),
+                                 sources.tolist()))
+            reached = distance[graph_node]
+            for v in np.flatnonzero((rank > k) & (reached > 0)).tolist():
+                u = source_of[int(self.cluster[v])]
+                self.edges[u].append((v, int(reached[v])))
+                self.edges[v].append((u, int(reached[v])))
+
+    def _cluster_distances(self, cell):
+        """
+        Breadth-first search inside the cluster of a padded cell.
+
+        Returns
+        -------
+        dict
+            In-cluster step distance of every reachable transition.
+        """
+        C, W = self.cluster_size, self.width
+        x, y = divmod(cell, W)
+        x0, y0 = (x - 1) // C * C + 1, (y - 1) // C * C + 1
+        members = self.members.get(self._cluster_of(x - 1, y - 1), {})
+        passable = self.passable
+
+        found = {}
+        seen = {cell}
+        frontier = [cell]
+        steps = 0
+        while frontier:
+            for node in frontier:
+                if node in members:
+                    found[members[node]] = steps
+            steps += 1
+            fresh = []
+            for node in frontier:
+                for nbr in (node - W, node + W, node - 1, node + 1):
+                    if passable[nbr] and nbr not in seen:
+                        nx_, ny_ = divmod(nbr, W)
+                        if x0 <= nx_ < x0 + C and y0 <= ny_ < y0 + C:
+                            seen.add(nbr)
+                            fresh.append(nbr)
+            frontier = fresh
+        return found
+
+    def _abstract_path(self, source, goal):
+        """
+        A* over the abstract graph between two padded cells.
+
+        Returns
+        -------
+        list of int
+            Padded cells from `source` to `goal` through transitions,
+            or None if there is no abstract route.
+        """
+        W = self.width
+        gx, gy = divmod(goal, W)
+        exits = self._cluster_distances(goal)
+        cells, edges = self.cells, self.edges
+
+        g_score, parent, heap = {}, {}, []
+        for node, d in self._cluster_distances(source).items():
+            g_score[node] = d
+            parent[node] = -1
+            x, y = divmod(int(cells[node]), W)
+            h = abs(x - gx) + abs(y - gy)
+            heappush(heap, (d + h, h, node))
+
+        GOAL = -2
+        expanded = 0
+        while heap:
+            f, h, node = heappop(heap)
+            if node == GOAL:
+                break
+            g = f - h
+            if g > g_score[node]:
+                continue
+            expanded += 1
+            if node in exits:
+                cost = g + exits[node]
+                if cost < g_score.get(GOAL, cost + 1):
+                    g_score[GOAL] = cost
+                    parent[GOAL] = node
+                    heappush(heap, (cost, 0, GOAL))
+            for nbr, d in edges[node]:
+                cost = g + d
+                if cost < g_score.get(nbr, cost + 1):
+                    g_score[nbr] = cost
+                    parent[nbr] = node
+                    x, y = divmod(int(cells[nbr]), W)
+                    h = abs(x - gx) + abs(y - gy)
+                    heappush(heap, (cost + h, h, nbr))
+        else:
+            self.expanded += expanded
+            return None
+
+        self.expanded += expanded
+        route = [goal]
+        node = parent[GOAL]
+        while node != -1:
+            route.append(int(cells[node]))
+            node = parent[node]
+        route.append(source)
+        route.reverse()
+        return route
+
+    def _refine(self, u, v):
+        """
+        Find the path of one hop between padded cells.
+        """
+        W = self.width
+        return AStarPathfinder.find_path(
+            self, (u // W - 1, u % W - 1), (v // W - 1, v % W - 1))
+
+    def _segments(self, route):
+        for u, v in zip(route[1:-1], route[2:]):
+            yield self._refine(u, v)
+
+    def plan(self, start, target):
+        source, goal = self._index(start), self._index(target)
+        if not (self.passable[source] and self.passable[goal]):
+            return [], None
+
+        C, W = self.cluster_size, self.width
+        (sx, sy), (gx, gy) = divmod(source - W - 1, W), divmod(goal - W - 1, W)
+        if abs(sx // C - gx // C) + abs(sy // C - gy // C) <= 1:
+            return AStarPathfinder.find_path(self, start, target), None
+
+        route = self._abstract_path(source, goal)
+        if route is None:
+            return AStarPathfinder.find_path(self, start, target), None
+        return self._refine(route[0], route[1]), self._segments(route)
+
+    def find_path(self, start, target):
+        path, segments = self.plan(start, target)
+        for segment in segments or ():
+            path += segment[1:]
+        return path
+
+
+PATHFINDERS = {
+    'astar': AStarPathfinder,
+    'jps': JumpPointPathfinder,
+    'bfs': BFSPathfinder,
+    'networkx': NetworkXPathfinder,
+    'hpa': HierarchicalPathfinder,
+}
+
+
+class PathArena:
+    """
+    Shared int32 storage for the paths of many nodes.
+
+    Every slot holds one path as a run of flat grid indices in a
+    common buffer, with a cursor to its next waypoint, so advancing
+    along a path is O(1). Replacing a path abandons the old run, and
+    the buffer is compacted (dropping abandoned runs and visited
+    waypoints) before it grows, so it stays within twice the size of
+    the waypoints still to be visited.
+
+    A path may also have pending segments, e.g. from
+    `HierarchicalPathfinder.plan`, which are only computed and
+    appended once the node has walked the waypoints before them.
+
+    Attributes
+    ----------
+    buffer : ndarray
+        Int32 flat grid indices of all stored waypoints.
+    start : ndarray
+        Offset of every slot's run in `buffer`.
+    length : ndarray
+        Length of every slot's run.
+    cursor : ndarray
+        Index of every slot's next waypoint within its run.
+    width : int
+        Width of the grid, used to flatten coordinates.
+    pending : dict
+        Iterator of the segments still to come of every slot that
+        has some.
+    """
+    def __init__(self, slots, width, capacity=1024):
+        self.buffer = np.empty(capacity, np.int32)
+        self.start = np.zeros(slots, np.int64)
+        self.length = np.zeros(slots, np.int64)
+        self.cursor = np.zeros(slots, np.int64)
+        self.width = width
+        self.end = 0
+        self.pending = {}
+
+    def _reserve(self, n):
+        """
+        Make room for `n` more waypoints at the end of the buffer.
+        """
+        if self.end + n <= self.buffer.size:
+            return
+        
+        remaining = self.length - self.cursor
+        if 2 * (remaining.sum() + n) <= self.buffer.size:
+            self.compact()
         else:
-            weights[e] = 1
+            size = max(2 * self.buffer.size, 2 * (remaining.sum() + n))
+            buffer, self.buffer = self.buffer, np.empty(int(size), np.int32)
+            self.compact(buffer)
+
+    def compact(self, source=None):
+        """
+        Move the unvisited waypoints of every slot to the front
+        of the buffer.
+
+        Parameters
+        ----------
+        source : ndarray, optional
+            Buffer to copy the waypoints from, by default `buffer`.
+        """
+        if source is None:
+            source = self.buffer
+        remaining = self.length - self.cursor
+        order = np.argsort(self.start, kind='stable')
+        end = 0
+        for slot in order[remaining[order] > 0]:
+            begin = self.start[slot] + self.cursor[slot]
+            n = remaining[slot]
+            self.buffer[end:end + n] = source[begin:begin + n]
+            self.start[slot] = end
+            end += n
+        self.start[remaining == 0] = 0
+        self.length = remaining
+        self.cursor[:] = 0
+        self.end = end
+
+    def export(self, slots=None):
+        """
+        Get the unvisited waypoints of slots, computing their
+        pending segments.
+
+        Parameters
+        ----------
+        slots : ndarray, optional
+            Slots to export, by default all.
+
+        Returns
+        -------
+        (ndarray, ndarray)
+            The unvisited flat grid indices of the slots, in the order
+            of `slots`, and the number of them in every slot.
+        """
+        if slots is None:
+            slots = np.arange(self.length.size)
+            resolve = list(self.pending)
+        else:
+            resolve = [slot for slot in slots.tolist() if slot in self.pending]
+        for slot in resolve:
+            self.resolve(slot)
+        remaining = (self.length - self.cursor)[slots]
+        offsets = np.arange(remaining.sum()) - np.repeat(
+            np.cumsum(remaining) - remaining, remaining)
+        begin = np.repeat((self.start + self.cursor)[slots], remaining)
+        return self.buffer[begin + offsets], remaining
+
+    def select(self, slots):
+        """
+        Keep only some slots, renumbered in the given order.
+
+        The waypoints of dropped slots are reclaimed by the next
+        `compact`; pending segments are kept.
+
+        Parameters
+        ----------
+        slots : ndarray
+            Slots to keep.
+        """
+        self.pending = {
+            new: self.pending[old]
+            for new, old in enumerate(slots.tolist()) if old in self.pending}
+        self.start = self.start[slots]
+        self.length = self.length[slots]
+        self.cursor = self.cursor[slots]
+
+    def extend(self, waypoints, lengths):
+        """
+        Add slots holding exported paths after the existing ones.
+
+        Parameters
+        ----------
+        waypoints : ndarray
+            Flat grid indices of the new slots, in slot order.
+        lengths : ndarray
+            The number of waypoints of every new slot.
+        """
+        n = len(waypoints)
+        self._reserve(n)
+        self.buffer[self.end:self.end + n] = waypoints
+        lengths = np.asarray(lengths, np.int64)
+        self.start = np.concatenate(
+            (self.start, self.end + np.cumsum(lengths) - lengths))
+        self.length = np.concatenate((self.length, lengths))
+        self.cursor = np.concatenate((self.cursor, np.zeros_like(lengths)))
+        self.end += n
+
+    def load(self, waypoints, lengths):
+        """
+        Replace the paths of all slots with exported ones.
+
+        Parameters
+        ----------
+        waypoints : ndarray
+            Flat grid indices of all slots, in slot order.
+        lengths : ndarray
+            The number of waypoints of every slot.
+        """
+        self.buffer = np.array(waypoints, np.int32)
+        if self.buffer.size == 0:
+            self.buffer = np.empty(1024, np.int32)
+        self.length = np.array(lengths, np.int64)
+        self.start = np.concatenate(([0], np.cumsum(self.length)[:-1]))
+        self.cursor = np.zeros_like(self.length)
+        self.end = int(self.length.sum())
+        self.pending = {}
+
+    def store(self, slot, path, pending=None):
+        """
+        Replace the path of a slot.
+
+        Parameters
+        ----------
+        slot : int
+            Slot to store the path in.
+        path : list of (int, int)
+            Waypoints of the new path.
+        pending : iterator, optional
+            Segments that follow `path`, each starting at the last
+            waypoint before it, by default none.
+        """
+        self.pending.pop(slot, None)
+        self._write(slot, path)
+        if pending is not None:
+            self.pending[slot] = pending
+
+    def _write(self, slot, path):
+        self.length[slot] = self.cursor[slot] = 0
+        n = len(path)
+        if n == 0:
+            return
+        self._reserve(n)
+        xy = np.asarray(path, np.int64).reshape(-1, 2)
+        self.buffer[self.end:self.end + n] = xy[:, 0] * self.width + xy[:, 1]
+        self.start[slot] = self.end
+        self.length[slot] = n
+        self.end += n
+
+    def _refill(self, slot):
+        """
+        Replace a walked path with its next non-empty pending segment.
+
+        Returns
+        -------
+        bool
+            Whether there was one.
+        """
+        segments = self.pending.get(slot)
+        while segments is not None:
+            segment = next(segments, None)
+            if segment is None:
+                del self.pending[slot]
+                return False
+            if len(segment) > 1:
+                self._write(slot, segment[1:])
+                return True
+        return False
+
+    def resolve(self, slot):
+        """
+        Compute all pending segments of a slot into its path.
+
+        Parameters
+        ----------
+        slot : int
+            Slot of the path.
+        """
+        segments = self.pending.pop(slot, None)
+        if segments is None:
+            return
+        path = self.remaining(slot)
+        for segment in segments:
+            path += segment[1:]
+        self._write(slot, path)
+
+    def remaining(self, slot):
+        """
+        List the waypoints a slot has yet to visit.
+
+        Parameters
+        ----------
+        slot : int
+            Slot of the path.
+
+        Returns
+        -------
+        list of (int, int)
+            The remaining `(x,y)` waypoints, without the pending
+            segments (see `resolve`).
+        """
+        begin = self.start[slot] + self.cursor[slot]
+        flat = self.buffer[begin:self.start[slot] + self.length[slot]]
+        return [divmod(i, self.width) for i in flat.tolist()]
+
+    def next_waypoint(self, slot):
+        """
+        Advance one slot to its next waypoint.
+
+        Parameters
+        ----------
+        slot : int
+            Slot of the path.
+
+        Returns
+        -------
+        (int, int)
+            The `(x,y)` waypoint, or None if the path is finished.
+        """
+        cursor = self.cursor[slot]
+        if cursor >= self.length[slot]:
+            if not self._refill(slot):
+                return None
+            cursor = 0
+        self.cursor[slot] = cursor + 1
+        return divmod(int(self.buffer[self.start[slot] + cursor]), self.width)
+
+    def advance(self, slots):
+        """
+        Advance many slots to their next waypoints at once.
+
+        Parameters
+        ----------
+        slots : ndarray
+            Slots to advance.
 
-    nx.set_edge_attributes(G, weights, 'cost')
-    
-    return G
\ No newline at end of file
+        Returns
+        -------
+        (ndarray, ndarray, ndarray)
+            Boolean mask over `slots` of the paths that had a waypoint
+            left, and the X and Y coordinates of those waypoints.
+        """
+        moving = self.cursor[slots] < self.length[slots]
+        if self.pending:
+            for k in np.flatnonzero(~moving).tolist():
+                if int(slots[k]) in self.pending:
+                    moving[k] = self._refill(int(slots[k]))
+        movers = slots[moving]
+        flat = self.buffer[self.start[movers] + self.cursor[movers]]
+        self.cursor[movers] += 1
+        x, y = np.divmod(flat, self.width)
+        return moving, x, y
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+
+import multiprocessing
+from collections import defaultdict
+
+import numpy as np
+
+from pathing import PATHFINDERS, GridGraph, shortest_paths
+from sharedmem import share_arrays, attach_arrays, release_arrays
+
+
+# arrays a GridGraph is rebuilt from, as in SIRMap.GRAPH_ARRAYS
+GRAPH_ARRAYS = ('cells', 'node_id', 'indptr', 'indices')
+
+# path search backend of this worker process, attached by _attach
+_PATHFINDER = None
+_BLOCKS = []
+
+
+def _attach(specs, shape, pathfinder):
+    global _PATHFINDER, _BLOCKS
+    _BLOCKS, arrays = attach_arrays(specs)
+    graph = GridGraph.from_arrays(
+        shape, *(arrays[name] for name in GRAPH_ARRAYS))
+    _PATHFINDER = PATHFINDERS[pathfinder](graph)
+
+
+def _search(queries):
+    return [np.array(_PATHFINDER.find_path(start, target), np.int64)
+            for start, target in queries]
+
+
+class PathPlanner:
+    """Answers the path requests of a model phase in one batch
+
+       Nodes queue a request instead of searching right away, and
+       `flush` writes all answers into the PathArena before the nodes
+       move again. Requests to the same destination share a single
+       breadth-first search outward from it. The rest go through the
+       map's pathfinder, on a pool of worker processes that share the
+       map graph when there are enough of them, so large replanning
+       bursts use every core.
+
+       Attributes
+        ----------
+        sir_map : SIRMap
+            The map the paths are planned on
+        arena : PathArena
+            Where the paths are written
+        pathfinder : str
+            The name of the map's path search backend, which the
+            worker processes build their own copy of
+        processes : integer
+            Number of worker processes, 0 to search in this process
+        share : integer
+            Smallest number of requests to one destination that are
+            answered by one shared search
+        min_batch : integer
+            Smallest number of remaining requests sent to the pool
+        requests : dict
+            The `(start, target)` of every slot waiting for a path
+    """
+    def __init__(self, sir_map, arena, pathfinder='jps', processes=0,
+                 share=2, min_batch=None):
+        self.sir_map = sir_map
+        self.arena = arena
+        self.pathfinder = pathfinder
+        self.processes = processes
+        self.share = share
+        self.min_batch = 4 * processes if min_batch is None else min_batch
+        self.requests = {}
+        self._pool = None
+        self._blocks = []
+
+    def request(self, slot, start, target):
+        """Queues a path request, replacing any earlier one of the slot
+
+        Parameters
+        ----------
+        slot : integer
+            The arena slot to write the path to
+        start : (int, int)
+            `(x,y)` coordinate tuple to path from
+        target : (int, int)
+            `(x,y)` coordinate tuple to path to
+        """
+        self.requests[slot] = (start, target)
+
+    def flush(self):
+        """Answers all queued requests and stores their paths
+        """
+        if not self.requests:
+            return
+        requests, self.requests = self.requests, {}
+        profiler = self.sir_map.profiler
+
+        by_target = defaultdict(list)
+        for slot, (start, target) in requests.items():
+            by_target[tuple(target)].append(slot)
+
+        single = []
+        for target, slots in by_target.items():
+            if len(slots) < self.share:
+                single += slots
+                continue
+            with profiler.phase('pathfind.shared'):
+                paths = shortest_paths(
+                    self.sir_map.graph,
+                    [requests[slot][0] for slot in slots], target)
+            profiler.count('pathfind.shared', len(slots))
+            for slot, path in zip(slots, paths):
+                self.arena.store(slot, path)
+
+        if self.processes and len(single) >= self.min_batch:
+            with profiler.phase('pathfind.pool'):
+                paths = self._search_pool([requests[slot] for slot in single])
+            profiler.count('pathfind.pool', len(single))
+            for slot, path in zip(single, paths):
+                self.arena.store(slot, path)
+        else:
+            for slot in single:
+                self.arena.store(slot, *self.sir_map.plan_path(*requests[slot]))
+
+    def _search_pool(self, queries):
+        if self._pool is None:
+            graph = self.sir_map.graph
+            self._blocks, specs = share_arrays(
+                {name: getattr(graph, name) for name in GRAPH_ARRAYS})
+            self._pool = multiprocessing.Pool(
+                self.processes, initializer=_attach,
+                initargs=(specs, graph.shape, self.pathfinder))
+
+        chunks = [queries[k::self.processes] for k in range(self.processes)]
+        answers = self._pool.map(_search, chunks)
+        paths = [None] * len(queries)
+        for k, chunk in enumerate(answers):
+            paths[k::self.processes] = chunk
+        return paths
+
+    def close(self):
+        """Stops the worker processes and frees the shared graph
+        """
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+        release_arrays(self._blocks, unlink=True)
+        self._blocks = []
@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+
+import cProfile
+import io
+import json
+import pstats
+import time
+from collections import defaultdict
+
+
+class _NullPhase:
+    """A phase timer that does nothing"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class NullProfiler:
+    """The profiler of a model that is not being profiled
+
+       Every hook is a no-op, so instrumented code costs one method
+       call per hook. Code that would do extra work to report a value
+       should check `enabled` first.
+    """
+    enabled = False
+    _phase = _NullPhase()
+
+    def phase(self, name):
+        return self._phase
+
+    def count(self, name, n=1):
+        pass
+
+    def begin_step(self):
+        pass
+
+    def end_step(self, step):
+        pass
+
+    def close(self):
+        pass
+
+
+NULL_PROFILER = NullProfiler()
+
+
+class _Phase:
+    """Adds the time spent inside a `with` block to a phase total"""
+    __slots__ = ('times', 'name', 'start')
+
+    def __init__(self, times, name):
+        self.times = times
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.times[self.name] += time.perf_counter() - self.start
+        return False
+
+
+class Profiler(NullProfiler):
+    """Per-step phase timers and event counters of a model
+
+       Phases nest, and every phase is timed inclusively, e.g.
+       `pathfind` time is also part of the `move` phase it ran in.
+       After every step the timings and counts of the step are sent
+       to the sinks as one record and added to the totals.
+
+       Attributes
+        ----------
+        sinks : list
+            Objects with `write(record)` and `close()` methods
+        times : dict
+            Total seconds spent in every phase
+        counts : dict
+            Total of every counter
+        steps : integer
+            The number of steps profiled
+        cprofile : cProfile.Profile or None
+            The function profiler run during steps, while enabled
+    """
+    enabled = True
+
+    def __init__(self, *sinks, cprofile=False):
+        self.sinks = list(sinks)
+        self.times = defaultdict(float)
+        self.counts = defaultdict(int)
+        self.steps = 0
+        self.cprofile = None
+        self._cprofile_on = False
+        self._step_times = defaultdict(float)
+        self._step_counts = defaultdict(int)
+        self._phases = {}
+        if cprofile:
+            self.enable_cprofile()
+
+    def phase(self, name):
+        """Gets the timer of a phase
+
+        Parameters
+        ----------
+        name : str
+            The name of the phase, e.g. `'move'`
+
+        Returns
+        -------
+        context manager
+            Adds the time spent in its `with` block to the phase
+        """
+        timer = self._phases.get(name)
+        if timer is None:
+            timer = self._phases[name] = _Phase(self._step_times, name)
+        return timer
+
+    def count(self, name, n=1):
+        """Adds to a counter
+
+        Parameters
+        ----------
+        name : str
+            The name of the counter, e.g. `'pathfind.calls'`
+        n : integer, optional
+            The amount to add, by default 1
+        """
+        self._step_counts[name] += n
+
+    def enable_cprofile(self):
+        """Runs cProfile during the following steps
+        """
+        if self.cprofile is None:
+            self.cprofile = cProfile.Profile()
+        self._cprofile_on = True
+
+    def disable_cprofile(self):
+        """Stops running cProfile, keeping what it collected
+        """
+        self._cprofile_on = False
+
+    def cprofile_stats(self, sort='cumulative', limit=20):
+        """Formats the functions cProfile spent most time in
+
+        Parameters
+        ----------
+        sort : str, optional
+            The `pstats` sort key, by default 'cumulative'
+        limit : integer, optional
+            The number of functions listed, by default 20
+
+        Returns
+        -------
+        str
+            The `pstats` report, empty if cProfile never ran
+        """
+        if self.cprofile is None:
+            return ''
+        out = io.StringIO()
+        pstats.Stats(self.cprofile, stream=out).sort_stats(sort) \
+            .print_stats(limit)
+        return out.getvalue()
+
+    def begin_step(self):
+        if self._cprofile_on:
+            self.cprofile.enable()
+
+    def end_step(self, step):
+        """Closes the record of a step and sends it to the sinks
+
+        Parameters
+        ----------
+        step : integer
+            The number of the step that just finished
+        """
+        if self._cprofile_on:
+            self.cprofile.disable()
+
+        record = {'step': step,
+                  'times': dict(self._step_times),
+                  'counts': dict(self._step_counts)}
+        for name, seconds in self._step_times.items():
+            self.times[name] += seconds
+        for name, n in self._step_counts.items():
+            self.counts[name] += n
+        self._step_times.clear()
+        self._step_counts.clear()
+        self.steps += 1
+
+        for sink in self.sinks:
+            sink.write(record)
+
+    def summary(self):
+        """Collects the totals and per-step averages
+
+        Returns
+        -------
+        dict
+            `steps`, and `times` and `counts` mapping every phase and
+            counter to its `(total, mean per step)`
+        """
+        steps = max(self.steps, 1)
+        return {
+            'steps': self.steps,
+            'times': {k: (v, v / steps) for k, v in self.times.items()},
+            'counts': {k: (v, v / steps) for k, v in self.counts.items()}}
+
+    def report(self):
+        """Formats `summary` as a table
+
+        Returns
+        -------
+        str
+            One line per phase and counter
+        """
+        summary = self.summary()
+        lines = [f'Profiled steps: {summary["steps"]}',
+                 f'{"phase":<24}{"total s":>12}{"ms/step":>12}']
+        for name, (total, mean) in sorted(summary['times'].items()):
+            lines.append(f'{name:<24}{total:>12.4f}{mean * 1e3:>12.4f}')
+        lines.append(f'{"counter":<24}{"total":>12}{"per step":>12}')
+        for name, (total, mean) in sorted(summary['counts'].items()):
+            lines.append(f'{name:<24}{total:>12}{mean:>12.2f}')
+        return '\n'.join(lines)
+
+    def close(self):
+        """Closes all sinks
+        """
+        for sink in self.sinks:
+            sink.close()
+
+
+class SummarySink:
+    """Keeps the largest value of every phase and counter in memory
+
+       Together with the totals of the Profiler this shows whether a
+       phase is slow on average or only in a few spikes.
+
+       Attributes
+        ----------
+        worst : dict
+            The `(value, step)` of the slowest step of every phase and
+            the largest step count of every counter, under the keys
+            `'times'` and `'counts'`
+    """
+    def __init__(self):
+        self.worst = {'times': {}, 'counts': {}}
+
+    def write(self, record):
+        for kind in ('times', 'counts'):
+            worst = self.worst[kind]
+            for name, value in record[kind].items():
+                if name not in worst or value > worst[name][0]:
+                    worst[name] = (value, record['step'])
+
+    def close(self):
+        pass
+
+
+class JSONLinesSink:
+    """Writes one JSON object per step to a file
+
+       Parameters
+        ----------
+        file : str or file-like
+            The path to create, or an open text file that is left open
+    """
+    def __init__(self, file):
+        self._owned = isinstance(file, str)
+        self.file = open(file, 'w') if self._owned else file
+
+    def write(self, record):
+        self.file.write(json.dumps(record) + '\n')
+
+    def close(self):
+        if self._owned:
+            self.file.close()
+        else:
+            self.file.flush()
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+
+# one record per node per step, packed without padding
+RECORD_DTYPE = np.dtype([
+    ('step', '<i4'), ('node', '<i4'),
+    ('x', '<i4'), ('y', '<i4'), ('status', 'u1')])
+
+MAGIC = b'SIRTRAJ1'
+HEADER_SIZE = 64
+
+
+class TrajectoryRecorder:
+    """Streams the position and status of every node at every step
+    into an append-only binary file
+
+       Records collect in a preallocated chunk that is appended to the
+       file whenever it fills up, so memory use stays bounded however
+       long the run. Attach it to a model with
+       `SIRModel.attach_recorder`.
+
+       Attributes
+        ----------
+        path : str
+            The trajectory file
+        chunk : ndarray
+            The preallocated RECORD_DTYPE buffer
+        agents : integer
+            The number of nodes recorded every step
+    """
+    def __init__(self, path, chunk_records=1 << 20):
+        self.path = path
+        self.chunk = np.empty(chunk_records, RECORD_DTYPE)
+        self.fill = 0
+        self.agents = None
+        self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _open(self, agents):
+        self.agents = agents
+        self.file = open(self.path, 'wb')
+        header = np.zeros(HEADER_SIZE, np.uint8)
+        header[:len(MAGIC)] = np.frombuffer(MAGIC, np.uint8)
+        header[8:16] = np.frombuffer(np.int64(agents).tobytes(), np.uint8)
+        self.file.write(header.tobytes())
+
+    def record(self, model):
+        """Appends the current state of every node of a model
+
+        Parameters
+        ----------
+        model : SIRModel
+            The model to record
+        """
+        x, y, status, _ = model.state_arrays()
+        if self.file is None:
+            self._open(x.size)
+        elif x.size != self.agents:
+            raise ValueError('the number of nodes changed while recording')
+
+        begin = 0
+        while begin < x.size:
+            end = min(begin + self.chunk.size - self.fill, x.size)
+            rows = self.chunk[self.fill:self.fill + end - begin]
+            rows['step'] = model.steps
+            rows['node'] = np.arange(begin, end)
+            rows['x'] = x[begin:end]
+            rows['y'] = y[begin:end]
+            rows['status'] = status[begin:end]
+            self.fill += end - begin
+            if self.fill == self.chunk.size:
+                self.flush()
+            begin = end
+
+    def flush(self):
+        """Appends the buffered records to the file
+        """
+        if self.fill:
+            self.file.write(self.chunk[:self.fill].tobytes())
+            self.file.flush()
+            self.fill = 0
+
+    def close(self):
+        """Flushes the remaining records and closes the file
+        """
+        if self.file is not None:
+            self.flush()
+            self.file.close()
+            self.file = None
+
+
+class TrajectoryReader:
+    """Random access to a file written by TrajectoryRecorder
+
+       The records are memory-mapped, so reading a range of steps
+       only touches that part of the file.
+
+       Attributes
+        ----------
+        agents : integer
+            The number of nodes recorded every step
+        records : numpy.memmap
+            All records, in step then node order
+        first_step : integer
+            The first recorded step
+        n_steps : integer
+            The number of recorded steps
+    """
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            header = f.read(HEADER_SIZE)
+        if header[:len(MAGIC)] != MAGIC:
+            raise ValueError(f'{path} is not a trajectory file')
+        self.agents = int(np.frombuffer(header[8:16], np.int64)[0])
+
+        if self.agents == 0:
+            # an empty population writes no records, and mmap cannot
+            # map nothing
+            self.records = np.zeros(0, RECORD_DTYPE)
+            self.n_steps = 0
+        else:
+            self.records = np.memmap(
+                path, RECORD_DTYPE, 'r', offset=HEADER_SIZE)
+            self.n_steps = self.records.size // self.agents
+        self.first_step = int(self.records[0]['step']) if self.n_steps else 0
+
+    def __len__(self):
+        return self.n_steps
+
+    def steps(self, start, stop=None):
+        """Gets the records of a range of steps
+
+        Parameters
+        ----------
+        start : integer
+            The first step
+        stop : integer, optional
+            One past the last step, by default only `start`
+
+        Returns
+        -------
+        ndarray
+            RECORD_DTYPE array of shape `(steps, agents)`
+        """
+        if stop is None:
+            stop = start + 1
+        begin = max(start - self.first_step, 0)
+        end = max(min(stop - self.first_step, self.n_steps), begin)
+        rows = self.records[begin * self.agents:end * self.agents]
+        return rows.reshape(end - begin, self.agents)
+
+    def node(self, node, start=None, stop=None):
+        """Gets the track of one node over a range of steps
+
+        Parameters
+        ----------
+        node : integer
+            The node id
+        start : integer, optional
+            The first step, by default the first recorded one
+        stop : integer, optional
+            One past the last step, by default past the last recorded one
+
+        Returns
+        -------
+        ndarray
+            RECORD_DTYPE array with one record per step
+        """
+        if start is None:
+            start = self.first_step
+        if stop is None:
+            stop = self.first_step + self.n_steps
+        return self.steps(start, stop)[:, node]
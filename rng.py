@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+
+class BlockRandom:
+    """Random numbers from a numpy Generator, drawn in blocks
+
+       Scalar draws are served from a block of uniform numbers drawn
+       in one call, so they cost about as much as a list lookup.
+       Array draws go straight to the Generator. The same seed always
+       produces the same sequence of draws.
+
+       Attributes
+        ----------
+        generator : numpy.random.Generator
+            The underlying bit stream
+        block_size : integer
+            The number of uniform numbers drawn at a time
+    """
+    def __init__(self, seed=None, block_size=4096):
+        if isinstance(seed, np.random.Generator):
+            self.generator = seed
+        else:
+            self.generator = np.random.default_rng(seed)
+        self.block_size = block_size
+        self._block = []
+        self._pos = 0
+
+    def _refill(self):
+        self._block = self.generator.random(self.block_size).tolist()
+        self._pos = 0
+
+    def get_state(self):
+        """Captures the state of the stream
+
+        Returns
+        -------
+        (dict, ndarray)
+            The state of the bit generator and the pre-drawn numbers
+            not yet used
+        """
+        return (self.generator.bit_generator.state,
+                np.array(self._block[self._pos:], np.float64))
+
+    def set_state(self, state):
+        """Restores a state captured by `get_state`
+
+        Parameters
+        ----------
+        state : (dict, ndarray)
+            The state to continue the stream from
+        """
+        self.generator.bit_generator.state = state[0]
+        self._block = state[1].tolist()
+        self._pos = 0
+
+    def random(self, size=None):
+        """Draws uniform numbers in [0, 1)
+
+        Parameters
+        ----------
+        size : integer, optional
+            The number of draws, by default a single float
+
+        Returns
+        -------
+        float or ndarray
+            The draws
+        """
+        if size is not None:
+            return self.generator.random(size)
+        if self._pos == len(self._block):
+            self._refill()
+        self._pos += 1
+        return self._block[self._pos - 1]
+
+    def integers(self, low, high=None, size=None):
+        """Draws integers in [low, high), or [0, low) if `high` is None
+
+        Parameters
+        ----------
+        low : integer
+            The lowest value, or the bound if `high` is None
+        high : integer, optional
+            One above the highest value
+        size : integer, optional
+            The number of draws, by default a single integer
+
+        Returns
+        -------
+        integer or ndarray
+            The draws
+        """
+        if size is not None:
+            return self.generator.integers(low, high, size)
+        if high is None:
+            low, high = 0, low
+        return low + int(self.random() * (high - low))
+
+    def uniform(self, low=0.0, high=1.0, size=None):
+        """Draws uniform numbers in [low, high)
+
+        Returns
+        -------
+        float or ndarray
+            The draws
+        """
+        return low + (high - low) * self.random(size)
+
+
+def spawn_seeds(seed, n):
+    """Creates independent seeds for parallel runs or workers
+
+    Parameters
+    ----------
+    seed : int or None
+        The root seed, by default fresh entropy
+    n : integer
+        The number of streams
+
+    Returns
+    -------
+    list of numpy.random.SeedSequence
+        Seeds of statistically independent streams
+    """
+    return np.random.SeedSequence(seed).spawn(n)
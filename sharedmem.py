@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+def share_arrays(arrays):
+    """
+    Copy named arrays into new shared memory blocks.
+
+    Parameters
+    ----------
+    arrays : dict
+        Named ndarrays to share.
+
+    Returns
+    -------
+    (list, dict)
+        The SharedMemory blocks, which the caller must keep alive and
+        finally release, and a picklable description of every array
+        for `attach_arrays`.
+    """
+    blocks, specs = [], {}
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        block = shared_memory.SharedMemory(
+            create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, array.dtype, block.buf)[...] = array
+        blocks.append(block)
+        specs[name] = (block.name, array.shape, array.dtype.str)
+    return blocks, specs
+
+
+def attach_arrays(specs):
+    """
+    Attach read-only views of arrays shared by `share_arrays`.
+
+    Parameters
+    ----------
+    specs : dict
+        Array descriptions from `share_arrays`.
+
+    Returns
+    -------
+    (list, dict)
+        The attached SharedMemory blocks, which must outlive the
+        arrays, and the named read-only arrays.
+    """
+    blocks, arrays = [], {}
+    for name, (block_name, shape, dtype) in specs.items():
+        block = shared_memory.SharedMemory(block_name)
+        array = np.ndarray(shape, np.dtype(dtype), block.buf)
+        array.flags.writeable = False
+        blocks.append(block)
+        arrays[name] = array
+    return blocks, arrays
+
+
+def release_arrays(blocks, unlink=False):
+    """
+    Close shared memory blocks.
+
+    Parameters
+    ----------
+    blocks : list
+        SharedMemory blocks from `share_arrays` or `attach_arrays`.
+    unlink : bool, optional
+        Whether to also free the blocks, which only their creator
+        should do, by default False.
+    """
+    for block in blocks:
+        block.close()
+        if unlink:
+            block.unlink()
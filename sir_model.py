@@ -5,14 +5,27 @@ Created on Thu May  7 13:01:19 2020
 @author: Naomi Hiebert
 """
 
-import random
+import json
 from enum import Enum
 
 import numpy as np
-import networkx as nx
 from matplotlib import image
 
-from pathing import Terrain, create_graph, random_idx, dist
+from pathing import (
+    Terrain, PATHFINDERS, GridGraph, PathArena,
+    create_graph, flow_field, follow_flow)
+from miasma import MiasmaField, TiledMiasmaField
+from contact import SpatialHash
+from rng import BlockRandom
+from status_index import StatusIndex
+from map_cache import cached_arrays
+from profiling import NULL_PROFILER
+from planner import PathPlanner
+from events import EventCalendar, geometric
+
+
+# bumped whenever the layout of SIRModel checkpoints changes
+CHECKPOINT_VERSION = 2
 
 
 class SIRStatus(Enum):
@@ -24,6 +37,13 @@ class SIRStatus(Enum):
     QUARANTINED = 4
 
 
+# order of the status groups of a StatusIndex; infected and quarantined
+# are adjacent so they can be listed together
+STATUS_GROUPS = (
+    SIRStatus.SUSCEPTIBLE.value, SIRStatus.INFECTED.value,
+    SIRStatus.QUARANTINED.value, SIRStatus.RECOVERED.value)
+
+
 # # This is not used currently
 class MapType(Enum):
     """ An enum that represents an area type on the SIRMap
@@ -62,16 +82,57 @@ class SIRNode:
             The Y coordinate.
         status : SIRStatus
             The infection state of the person
+        arena : PathArena
+            The storage holding the path of the person
+        slot : integer
+            The slot of `arena` holding the path of the person
+        rng : BlockRandom
+            The source of randomness of the person
+        status_index : StatusIndex
+            The index to keep up to date with the status, if any
         """
-    def __init__(self, x=0, y=0, sir_map=None):
+    def __init__(self, x=0, y=0, sir_map=None, arena=None, slot=0, rng=None):
         self.x = x
         self.y = y
+        self.status_index = None
         self.status = SIRStatus.SUSCEPTIBLE
         if sir_map is not None:
             self.sir_map = sir_map
+            if arena is None:
+                arena = PathArena(1, sir_map.shape[1], capacity=64)
 
         self.urgency = 1
-        self.path = []
+        self.arena = arena
+        self.slot = slot
+        # path of a node without a map, which has no arena to hold it
+        self._path = []
+        self.rng = BlockRandom() if rng is None else rng
+
+    @property
+    def status(self):
+        return self._status
+
+    @status.setter
+    def status(self, value):
+        if self.status_index is not None:
+            self.status_index.move(self.slot, value.value)
+        self._status = value
+
+    @property
+    def path(self):
+        """The `(x,y)` waypoints the Node has yet to visit
+        """
+        if self.arena is None:
+            return self._path
+        self.arena.resolve(self.slot)
+        return self.arena.remaining(self.slot)
+
+    @path.setter
+    def path(self, value):
+        if self.arena is None:
+            self._path = value
+            return
+        self.arena.store(self.slot, value)
         
     def convalesce(self, recovery_rate):
         """Simulates the possibility of a Node recovering from infection
@@ -82,9 +143,10 @@ class SIRNode:
             The chance that an individual will recover (e.g. 0.02)
         """
         if self.is_contagious() or self.is_quarantined():
-            if random.random() < recovery_rate:
+            if self.rng.random() < recovery_rate:
                 self.status = SIRStatus.RECOVERED
-                self.pathfind(random_idx(self.sir_map.open))
+                self.pathfind(self.sir_map.sample(
+                    'open', rng=self.rng, near=(self.x, self.y)))
                 
     def infect(self):
         self.status = SIRStatus.INFECTED
@@ -127,7 +189,7 @@ class SIRNode:
             The aggressiveness of the disease
         """
         if self.is_susceptible() and other.is_contagious():
-            if random.random() < attack_rate:
+            if self.rng.random() < attack_rate:
                 self.infect()
                 
     def droplet_expose(self):
@@ -135,7 +197,7 @@ class SIRNode:
         """
         if self.sir_map is not None and self.is_susceptible():
             virus_level = self.sir_map.virus_level(self.x, self.y)
-            if random.randint(0, 255) < virus_level:
+            if self.rng.integers(0, 256) < virus_level:
                 self.infect()
                 
     def droplet_spread(self):
@@ -154,31 +216,42 @@ class SIRNode:
         y_max : integer
             The maximum Y position
         """
-        self.x, self.y = random_idx(self.sir_map.start)
+        self.x, self.y = self.sir_map.sample('start', rng=self.rng)
 
     def move(self):
         """Movement decision making for the Node
         """
         if self.is_quarantined():
-            if len(self.path) > 0:
-                self.x, self.y = self.path.pop(0)
+            self.follow_path()
 
-        elif random.random() <= self.urgency:
-            if self.is_contagious() and random.random() < 0.05:
-                self.pathfind(random_idx(self.sir_map.quarantine))
+        elif self.rng.random() <= self.urgency:
+            if self.is_contagious() and self.rng.random() < 0.05:
+                self.pathfind_region('quarantine')
                 self.status = SIRStatus.QUARANTINED
-            elif len(self.path) > 0:
-                self.x, self.y = self.path.pop(0)
-            else:
+            elif not self.follow_path():
                 self.new_task()
         else:
             pass
+
+    def follow_path(self):
+        """Moves the Node to the next waypoint of its current path
+
+        Returns
+        -------
+        boolean
+            Whether there was a waypoint left to move to
+        """
+        waypoint = self.arena.next_waypoint(self.slot)
+        if waypoint is None:
+            return False
+        self.x, self.y = waypoint
+        return True
                 
     def random_move(self):
         """Simulates random movement of the Node
         """
         # TODO create fluid motion for SIRNodes
-        rand = random.random()
+        rand = self.rng.random()
         if rand < 0.2 and self.can_enter(self.x+1, self.y):
             self.x += 1
         elif rand < 0.4 and self.can_enter(self.x-1, self.y):
@@ -193,13 +266,14 @@ class SIRNode:
     def new_task(self):
         """Defines a new task / path for the Node
         """
-        rand = random.random()
+        rand = self.rng.random()
         if rand < 0.1:
-            self.pathfind(random_idx(self.sir_map.target))
+            self.pathfind_region('target')
         elif rand < 0.2:
-            self.pathfind(random_idx(self.sir_map.start))
+            self.pathfind_region('start')
         elif rand < 0.5:
-            self.pathfind(random_idx(self.sir_map.valid))
+            self.pathfind(self.sir_map.sample(
+                'valid', rng=self.rng, near=(self.x, self.y)))
         else:
             self.random_move()
 
@@ -213,9 +287,484 @@ class SIRNode:
         target : (int, int)
             `(x,y)` coordinate tuple to path to from the current Node position
         """        
-        start = (self.x, self.y)
-        self.path = nx.astar_path(
-            self.sir_map.graph, start, target, heuristic=dist, weight='cost')
+        planner = self.sir_map.planner
+        if planner is not None:
+            planner.request(self.slot, (self.x, self.y), target)
+        else:
+            self.arena.store(
+                self.slot, *self.sir_map.plan_path((self.x, self.y), target))
+
+    def pathfind_region(self, region):
+        """
+        Computes a path to a random point of a terrain region by
+        walking the precomputed flow field of the region
+
+        Parameters
+        ----------
+        region : str
+            Name of the terrain mask of the SIRMap, e.g. `'target'`
+        """
+        target = self.sir_map.sample(
+            region, rng=self.rng, near=(self.x, self.y))
+        self.path = self.sir_map.path_to_region(
+            (self.x, self.y), region, target, self.rng)
+
+
+class PopulationNode(SIRNode):
+    """A view of one member of a Population presenting the SIRNode API
+
+       Reads and writes of the node attributes go straight through to
+       the arrays of the Population, so per-node and batched updates can
+       be mixed freely.
+
+       Attributes
+        ----------
+        population : Population
+            The Population holding the state of this node
+        idx : integer
+            The index of this node within the Population
+    """
+    def __init__(self, population, idx):
+        self.population = population
+        self.idx = idx
+        self.sir_map = population.sir_map
+        self.arena = population.arena
+        self.slot = idx
+        self.rng = population.rng
+
+    @property
+    def x(self):
+        return int(self.population.x[self.idx])
+
+    @x.setter
+    def x(self, value):
+        self.population.x[self.idx] = value
+
+    @property
+    def y(self):
+        return int(self.population.y[self.idx])
+
+    @y.setter
+    def y(self, value):
+        self.population.y[self.idx] = value
+
+    @property
+    def status(self):
+        return SIRStatus(self.population.status[self.idx])
+
+    @status.setter
+    def status(self, value):
+        self.population.set_status(np.array([self.idx]), value)
+
+    @property
+    def urgency(self):
+        return float(self.population.urgency[self.idx])
+
+    @urgency.setter
+    def urgency(self, value):
+        self.population.urgency[self.idx] = value
+
+
+class Population:
+    """A structure-of-arrays store for a population of SIRNodes
+
+       Each phase of the model step runs as one batched operation over
+       the whole population. Individual members can still be accessed
+       as SIRNodes through indexing and iteration.
+
+       Attributes
+        ----------
+        x : ndarray
+            The X coordinates of the nodes
+        y : ndarray
+            The Y coordinates of the nodes
+        status : ndarray
+            The SIRStatus values of the nodes
+        urgency : ndarray
+            The chance that each node acts on a given step
+        arena : PathArena
+            The paths of the nodes, one slot per node
+        rng : BlockRandom
+            The source of randomness of all nodes
+        index : StatusIndex
+            The nodes grouped by status
+        sir_map : SIRMap
+            The SIRMap the nodes live on
+        event_driven : boolean
+            Whether recoveries and actions are drawn as waiting times
+            instead of rolled for every node every step
+        recoveries : EventCalendar
+            The step every sick node recovers, if event-driven
+        actions : EventCalendar
+            The step every node not in quarantine next acts, if
+            event-driven
+        clock : integer
+            The number of move phases run so far
+
+       Event-driven populations draw the geometric waiting time to the
+       next success of the same per-step rolls, so the convalesce and
+       move phases only touch the nodes whose event is due (and the
+       quarantined nodes, which walk every step). A node's waiting
+       time is drawn at the first phase after it gets sick or may act,
+       with the recovery rate and urgency of that moment.
+    """
+    def __init__(self, size, sir_map, rng=None, event_driven=False):
+        self.sir_map = sir_map
+        self.rng = BlockRandom() if rng is None else rng
+        self.x = np.zeros(size, np.intp)
+        self.y = np.zeros(size, np.intp)
+        self.status = np.full(size, SIRStatus.SUSCEPTIBLE.value, np.uint8)
+        self.urgency = np.ones(size)
+        self.index = StatusIndex(self.status, STATUS_GROUPS)
+        self.arena = PathArena(size, sir_map.shape[1])
+        self.nodes = [PopulationNode(self, i) for i in range(size)]
+        self.event_driven = event_driven
+        self.clock = 0
+        if event_driven:
+            self.recoveries = EventCalendar(size)
+            self.actions = EventCalendar(size)
+            self.actions.hold(np.arange(size))
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def __getitem__(self, idx):
+        return self.nodes[idx]
+
+    def __iter__(self):
+        return iter(self.nodes)
+
+    def has_status(self, *statuses):
+        """Creates a mask of the nodes with any of the given statuses
+
+        Parameters
+        ----------
+        *statuses : SIRStatus
+            The statuses to select
+
+        Returns
+        -------
+        ndarray
+            Boolean mask over the population
+        """
+        mask = self.status == statuses[0].value
+        for status in statuses[1:]:
+            mask |= self.status == status.value
+        return mask
+
+    def members(self, *statuses):
+        """Lists the nodes with any of the given statuses
+
+        Parameters
+        ----------
+        *statuses : SIRStatus
+            Statuses that are adjacent in STATUS_GROUPS
+
+        Returns
+        -------
+        ndarray
+            Node indices; a view that changes with `set_status`
+        """
+        return self.index.members_of(*(s.value for s in statuses))
+
+    def set_status(self, idx, status):
+        """Changes the status of the given nodes
+
+        Parameters
+        ----------
+        idx : ndarray
+            Indices of the nodes
+        status : SIRStatus
+            The new status
+        """
+        changed = idx[self.status[idx] != status.value]
+        for i in changed:
+            self.index.move(i, status.value)
+        if self.event_driven:
+            self._reschedule(changed, self.status[changed], status)
+        self.status[idx] = status.value
+
+    def _reschedule(self, idx, old, status):
+        sick = (SIRStatus.INFECTED.value, SIRStatus.QUARANTINED.value)
+        was_sick = np.isin(old, sick)
+        if status.value in sick:
+            self.recoveries.hold(idx[~was_sick])
+        else:
+            self.recoveries.cancel(idx[was_sick])
+        if status == SIRStatus.QUARANTINED:
+            self.actions.cancel(idx)
+        else:
+            self.actions.hold(idx[old == SIRStatus.QUARANTINED.value])
+
+    def _due(self, calendar, chance):
+        """Draws the events of the held nodes of a calendar and pops
+        the events due in the current step"""
+        held = calendar.take_held()
+        self._schedule(calendar, held, chance, self.clock - 1)
+        return calendar.pop(self.clock)
+
+    def _schedule(self, calendar, idx, chance, after):
+        waits = geometric(self.rng, np.broadcast_to(chance, len(self))[idx])
+        finite = np.isfinite(waits)
+        calendar.schedule(idx[finite], after + waits[finite].astype(np.int64))
+
+    def coordinates(self, mask):
+        """Stacks the coordinates of the selected nodes
+
+        Parameters
+        ----------
+        mask : ndarray
+            Boolean mask or index array over the population
+
+        Returns
+        -------
+        ndarray
+            `(n, 2)` array of `(x,y)` coordinates
+        """
+        return np.column_stack((self.x[mask], self.y[mask]))
+
+    def follow_paths(self, idx):
+        """Moves the given nodes to the next waypoint of their paths
+
+        Parameters
+        ----------
+        idx : ndarray
+            Indices of the nodes to move
+
+        Returns
+        -------
+        ndarray
+            Boolean mask over `idx` of the nodes that had a waypoint left
+        """
+        moving, x, y = self.arena.advance(idx)
+        self.x[idx[moving]] = x
+        self.y[idx[moving]] = y
+        return moving
+
+    def droplet_spread(self):
+        """Contaminates the areas occupied by all contagious nodes
+        """
+        contagious = self.members(SIRStatus.INFECTED)
+        self.sir_map.contaminate(self.x[contagious], self.y[contagious])
+
+    def droplet_expose(self):
+        """Simulates infection of all susceptible nodes by residue disease
+        """
+        susceptible = self.members(SIRStatus.SUSCEPTIBLE).copy()
+        virus_level = self.sir_map.virus_level(
+            self.x[susceptible], self.y[susceptible])
+        rolls = self.rng.integers(0, 256, susceptible.size)
+        self.set_status(susceptible[rolls < virus_level], SIRStatus.INFECTED)
+
+    def contact_expose(self, attack_rate, radius=0, sources=None):
+        """Simulates infection of susceptible nodes near contagious ones
+
+        Every contagious node within `radius` of a susceptible node
+        independently infects it with chance `attack_rate`.
+
+        Parameters
+        ----------
+        attack_rate : float
+            The aggressiveness of the disease
+        radius : float, optional
+            The largest distance of a contact, by default 0 (same position)
+        sources : (ndarray, ndarray), optional
+            The X and Y coordinates of contagious nodes outside the
+            population, e.g. those of a neighbouring map strip
+        """
+        contagious = self.members(SIRStatus.INFECTED)
+        x, y = self.x[contagious], self.y[contagious]
+        if sources is not None:
+            x = np.concatenate((x, sources[0]))
+            y = np.concatenate((y, sources[1]))
+        susceptible = self.members(SIRStatus.SUSCEPTIBLE).copy()
+        if x.size == 0 or susceptible.size == 0:
+            return
+
+        grid = SpatialHash(x, y, np.ceil(radius))
+        contacts = grid.count(
+            self.x[susceptible], self.y[susceptible], radius)
+        chance = 1 - (1 - attack_rate) ** contacts
+        infected = self.rng.random(susceptible.size) < chance
+        self.set_status(susceptible[infected], SIRStatus.INFECTED)
+
+    def convalesce(self, recovery_rate):
+        """Simulates the possibility of infected nodes recovering
+
+        Parameters
+        ----------
+        recovery_rate : float
+            The chance that an individual will recover (e.g. 0.02)
+        """
+        if self.event_driven:
+            recovered = self._due(self.recoveries, recovery_rate)
+        else:
+            sick = self.members(SIRStatus.INFECTED, SIRStatus.QUARANTINED)
+            recovered = sick[self.rng.random(sick.size) < recovery_rate]
+        self.set_status(recovered, SIRStatus.RECOVERED)
+        targets = self.sir_map.sample(
+            'open', recovered.size, self.rng,
+            near=(self.x[recovered], self.y[recovered]))
+        for i, x, y in zip(recovered, *targets):
+            self.nodes[i].pathfind((x, y))
+
+    def move(self):
+        """Movement decision making for all nodes
+        """
+        if self.event_driven:
+            self.follow_paths(self.members(SIRStatus.QUARANTINED).copy())
+            acting = self._due(self.actions, self.urgency)
+            self._schedule(self.actions, acting, self.urgency, self.clock)
+            infected = acting[
+                self.status[acting] == SIRStatus.INFECTED.value]
+            isolating = infected[self.rng.random(infected.size) < 0.05]
+        else:
+            quarantined = self.has_status(SIRStatus.QUARANTINED)
+            self.follow_paths(np.flatnonzero(quarantined))
+
+            acting = ~quarantined & (self.rng.random(len(self)) <= self.urgency)
+            isolating = (acting & self.has_status(SIRStatus.INFECTED)
+                         & (self.rng.random(len(self)) < 0.05))
+            acting = np.flatnonzero(acting & ~isolating)
+            isolating = np.flatnonzero(isolating)
+
+        for i in isolating:
+            self.nodes[i].pathfind_region('quarantine')
+        self.set_status(isolating, SIRStatus.QUARANTINED)
+
+        if self.event_driven:
+            acting = acting[~np.isin(acting, isolating)]
+        idle = acting[~self.follow_paths(acting)]
+        self.new_task(idle)
+        self.clock += 1
+
+    def new_task(self, idx):
+        """Defines new tasks / paths for the given nodes
+
+        Parameters
+        ----------
+        idx : ndarray
+            Indices of the nodes without a task
+        """
+        rand = self.rng.random(idx.size)
+        for i in idx[rand < 0.1]:
+            self.nodes[i].pathfind_region('target')
+        for i in idx[(rand >= 0.1) & (rand < 0.2)]:
+            self.nodes[i].pathfind_region('start')
+        wander = idx[(rand >= 0.2) & (rand < 0.5)]
+        targets = self.sir_map.sample(
+            'valid', wander.size, self.rng,
+            near=(self.x[wander], self.y[wander]))
+        for i, x, y in zip(wander, *targets):
+            self.nodes[i].pathfind((x, y))
+        self.random_move(idx[rand >= 0.5])
+
+    def take(self, idx):
+        """Removes the given nodes, e.g. to hand them to another process
+
+        Parameters
+        ----------
+        idx : ndarray
+            Indices of the nodes to remove
+
+        Returns
+        -------
+        dict
+            The `x`, `y`, `status` and `urgency` of the removed nodes
+            and their remaining paths as `waypoints` and
+            `path_lengths`, in the order of `idx`, as `extend` takes them
+        """
+        state = dict(x=self.x[idx], y=self.y[idx], status=self.status[idx],
+                     urgency=self.urgency[idx])
+        state['waypoints'], state['path_lengths'] = self.arena.export(idx)
+
+        keep = np.ones(len(self), bool)
+        keep[idx] = False
+        keep = np.flatnonzero(keep)
+        self.x, self.y = self.x[keep], self.y[keep]
+        self.status, self.urgency = self.status[keep], self.urgency[keep]
+        self.arena.select(keep)
+        if self.event_driven:
+            self.recoveries.select(keep)
+            self.actions.select(keep)
+        self._resized()
+        return state
+
+    def extend(self, state):
+        """Adds nodes after the existing ones
+
+        Event-driven populations draw the waiting times of the new
+        nodes afresh, which the geometric distribution allows.
+
+        Parameters
+        ----------
+        state : dict
+            The state of the new nodes, as returned by `take`
+        """
+        first = len(self)
+        for name in ('x', 'y', 'status', 'urgency'):
+            array = getattr(self, name)
+            setattr(self, name, np.concatenate(
+                (array, np.asarray(state[name], array.dtype))))
+        self.arena.extend(state['waypoints'], state['path_lengths'])
+        self._resized()
+        if self.event_driven:
+            new = np.arange(first, len(self))
+            self.recoveries.extend(new.size)
+            self.actions.extend(new.size)
+            self.reschedule(new)
+
+    def reschedule(self, idx):
+        """Draws new waiting times for the events of the given nodes
+
+        Parameters
+        ----------
+        idx : ndarray
+            Indices of the nodes, e.g. after their status was restored
+        """
+        status = self.status[idx]
+        sick = ((status == SIRStatus.INFECTED.value)
+                | (status == SIRStatus.QUARANTINED.value))
+        self.recoveries.cancel(idx)
+        self.recoveries.hold(idx[sick])
+        self.actions.cancel(idx)
+        self.actions.hold(idx[status != SIRStatus.QUARANTINED.value])
+
+    def _resized(self):
+        self.index.rebuild(self.status)
+        size = self.x.size
+        del self.nodes[size:]
+        self.nodes += [PopulationNode(self, i)
+                       for i in range(len(self.nodes), size)]
+
+    def random_place(self, idx):
+        """Places the given nodes at random positions of the start region
+
+        Parameters
+        ----------
+        idx : ndarray
+            Indices of the nodes to place
+        """
+        self.x[idx], self.y[idx] = self.sir_map.sample(
+            'start', idx.size, self.rng)
+
+    def random_move(self, idx):
+        """Simulates random movement of the given nodes
+
+        Parameters
+        ----------
+        idx : ndarray
+            Indices of the nodes to move
+        """
+        rand = self.rng.random(idx.size)
+        moved = np.zeros(idx.size, bool)
+        for threshold, dx, dy in (
+                (0.2, 1, 0), (0.4, -1, 0), (0.6, 0, 1), (0.8, 0, -1)):
+            x, y = self.x[idx] + dx, self.y[idx] + dy
+            step = ~moved & (rand < threshold) & self.sir_map.enterable(x, y)
+            self.x[idx[step]] = x[step]
+            self.y[idx[step]] = y[step]
+            moved |= step
 
 
 class SIRMap:
@@ -230,11 +779,63 @@ class SIRMap:
         layout : ndarray
             A matrix specifying whether a position is filled
         miasma : ndarray
-            A matrix specifying whether a position is infectious
+            A matrix specifying whether a position is infectious; a
+            copy when the field is tiled
+        miasma_field : MiasmaField or TiledMiasmaField
+            The field holding and updating the miasma
+        flow_fields : dict
+            Distance fields of the terrain regions,
+            computed on first use
+        components : ndarray
+            Connected component of every graph node
+        region_tables : dict
+            Flat indices of the cells of every terrain region, and of
+            its part in one component under `(region, component)` keys
+        pathfinder : Pathfinder
+            The point-to-point path search backend
+        profiler : Profiler
+            Receives the path search timings and counts
+        planner : PathPlanner or None
+            Collects the point-to-point path requests of the nodes to
+            answer them in batches, None to search on every request
+
+       With `cache` True or a directory, a map image is compiled once
+       and kept in an on-disk cache keyed by its content hash, which
+       later maps of the same image memory-map instead of recomputing.
+       True caches in `map_cache.default_cache_dir()`, i.e.
+       `$SIR_MAP_CACHE` or `~/.cache/sir_model/maps`; by default
+       nothing is written. With a
+       `miasma_tile` size the miasma is stored in tiles allocated only
+       where there is contamination, for maps too large to decay and
+       diffuse as a whole every step.
     """
-    def __init__(self, mapfile):
-        self.load_map(mapfile)
-        self.miasma = np.zeros(self.shape, np.uint8)
+    REGIONS = ('start', 'target', 'quarantine')
+    MASKS = ('open', 'walls', 'start', 'target', 'quarantine', 'valid')
+    GRAPH_ARRAYS = ('cells', 'node_id', 'indptr', 'indices')
+    # regions that destinations are sampled from
+    TABLE_REGIONS = ('open', 'valid', 'start', 'target', 'quarantine')
+
+    def __init__(self, mapfile, decay_shift=2, diffusion=0.0, pathfinder='jps',
+                 cache=False, miasma_tile=None):
+        # mapfile is an image path or the arrays of a compiled map;
+        # cache is a bool or the directory of the compiled map cache
+        if isinstance(mapfile, dict):
+            self.load_compiled(mapfile)
+        elif cache:
+            self.load_compiled(cached_arrays(
+                mapfile, self._compile_file,
+                None if cache is True else cache))
+        else:
+            self.load_map(mapfile)
+        self.pathfinder = PATHFINDERS[pathfinder](self.graph)
+        if miasma_tile:
+            self.miasma_field = TiledMiasmaField(
+                self.shape, self.walls, decay_shift, diffusion, miasma_tile)
+        else:
+            self.miasma_field = MiasmaField(
+                self.shape, self.walls, decay_shift, diffusion)
+        self.profiler = NULL_PROFILER
+        self.planner = None
 
     def load_map(self, mapfile):
         """
@@ -263,7 +864,68 @@ class SIRMap:
 
         # compute network graph
         self.graph = create_graph(self.walls)
+        self.components = self.graph.components()
+        self.flow_fields = {}
+        self.region_tables = {
+            region: np.flatnonzero(getattr(self, region))
+            for region in self.TABLE_REGIONS}
+
+    def load_compiled(self, arrays):
+        """
+        Load a map from the arrays of `compile` without recomputing them.
+
+        Parameters
+        ----------
+        arrays : dict
+            Compiled map arrays; they are used as-is and never written
+            to, so they may be read-only or shared memory.
+        """
+        self.img = arrays['img']
+        self.shape = self.img.shape[:2]
+        for name in self.MASKS:
+            setattr(self, name, arrays[name])
+        self.graph = GridGraph.from_arrays(
+            self.shape, *(arrays[name] for name in self.GRAPH_ARRAYS))
+        self.flow_fields = {
+            region: arrays[f'flow_{region}']
+            for region in self.REGIONS if f'flow_{region}' in arrays}
+
+        # maps compiled before the region tables existed lack them
+        if 'components' in arrays:
+            self.components = arrays['components']
+        else:
+            self.components = self.graph.components()
+        self.region_tables = {
+            region: arrays[f'cells_{region}'] if f'cells_{region}' in arrays
+            else np.flatnonzero(getattr(self, region))
+            for region in self.TABLE_REGIONS}
+
+    def compile(self):
+        """
+        Collect the terrain masks, graph and flow fields of the map.
+
+        Returns
+        -------
+        dict
+            Named arrays that `load_compiled` (or `SIRMap(arrays)`)
+            turns back into the same map.
+        """
+        arrays = {'img': self.img}
+        for name in self.MASKS:
+            arrays[name] = getattr(self, name)
+        for name in self.GRAPH_ARRAYS:
+            arrays[name] = getattr(self.graph, name)
+        arrays['components'] = self.components
+        for region in self.TABLE_REGIONS:
+            arrays[f'cells_{region}'] = self.region_tables[region]
+        for region in self.REGIONS:
+            arrays[f'flow_{region}'] = self.flow_field(region)
+        return arrays
     
+    def _compile_file(self, mapfile):
+        self.load_map(mapfile)
+        return self.compile()
+
     def _is_pixel_type(self, rgb):
         pixel_mask = np.all(self.img == rgb, axis=2)
         return pixel_mask
@@ -291,19 +953,232 @@ class SIRMap:
             return False
         else:
             return (self.valid[x,y] & np.uint8(role))
+
+    def enterable(self, x, y):
+        """Determines which of many positions are valid within the map
+
+        Parameters
+        ----------
+        x : ndarray
+            The X coordinates.
+        y : ndarray
+            The Y coordinates.
+
+        Returns
+        -------
+        ndarray
+            Boolean mask of the valid positions
+        """
+        inside = (x >= 0) & (x < self.shape[0]) & (y >= 0) & (y < self.shape[1])
+        inside[inside] = self.valid[x[inside], y[inside]]
+        return inside
         
+    def find_path(self, start, target):
+        """Computes the shortest path between two points
+
+        Parameters
+        ----------
+        start : (int, int)
+            `(x,y)` coordinate tuple to path from
+        target : (int, int)
+            `(x,y)` coordinate tuple to path to
+
+        Returns
+        -------
+        list of tuples
+            The `(x,y)` waypoints from `start` to `target`,
+            empty if `target` cannot be reached
+        """
+        profiler = self.profiler
+        if not profiler.enabled:
+            return self.pathfinder.find_path(start, target)
+
+        expanded = self.pathfinder.expanded
+        with profiler.phase('pathfind'):
+            path = self.pathfinder.find_path(start, target)
+        profiler.count('pathfind.calls')
+        profiler.count('pathfind.expanded', self.pathfinder.expanded - expanded)
+        profiler.count('pathfind.waypoints', len(path))
+        return path
+
+    def plan_path(self, start, target):
+        """Computes a path between two points whose later segments
+        may only be computed as they are walked
+
+        Parameters
+        ----------
+        start : (int, int)
+            `(x,y)` coordinate tuple to path from
+        target : (int, int)
+            `(x,y)` coordinate tuple to path to
+
+        Returns
+        -------
+        (list of tuples, iterator or None)
+            The first waypoints and the pending segments, see
+            `Pathfinder.plan`; `PathArena.store` takes both
+        """
+        profiler = self.profiler
+        if not profiler.enabled:
+            return self.pathfinder.plan(start, target)
+
+        expanded = self.pathfinder.expanded
+        with profiler.phase('pathfind'):
+            path, pending = self.pathfinder.plan(start, target)
+        profiler.count('pathfind.calls')
+        profiler.count('pathfind.expanded', self.pathfinder.expanded - expanded)
+        profiler.count('pathfind.waypoints', len(path))
+        return path, pending
+
+    def flow_field(self, region):
+        """Gets the distance field towards a terrain region
+
+        Parameters
+        ----------
+        region : str
+            Name of the terrain mask, e.g. `'target'`
+
+        Returns
+        -------
+        ndarray
+            Step distances, see `pathing.flow_field`
+        """
+        if region not in self.flow_fields:
+            self.flow_fields[region] = flow_field(
+                self.graph, getattr(self, region))
+        return self.flow_fields[region]
+
+    def component(self, x, y):
+        """Gets the connected component of one or many positions
+
+        Parameters
+        ----------
+        x : integer or ndarray
+            The X coordinates.
+        y : integer or ndarray
+            The Y coordinates.
+
+        Returns
+        -------
+        integer or ndarray
+            The component labels, -1 for walls
+        """
+        node = self.graph.node_id[np.asarray(x) * self.shape[1] + y]
+        return np.where(node >= 0, self.components[node], -1)
+
+    def region_cells(self, region, component=None):
+        """Gets the flat indices `x * width + y` of a terrain region
+
+        Parameters
+        ----------
+        region : str
+            One of `TABLE_REGIONS`
+        component : integer, optional
+            Only keep the cells in this connected component; if it
+            holds none of the region, the whole region is returned
+
+        Returns
+        -------
+        ndarray
+            The flat cell indices, computed once per map
+        """
+        cells = self.region_tables[region]
+        if component is None or component < 0:
+            return cells
+
+        key = (region, int(component))
+        if key not in self.region_tables:
+            node = self.graph.node_id[cells]
+            part = cells[(node >= 0) & (self.components[node] == component)]
+            self.region_tables[key] = part if part.size else cells
+        return self.region_tables[key]
+
+    def sample(self, region, k=None, rng=None, near=None):
+        """Draws random positions of a terrain region
+
+        Parameters
+        ----------
+        region : str
+            One of `TABLE_REGIONS`
+        k : integer, optional
+            The number of positions, by default a single one
+        rng : BlockRandom, optional
+            Source of randomness, by default fresh entropy
+        near : (int, int) or (ndarray, ndarray), optional
+            Positions whose connected component each draw is
+            restricted to, so the draws can be reached from them
+
+        Returns
+        -------
+        (int, int) or (ndarray, ndarray)
+            An `(x,y)` coordinate tuple, or the X and Y coordinates
+            of `k` positions
+        """
+        if rng is None:
+            rng = np.random.default_rng()
+
+        if k is None:
+            component = None if near is None else self.component(*near)
+            cells = self.region_cells(region, component)
+            return divmod(int(cells[rng.integers(0, cells.size)]),
+                          self.shape[1])
+
+        if near is None:
+            cells = self.region_cells(region)
+            picks = cells[rng.integers(0, cells.size, size=k)]
+        else:
+            component = np.broadcast_to(self.component(*near), (k,))
+            picks = np.empty(k, np.intp)
+            for label in np.unique(component):
+                at = np.flatnonzero(component == label)
+                cells = self.region_cells(region, label)
+                picks[at] = cells[rng.integers(0, cells.size, size=at.size)]
+        return np.divmod(picks, self.shape[1])
+
+    def path_to_region(self, start, region, target=None, rng=None):
+        """Computes a path into a terrain region from its flow field
+
+        Parameters
+        ----------
+        start : (int, int)
+            `(x,y)` coordinate tuple to path from
+        region : str
+            Name of the terrain mask, e.g. `'target'`
+        target : (int, int), optional
+            A point of the region to continue to once inside it,
+            by default the path ends at the nearest point of the region
+        rng : numpy.random.Generator, optional
+            Source of randomness for breaking ties, by default fresh entropy
+
+        Returns
+        -------
+        list of tuples
+            The `(x,y)` waypoints from `start` into the region
+        """
+        with self.profiler.phase('flow_path'):
+            path = follow_flow(self.flow_field(region), start, rng)
+        if path is None:
+            path = [] if target is None else self.find_path(start, target)
+        elif target is not None and path[-1] != tuple(target):
+            path += self.find_path(path[-1], target)[1:]
+        self.profiler.count('flow_path.calls')
+        self.profiler.count('flow_path.waypoints', len(path))
+        return path
+
+    @property
+    def miasma(self):
+        return self.miasma_field.to_dense()
+
     def virus_level(self, x, y):
-        return self.miasma[x,y]
+        return self.miasma_field.virus_level(x, y)
         
     def contaminate(self, x, y, concentration=0b01111111):
-        self.miasma[x,y] |= np.uint8(concentration)
+        self.miasma_field.contaminate(x, y, concentration)
     
     def ventilate(self):
-        """Simulates the ventilation of the map?
+        """Simulates the ventilation of the map
         """
-        for i in range(self.shape[0]):
-            for j in range(self.shape[1]):
-                self.miasma[i,j] >>= 2
+        self.miasma_field.ventilate()
     
 
 class SIRModel:
@@ -319,96 +1194,448 @@ class SIRModel:
             The aggressiveness of the disease
         recovery_rate : float
             The possibility of recovery from disease
-        population : list of SIRNodes
+        population : list of SIRNodes or Population
             The individuals within the Map
         sir_map : SIRMap
             The SIRMap connected
+        vectorized : boolean
+            Whether the population is stored as arrays and stepped in batches
+        event_driven : boolean
+            Whether the vectorized population draws waiting times for
+            recoveries and actions instead of rolling them every step
+        miasma_decay : integer
+            Number of bits the miasma level is shifted down every step
+        miasma_diffusion : float
+            Fraction of the miasma that spreads to open neighbours every step
+        miasma_tile : integer or None
+            Side of the tiles of a sparse miasma field, None for dense
+        pathfinder : str
+            Name of the path search backend, one of `pathing.PATHFINDERS`
+        contact_transmission : boolean
+            Whether nodes also infect each other by direct contact
+        contact_radius : float
+            The largest distance between two nodes in contact
+        rng : BlockRandom
+            The source of randomness of the model; the same seed
+            always reproduces the same epidemic
+        arena : PathArena
+            The paths of all nodes
+        status_index : StatusIndex
+            The nodes grouped by status, kept up to date on every change
+        steps : integer
+            The number of steps simulated so far
+        recorders : list
+            Recorders, e.g. TrajectoryRecorder, called after every step
+        profiler : Profiler
+            Receives the phase timings and counts of every step
+        path_workers : integer or None
+            None to search every path as it is requested, otherwise
+            the number of worker processes the path requests of every
+            phase are planned on in one batch, 0 for none
+
+       `map_cache` is passed to SIRMap as `cache`: False (the default)
+       compiles the map image in memory only, True or a directory
+       also caches it on disk.
     """
+    # parameters saved with checkpoints
+    PARAMETERS = (
+        'attack_rate', 'recovery_rate', 'vectorized',
+        'miasma_decay', 'miasma_diffusion', 'pathfinder',
+        'contact_transmission', 'contact_radius', 'miasma_tile',
+        'event_driven', 'path_workers')
+
     def __init__(
         self, mapfile, 
         population=400, carriers=8,
-        attack_rate=0.8, recovery_rate=0.02):
+        attack_rate=0.8, recovery_rate=0.02,
+        vectorized=False, miasma_decay=2, miasma_diffusion=0.0,
+        pathfinder='jps', contact_transmission=True, contact_radius=0,
+        seed=None, map_cache=False, miasma_tile=None, path_workers=None,
+        event_driven=False):
+        if event_driven and not vectorized:
+            raise ValueError('event-driven scheduling needs the vectorized '
+                             'population')
     
-        self.sir_map = SIRMap(mapfile)
+        self.sir_map = SIRMap(
+            mapfile, miasma_decay, miasma_diffusion, pathfinder, map_cache,
+            miasma_tile)
 
         self.attack_rate = attack_rate
         self.recovery_rate = recovery_rate
-        self.population = []
+        self.vectorized = vectorized
+        self.event_driven = event_driven
+        self.miasma_decay = miasma_decay
+        self.miasma_diffusion = miasma_diffusion
+        self.miasma_tile = miasma_tile
+        self.pathfinder = pathfinder
+        self.contact_transmission = contact_transmission
+        self.contact_radius = contact_radius
+        self.rng = BlockRandom(seed)
+        self.steps = 0
+        self.recorders = []
+        self.profiler = NULL_PROFILER
 
-        for i in range(population):
-            self.population.append(SIRNode(0, 0, self.sir_map))
+        self._create_population(population)
+        self.path_workers = path_workers
+        if path_workers is not None:
+            self.sir_map.planner = PathPlanner(
+                self.sir_map, self.arena, pathfinder, path_workers)
+        if self.vectorized:
+            self.population.random_place(np.arange(population))
+        else:
+            for p in self.population:
+                p.random_place()
             
         for p in self.population:
-            p.random_place()
-            p.pathfind(random_idx(self.sir_map.target))
-            p.urgency = np.random.uniform(0.4, 0.95)
+            p.pathfind_region('target')
+            p.urgency = self.rng.uniform(0.4, 0.95)
             
         #Node locations were random, so this doesn't have to be.
         for i in range(carriers):
             self.population[i].infect()
-            
+
+    def _create_population(self, size):
+        if self.vectorized:
+            self.population = Population(
+                size, self.sir_map, self.rng, self.event_driven)
+            self.arena = self.population.arena
+            self.status_index = self.population.index
+        else:
+            self.arena = PathArena(size, self.sir_map.shape[1])
+            self.status_index = StatusIndex(
+                np.full(size, SIRStatus.SUSCEPTIBLE.value), STATUS_GROUPS)
+            self.population = []
+            for i in range(size):
+                p = SIRNode(0, 0, self.sir_map, self.arena, slot=i, rng=self.rng)
+                p.status_index = self.status_index
+                self.population.append(p)
             
     def model_step(self):
         """Steps the simulation forward one iteration
         """
-        for p in self.population:
-            p.droplet_spread()
-            p.convalesce(self.recovery_rate)
-            
-        for p in self.population:
-            p.move()
-            p.droplet_expose()
+        profiler = self.profiler
+        profiler.begin_step()
+        code = SIRStatus.SUSCEPTIBLE.value
+        susceptible = self.status_index.count(code)
+
+        if self.vectorized:
+            with profiler.phase('spread'):
+                self.population.droplet_spread()
+            with profiler.phase('convalesce'):
+                self.population.convalesce(self.recovery_rate)
+            self.plan_paths()
+            with profiler.phase('move'):
+                self.population.move()
+            with profiler.phase('droplet_expose'):
+                self.population.droplet_expose()
+        else:
+            with profiler.phase('spread+convalesce'):
+                for p in self.population:
+                    p.droplet_spread()
+                    p.convalesce(self.recovery_rate)
+            self.plan_paths()
+
+            with profiler.phase('move+droplet_expose'):
+                for p in self.population:
+                    p.move()
+                    p.droplet_expose()
+
+        # only infection takes nodes out of the susceptible group
+        exposed = self.status_index.count(code)
+        profiler.count('infections.droplet', susceptible - exposed)
             
-        self.sir_map.ventilate()
-         
-        '''
-        for p1 in self.population:
-            for p2 in self.population:
-                if p1.x == p2.x and p1.y == p2.y:
-                    p1.expose(p2, self.attack_rate)
-                    '''
+        with profiler.phase('ventilate'):
+            self.sir_map.ventilate()
+
+        if self.contact_transmission:
+            with profiler.phase('contact_expose'):
+                self.contact_expose()
+            profiler.count(
+                'infections.contact', exposed - self.status_index.count(code))
+
+        self.plan_paths()
+        self.steps += 1
+        with profiler.phase('record'):
+            for recorder in self.recorders:
+                recorder.record(self)
+        profiler.end_step(self.steps)
+
+    def plan_paths(self):
+        """Answers the path requests batched since the last call
+
+        Called between the phases of a step, so every node that asked
+        for a path has it before it next moves.
+        """
+        planner = self.sir_map.planner
+        if planner is not None:
+            with self.profiler.phase('plan_paths'):
+                planner.flush()
+
+    def close(self):
+        """Stops the path planning worker processes, if any
+        """
+        if self.sir_map.planner is not None:
+            self.sir_map.planner.close()
+
+    def attach_profiler(self, profiler=None):
+        """Profiles the following steps
+
+        The phases are `spread`, `convalesce`, `move` and
+        `droplet_expose` (merged into `spread+convalesce` and
+        `move+droplet_expose` for per-node populations, which
+        interleave them), `ventilate`, `contact_expose` and `record`,
+        with the `pathfind` and `flow_path` searches nested inside,
+        and `plan_paths` when path requests are batched.
+
+        Parameters
+        ----------
+        profiler : Profiler, optional
+            The profiler to report to, by default none, which stops
+            profiling
+        """
+        self.profiler = NULL_PROFILER if profiler is None else profiler
+        self.sir_map.profiler = self.profiler
+
+    def attach_recorder(self, recorder):
+        """Records the current state and every following step
+
+        Parameters
+        ----------
+        recorder : TrajectoryRecorder
+            Any object with a `record(model)` method
+        """
+        self.recorders.append(recorder)
+        recorder.record(self)
+
+    def contact_expose(self):
+        """Exposes every susceptible Node to the contagious Nodes near it
+        """
+        if self.vectorized:
+            self.population.contact_expose(
+                self.attack_rate, self.contact_radius)
+            return
+
+        contagious = [p for p in self.population if p.is_contagious()]
+        susceptible = [p for p in self.population if p.is_susceptible()]
+        if not contagious or not susceptible:
+            return
+
+        grid = SpatialHash(
+            [p.x for p in contagious], [p.y for p in contagious],
+            np.ceil(self.contact_radius))
+        pairs = grid.pairs(
+            [p.x for p in susceptible], [p.y for p in susceptible],
+            self.contact_radius)
+        for i, j in zip(*pairs):
+            susceptible[i].expose(contagious[j], self.attack_rate)
 
     def get_model_size(self):
         return self.sir_map.shape
 
+    def state_arrays(self):
+        """Collects the per-node state of the population
+
+        Returns
+        -------
+        (ndarray, ndarray, ndarray, ndarray)
+            The X and Y coordinates, SIRStatus values and urgencies
+            of all Nodes
+        """
+        if self.vectorized:
+            return (self.population.x, self.population.y,
+                    self.population.status, self.population.urgency)
+        return (np.array([p.x for p in self.population], np.intp),
+                np.array([p.y for p in self.population], np.intp),
+                np.array([p.status.value for p in self.population], np.uint8),
+                np.array([p.urgency for p in self.population], np.float64))
+
+    def save_checkpoint(self, file, include_map=True):
+        """Writes the full simulation state to an uncompressed npz file
+
+        The checkpoint holds the population, the remaining paths and
+        events, the miasma, the random stream and the step counter, so
+        a restored model continues exactly as this one would. Writing to an
+        `io.BytesIO` allows branching without touching the disk.
+
+        Parameters
+        ----------
+        file : str or file-like
+            Where to write the checkpoint
+        include_map : boolean, optional
+            Whether to store the compiled map too, so restoring needs
+            neither the map image nor `sir_map`, by default True
+        """
+        rng_state, rng_block = self.rng.get_state()
+        meta = {name: getattr(self, name) for name in self.PARAMETERS}
+        meta.update(version=CHECKPOINT_VERSION, steps=self.steps, rng=rng_state)
+
+        x, y, status, urgency = self.state_arrays()
+        waypoints, path_lengths = self.arena.export()
+        arrays = dict(
+            meta=np.array(json.dumps(meta)),
+            x=x, y=y, status=status, urgency=urgency,
+            members=self.status_index.members,
+            waypoints=waypoints, path_lengths=path_lengths,
+            miasma=self.sir_map.miasma, rng_block=rng_block)
+        if self.event_driven:
+            arrays.update(recovery_due=self.population.recoveries.due,
+                          action_due=self.population.actions.due)
+        if include_map:
+            for name, array in self.sir_map.compile().items():
+                arrays['map_' + name] = array
+
+        np.savez(file, **arrays)
+
+    @classmethod
+    def load_checkpoint(cls, file, sir_map=None):
+        """Restores a model written by `save_checkpoint`
+
+        A model saved with `path_workers` gets a new planner pool of
+        that size. Attached recorders and profilers are not part of
+        the checkpoint; attach them to the restored model again.
+
+        Parameters
+        ----------
+        file : str or file-like
+            The checkpoint to read
+        sir_map : SIRMap, optional
+            A map whose compiled data to reuse instead of the one
+            stored in the checkpoint; its miasma is left untouched
+
+        Returns
+        -------
+        SIRModel
+            The restored model
+        """
+        with np.load(file) as data:
+            meta = json.loads(str(data['meta']))
+            if meta['version'] != CHECKPOINT_VERSION:
+                raise ValueError(
+                    f'unsupported checkpoint version {meta["version"]}')
+
+            if sir_map is not None:
+                compiled = sir_map.compile()
+            else:
+                compiled = {name[4:]: data[name] for name in data.files
+                            if name.startswith('map_')}
+                if not compiled:
+                    raise ValueError('checkpoint has no map, pass sir_map')
+
+            model = cls.__new__(cls)
+            for name in cls.PARAMETERS:
+                # parameters added since are absent from old checkpoints
+                setattr(model, name, meta.get(name))
+            model.sir_map = SIRMap(
+                compiled, model.miasma_decay, model.miasma_diffusion,
+                model.pathfinder, miasma_tile=model.miasma_tile)
+            model.sir_map.miasma_field.load_dense(data['miasma'])
+            model.rng = BlockRandom()
+            model.rng.set_state((meta['rng'], data['rng_block']))
+            model.steps = meta['steps']
+            model.recorders = []
+            model.profiler = NULL_PROFILER
+
+            model._create_population(data['x'].size)
+            if model.path_workers is not None:
+                model.sir_map.planner = PathPlanner(
+                    model.sir_map, model.arena, model.pathfinder,
+                    model.path_workers)
+            model._restore_population(
+                data['x'], data['y'], data['status'], data['urgency'])
+            model.status_index.rebuild(data['status'], data['members'])
+            model.arena.load(data['waypoints'], data['path_lengths'])
+            if model.event_driven:
+                model.population.clock = model.steps
+                model.population.recoveries.load(data['recovery_due'])
+                model.population.actions.load(data['action_due'])
+
+        return model
+
+    def _restore_population(self, x, y, status, urgency):
+        if self.vectorized:
+            self.population.x[:] = x
+            self.population.y[:] = y
+            self.population.status[:] = status
+            self.population.urgency[:] = urgency
+            return
+
+        for i, p in enumerate(self.population):
+            p.x, p.y = int(x[i]), int(y[i])
+            p.status = SIRStatus(status[i])
+            p.urgency = float(urgency[i])
+
+    def status_counts(self):
+        """Counts the Nodes of every status in O(1)
+
+        Returns
+        -------
+        ndarray
+            The number of Nodes of each SIRStatus, in definition order
+            (susceptible, infected, recovered, quarantined)
+        """
+        return np.array([self.status_index.count(s.value) for s in SIRStatus])
+
+    def fill_coordinates(self, out, *statuses):
+        """Writes the coordinates of the Nodes of some statuses into a
+        preallocated array
+
+        Parameters
+        ----------
+        out : ndarray
+            Integer array of shape `(2, n)` with `n` at least the
+            population size; row 0 receives X and row 1 Y coordinates
+        *statuses : SIRStatus
+            Statuses that are adjacent in STATUS_GROUPS
+
+        Returns
+        -------
+        integer
+            The number of Nodes written
+        """
+        members = self.status_index.members_of(*(s.value for s in statuses))
+        n = members.size
+        if self.vectorized:
+            np.take(self.population.x, members, out=out[0, :n])
+            np.take(self.population.y, members, out=out[1, :n])
+        else:
+            for k, i in enumerate(members):
+                out[0, k], out[1, k] = self.population[i].x, self.population[i].y
+        return n
+
+    def _coordinates(self, *statuses):
+        members = self.status_index.members_of(*(s.value for s in statuses))
+        if self.vectorized:
+            return self.population.coordinates(members)
+        return np.array(
+            [(self.population[i].x, self.population[i].y) for i in members],
+            np.intp).reshape(-1, 2)
+
     def list_susceptible(self):
         """Creates a list of all coordinates of susceptible Nodes
 
         Returns
         -------
-        list of tuples
-            The list of susceptible node coordinates
+        ndarray
+            The `(n, 2)` array of susceptible node coordinates
         """
-        ret = []
-        for p in self.population:
-            if p.is_susceptible():
-                ret.append((p.x, p.y))
-        return np.array(ret)
+        return self._coordinates(SIRStatus.SUSCEPTIBLE)
     
     def list_infected(self):
         """Creates a list of all coordinates of infected Nodes
 
         Returns
         -------
-        list of tuples
-            The list of infected node coordinates
+        ndarray
+            The `(n, 2)` array of infected and quarantined node coordinates
         """
-        ret = []
-        for p in self.population:
-            if p.is_contagious() or p.is_quarantined():
-                ret.append((p.x, p.y))
-        return np.array(ret)
+        return self._coordinates(SIRStatus.INFECTED, SIRStatus.QUARANTINED)
     
     def list_recovered(self):
         """Creates a list of all coordinates of recovered Nodes
 
         Returns
         -------
-        list of tuples
-            The list of recovered node coordinates
+        ndarray
+            The `(n, 2)` array of recovered node coordinates
         """
-        ret = []
-        for p in self.population:
-            if p.status is SIRStatus.RECOVERED:
-                ret.append((p.x, p.y))
-        return np.array(ret)
+        return self._coordinates(SIRStatus.RECOVERED)
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+
+class StatusIndex:
+    """Nodes partitioned by status, maintained incrementally
+
+       All node ids live in one permutation array, grouped by status,
+       with the group boundaries kept alongside. Counting a group is
+       O(1), listing it is proportional to its size, and moving a node
+       to another group costs a few swaps.
+
+       Attributes
+        ----------
+        codes : tuple of integer
+            The status codes in group order; adjacent groups can be
+            listed together as one contiguous slice
+        members : ndarray
+            Node ids ordered by group
+        position : ndarray
+            The index of every node in `members`
+        bounds : ndarray
+            Group `g` is `members[bounds[g]:bounds[g+1]]`
+    """
+    def __init__(self, status, codes):
+        self.codes = tuple(codes)
+        self.group_of = np.full(max(self.codes) + 1, -1, np.intp)
+        self.group_of[list(self.codes)] = np.arange(len(self.codes))
+        self.rebuild(status)
+
+    def rebuild(self, status, members=None):
+        """Recomputes the partition from scratch
+
+        Parameters
+        ----------
+        status : ndarray
+            The status code of every node
+        members : ndarray, optional
+            A saved `members` order to restore, by default node id order
+            within every group
+        """
+        self.group = self.group_of[status]
+        if members is None:
+            members = np.argsort(self.group, kind='stable')
+        self.members = np.array(members, np.intp)
+        self.position = np.empty_like(self.members)
+        self.position[self.members] = np.arange(self.members.size)
+        self.bounds = np.zeros(len(self.codes) + 1, np.intp)
+        np.cumsum(np.bincount(self.group, minlength=len(self.codes)),
+                  out=self.bounds[1:])
+
+    def _swap(self, i, j):
+        a, b = self.members[i], self.members[j]
+        self.members[i], self.members[j] = b, a
+        self.position[a], self.position[b] = j, i
+
+    def move(self, node, code):
+        """Moves a node to the group of a status
+
+        Parameters
+        ----------
+        node : integer
+            The node id
+        code : integer
+            The new status code
+        """
+        g, target = self.group[node], self.group_of[code]
+        while g < target:
+            # hand the node over the end boundary of its group
+            self._swap(self.position[node], self.bounds[g + 1] - 1)
+            self.bounds[g + 1] -= 1
+            g += 1
+        while g > target:
+            self._swap(self.position[node], self.bounds[g])
+            self.bounds[g] += 1
+            g -= 1
+        self.group[node] = target
+
+    def count(self, code):
+        """Counts the nodes of a status in O(1)
+
+        Parameters
+        ----------
+        code : integer
+            The status code
+
+        Returns
+        -------
+        integer
+            The number of nodes
+        """
+        g = self.group_of[code]
+        return int(self.bounds[g + 1] - self.bounds[g])
+
+    def members_of(self, *codes):
+        """Lists the nodes of adjacent status groups
+
+        Parameters
+        ----------
+        *codes : integer
+            Status codes of groups that are adjacent in `codes`
+
+        Returns
+        -------
+        ndarray
+            Node ids; a view that changes as nodes move
+        """
+        groups = sorted(self.group_of[list(codes)])
+        if groups[-1] - groups[0] != len(groups) - 1:
+            raise ValueError('status groups are not adjacent')
+        return self.members[self.bounds[groups[0]]:self.bounds[groups[-1] + 1]]
@@ -0,0 +1,13 @@
+import os
+import sys
+
+import pytest
+
+# the modules live flat in the repository root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture
+def small_map():
+    return os.path.join(ROOT, 'mapfiles', 'scenario_small.png')
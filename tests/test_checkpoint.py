@@ -0,0 +1,53 @@
+import io
+
+import numpy as np
+import pytest
+
+from sir_model import SIRModel
+
+
+def branch(model):
+    buffer = io.BytesIO()
+    model.save_checkpoint(buffer)
+    buffer.seek(0)
+    return SIRModel.load_checkpoint(buffer)
+
+
+def assert_same_state(a, b):
+    for x, y in zip(a.state_arrays(), b.state_arrays()):
+        assert np.array_equal(x, y)
+    assert np.array_equal(a.sir_map.miasma, b.sir_map.miasma)
+    assert np.array_equal(a.status_counts(), b.status_counts())
+
+
+@pytest.mark.parametrize('params', [
+    dict(vectorized=False),
+    dict(vectorized=True),
+    dict(vectorized=True, event_driven=True),
+    dict(vectorized=True, pathfinder='hpa', miasma_tile=8),
+])
+def test_restored_model_continues_identically(small_map, params):
+    model = SIRModel(small_map, population=120, seed=11, map_cache=False,
+                     **params)
+    for _ in range(15):
+        model.model_step()
+    restored = branch(model)
+    assert restored.steps == model.steps
+    for _ in range(30):
+        model.model_step()
+        restored.model_step()
+    assert_same_state(model, restored)
+
+
+def test_restored_model_keeps_its_path_planner(small_map):
+    model = SIRModel(small_map, population=60, seed=2, map_cache=False,
+                     vectorized=True, path_workers=0)
+    for _ in range(5):
+        model.model_step()
+    restored = branch(model)
+    assert restored.path_workers == 0
+    assert restored.sir_map.planner is not None
+    for _ in range(10):
+        model.model_step()
+        restored.model_step()
+    assert_same_state(model, restored)
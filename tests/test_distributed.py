@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+from distributed import DistributedModel
+from sir_model import SIRModel
+
+
+PARAMS = dict(population=150, carriers=6, seed=8, contact_radius=1.5,
+              miasma_diffusion=0.1)
+
+
+def test_one_worker_matches_sir_model(small_map):
+    model = SIRModel(small_map, vectorized=True, miasma_tile=8, **PARAMS)
+    with DistributedModel(small_map, workers=1, miasma_tile=8,
+                          **PARAMS) as distributed:
+        for _ in range(40):
+            model.model_step()
+            distributed.model_step()
+            assert np.array_equal(distributed.status_counts(),
+                                  model.status_counts())
+        for a, b in zip(distributed.state_arrays(), model.state_arrays()):
+            assert np.array_equal(a, b)
+        assert np.array_equal(distributed.miasma(), model.sir_map.miasma)
+
+
+@pytest.mark.parametrize('workers', [2, 3])
+def test_strips_keep_every_node(small_map, workers):
+    with DistributedModel(small_map, workers=workers, **PARAMS) as model:
+        for _ in range(30):
+            model.model_step()
+            assert model.status_counts().sum() == PARAMS['population']
+        x, y, status, _ = model.state_arrays()
+        assert x.size == PARAMS['population']
+        assert np.array_equal(
+            np.bincount(status, minlength=5)[1:], model.status_counts())
@@ -0,0 +1,58 @@
+import numpy as np
+
+from events import HELD, UNSCHEDULED, EventCalendar, geometric
+from rng import BlockRandom
+
+
+def test_pop_returns_the_events_due():
+    calendar = EventCalendar(6)
+    calendar.schedule(np.array([0, 1, 2, 3]), np.array([5, 3, 5, 4]))
+    assert calendar.pop(3).tolist() == [1]
+    assert calendar.pop(4).tolist() == [3]
+    assert calendar.pop(5).tolist() == [0, 2]
+    assert calendar.pop(6).tolist() == []
+    assert (calendar.due == UNSCHEDULED).all()
+
+
+def test_rescheduled_and_cancelled_events_are_dropped():
+    calendar = EventCalendar(4)
+    calendar.schedule(np.array([0, 1, 2]), np.array([2, 2, 2]))
+    calendar.schedule(np.array([0]), np.array([3]))
+    calendar.cancel(np.array([1]))
+    assert calendar.pop(2).tolist() == [2]
+    assert calendar.pop(3).tolist() == [0]
+
+
+def test_held_nodes_are_taken_once():
+    calendar = EventCalendar(5)
+    calendar.hold(np.array([3, 1]))
+    calendar.hold(np.array([1, 4]))
+    calendar.cancel(np.array([4]))
+    assert calendar.due[[1, 3]].tolist() == [HELD, HELD]
+    assert calendar.take_held().tolist() == [1, 3]
+    assert calendar.take_held().tolist() == []
+
+
+def test_select_extend_and_load_keep_events():
+    calendar = EventCalendar(4)
+    calendar.schedule(np.array([0, 1, 3]), np.array([7, 8, 7]))
+    calendar.hold(np.array([2]))
+    calendar.select(np.array([3, 2, 1]))
+    calendar.extend(2)
+    assert calendar.due.tolist() == [7, HELD, 8, UNSCHEDULED, UNSCHEDULED]
+
+    restored = EventCalendar(0)
+    restored.load(calendar.due)
+    assert restored.take_held().tolist() == [1]
+    assert restored.pop(7).tolist() == [0]
+    assert restored.pop(8).tolist() == [2]
+
+
+def test_geometric_waiting_times():
+    rng = BlockRandom(24)
+    chance = np.repeat([0.0, 0.02, 0.5, 1.0], 20000)
+    steps = geometric(rng, chance).reshape(4, -1)
+    assert np.isinf(steps[0]).all()
+    assert (steps[1:] >= 1).all() and (steps[3] == 1).all()
+    assert abs(steps[1].mean() - 50) < 2
+    assert abs(steps[2].mean() - 2) < 0.05
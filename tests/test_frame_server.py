@@ -0,0 +1,143 @@
+import base64
+import os
+import socket
+import struct
+import urllib.request
+import zlib
+
+import numpy as np
+
+from frame_server import (
+    FRAME_HEADER, FRAME_MESSAGE, MAP_HEADER, MAP_MESSAGE, FrameClient,
+    FrameServer, terrain_codes)
+from sir_model import SIRModel
+
+
+def receive(sock, n):
+    data = b''
+    while len(data) < n:
+        chunk = sock.recv(n - len(data))
+        if not chunk:
+            raise EOFError
+        data += chunk
+    return data
+
+
+def receive_message(sock):
+    first, second = receive(sock, 2)
+    n = second & 0x7f
+    if n == 126:
+        n, = struct.unpack('!H', receive(sock, 2))
+    elif n == 127:
+        n, = struct.unpack('!Q', receive(sock, 8))
+    payload = receive(sock, n)
+    return first & 0x0f, payload[0], zlib.decompress(payload[1:])
+
+
+def connect(port):
+    sock = socket.create_connection(('127.0.0.1', port))
+    key = base64.b64encode(os.urandom(16))
+    sock.sendall(b'GET /ws HTTP/1.1\r\nHost: localhost\r\n'
+                 b'Upgrade: websocket\r\nConnection: Upgrade\r\n'
+                 b'Sec-WebSocket-Key: ' + key + b'\r\n'
+                 b'Sec-WebSocket-Version: 13\r\n\r\n')
+    response = b''
+    while not response.endswith(b'\r\n\r\n'):
+        response += receive(sock, 1)
+    assert response.startswith(b'HTTP/1.1 101')
+    return sock
+
+
+class Viewer:
+    """Applies frames like frame_viewer.html does"""
+    def __init__(self, height, width, tile):
+        self.tile = tile
+        self.grid_width = -(-width // tile)
+        self.miasma = np.zeros((-(-height // tile) * tile,
+                                self.grid_width * tile), np.uint8)
+        self.x = self.y = np.zeros(0, np.uint16)
+        self.status = np.zeros(0, np.uint8)
+        self.step = None
+
+    def apply(self, body):
+        self.step, agents, n, tiles = FRAME_HEADER.unpack_from(body)
+        if agents != self.status.size:
+            self.x, self.y = np.zeros((2, agents), np.uint16)
+            self.status = np.zeros(agents, np.uint8)
+        offset = FRAME_HEADER.size
+        arrays = []
+        for dtype, count in ((np.uint32, n), (np.uint32, tiles),
+                             (np.uint16, n), (np.uint16, n), (np.uint8, n)):
+            arrays.append(np.frombuffer(body, dtype, count, offset))
+            offset += arrays[-1].nbytes
+        ids, tile_ids, x, y, status = arrays
+        self.x[ids], self.y[ids], self.status[ids] = x, y, status
+        T = self.tile
+        levels = np.frombuffer(body, np.uint8, tiles * T * T, offset)
+        for k, tile_id in enumerate(tile_ids.tolist()):
+            tx, ty = divmod(tile_id, self.grid_width)
+            self.miasma[tx * T:(tx + 1) * T, ty * T:(ty + 1) * T] = \
+                levels[k * T * T:(k + 1) * T * T].reshape(T, T)
+
+
+def test_browser_state_follows_the_model(small_map):
+    model = SIRModel(small_map, population=120, seed=25, vectorized=True)
+    with FrameServer(model.sir_map, port=0, miasma_tile=16) as server:
+        model.attach_recorder(server)
+        url = f'http://127.0.0.1:{server.port}/'
+        assert b'<canvas' in urllib.request.urlopen(url).read()
+
+        sock = connect(server.port)
+        sock.settimeout(5)
+        opcode, kind, body = receive_message(sock)
+        assert (opcode, kind) == (0x2, MAP_MESSAGE)
+        height, width, tile, _ = MAP_HEADER.unpack_from(body)
+        codes = np.frombuffer(body, np.uint8, offset=MAP_HEADER.size)
+        assert np.array_equal(codes.reshape(height, width),
+                              terrain_codes(model.sir_map))
+
+        viewer = Viewer(height, width, tile)
+        for _ in range(25):
+            model.model_step()
+        while viewer.step != model.steps:
+            opcode, kind, body = receive_message(sock)
+            assert kind == FRAME_MESSAGE
+            viewer.apply(body)
+
+        x, y, status, _ = model.state_arrays()
+        assert np.array_equal(viewer.x, x)
+        assert np.array_equal(viewer.y, y)
+        assert np.array_equal(viewer.status, status)
+        assert np.array_equal(viewer.miasma[:height, :width],
+                              model.sir_map.miasma)
+
+        # a masked close frame is answered with a close frame
+        sock.sendall(bytes((0x88, 0x82)) + b'\0\0\0\0' + b'\x03\xe8')
+        assert receive(sock, 4) == b'\x88\x02\x03\xe8'
+        sock.close()
+
+
+def test_slow_clients_get_coalesced_frames(small_map):
+    model = SIRModel(small_map, population=60, seed=3, vectorized=True)
+    server = FrameServer(model.sir_map, port=0, miasma_tile=16)
+    client = FrameClient(0, server.nonzero)
+    server.clients.add(client)
+
+    def ingest():
+        x, y, status, _ = model.state_arrays()
+        server._latest = (model.steps, x.astype(np.uint16),
+                          y.astype(np.uint16), status.copy(),
+                          model.sir_map.miasma.copy())
+        server._ingest()
+
+    ingest()
+    for _ in range(6):
+        model.model_step()
+        ingest()
+    frame = server._frame(client)
+    assert not client.nodes.any() and not client.tiles.any()
+
+    viewer = Viewer(*model.sir_map.shape, 16)
+    viewer.apply(zlib.decompress(frame[1:]))
+    assert viewer.step == 6
+    assert np.array_equal(viewer.status, model.state_arrays()[2])
@@ -0,0 +1,21 @@
+import os
+
+import numpy as np
+
+from sir_model import SIRMap
+
+
+def test_maps_are_not_cached_by_default(small_map, tmp_path, monkeypatch):
+    monkeypatch.setenv('SIR_MAP_CACHE', str(tmp_path))
+    SIRMap(small_map)
+    assert os.listdir(tmp_path) == []
+
+
+def test_cached_map_matches_the_compiled_one(small_map, tmp_path):
+    fresh = SIRMap(small_map).compile()
+    SIRMap(small_map, cache=str(tmp_path))
+    assert len(os.listdir(tmp_path)) == 1
+    cached = SIRMap(small_map, cache=str(tmp_path)).compile()
+    assert sorted(cached) == sorted(fresh)
+    for name, array in fresh.items():
+        assert np.array_equal(cached[name], array)
@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from miasma import MiasmaField, TiledMiasmaField
+
+
+@pytest.mark.parametrize('decay_shift, diffusion', [(2, 0.0), (1, 0.2),
+                                                    (0, 0.05)])
+def test_tiled_levels_equal_dense(decay_shift, diffusion):
+    rng = np.random.default_rng(20)
+    shape = (45, 37)
+    walls = rng.random(shape) < 0.2
+    dense = MiasmaField(shape, walls, decay_shift, diffusion)
+    tiled = TiledMiasmaField(shape, walls, decay_shift, diffusion, tile=8)
+    for step in range(60):
+        # contaminate only now and then, so tiles decay and are freed
+        if step % 7 < 3:
+            n = int(rng.integers(1, 12))
+            x = rng.integers(shape[0], size=n)
+            y = rng.integers(shape[1], size=n)
+            level = int(rng.integers(1, 256))
+            dense.contaminate(x, y, level)
+            tiled.contaminate(x, y, level)
+        dense.ventilate()
+        tiled.ventilate()
+        assert np.array_equal(tiled.to_dense(), dense.to_dense())
+        x, y = rng.integers(shape[0], size=30), rng.integers(shape[1], size=30)
+        assert np.array_equal(tiled.virus_level(x, y), dense.virus_level(x, y))
+    if decay_shift:
+        assert tiled.count < tiled.grid[0] * tiled.grid[1]
+
+
+def test_tiled_rows_round_trip():
+    rng = np.random.default_rng(3)
+    levels = (rng.random((30, 20)) < 0.1) * rng.integers(1, 256, (30, 20))
+    levels = levels.astype(np.uint8)
+    tiled = TiledMiasmaField(levels.shape, tile=8)
+    tiled.load_dense(levels)
+    assert np.array_equal(tiled.to_dense(), levels)
+    assert np.array_equal(tiled.rows(5, 19), levels[5:19])
+
+    tiled.load_rows(10, np.zeros((4, 20), np.uint8))
+    levels[10:14] = 0
+    assert np.array_equal(tiled.to_dense(), levels)
@@ -0,0 +1,96 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from pathing import PATHFINDERS, PathArena, create_graph
+
+
+def random_walls(rng, shape, density):
+    walls = rng.random(shape) < density
+    walls[[0, -1], :] = True
+    walls[:, [0, -1]] = True
+    return walls
+
+
+def assert_valid(path, walls, start, target):
+    assert path[0] == start and path[-1] == target
+    for (x0, y0), (x1, y1) in zip(path, path[1:]):
+        assert abs(x1 - x0) + abs(y1 - y0) == 1
+        assert not walls[x1, y1]
+
+
+@pytest.mark.parametrize('name', ['astar', 'jps', 'networkx'])
+def test_shortest_path_lengths_match_bfs(name):
+    rng = np.random.default_rng(5)
+    for density in (0.0, 0.15, 0.3, 0.4):
+        walls = random_walls(rng, (24, 31), density)
+        graph = create_graph(walls)
+        reference = PATHFINDERS['bfs'](graph)
+        finder = PATHFINDERS[name](graph)
+        cells = np.argwhere(~walls)
+        for _ in range(40):
+            start, target = (tuple(int(v) for v in cells[k])
+                             for k in rng.integers(len(cells), size=2))
+            expected = reference.find_path(start, target)
+            path = finder.find_path(start, target)
+            assert len(path) == len(expected)
+            if path:
+                assert_valid(path, walls, start, target)
+
+
+def test_path_arena_keeps_paths_through_compaction():
+    rng = np.random.default_rng(6)
+    width, slots = 50, 12
+    arena = PathArena(slots, width, capacity=16)
+    expected = [[] for _ in range(slots)]
+    for _ in range(500):
+        slot = int(rng.integers(slots))
+        if rng.random() < 0.3:
+            n = int(rng.integers(0, 20))
+            path = [divmod(int(i), width)
+                    for i in rng.integers(width * 40, size=n)]
+            arena.store(slot, path)
+            expected[slot] = path
+        else:
+            waypoint = arena.next_waypoint(slot)
+            queue = expected[slot]
+            assert waypoint == (queue.pop(0) if queue else None)
+        for k in range(slots):
+            assert arena.remaining(k) == expected[k]
+    arena.compact()
+    assert arena.end == sum(map(len, expected))
+    assert all(arena.remaining(k) == expected[k] for k in range(slots))
+
+
+def test_path_arena_export_select_extend():
+    width = 10
+    arena = PathArena(4, width, capacity=4)
+    paths = [[(1, 1), (1, 2)], [], [(3, 3)], [(5, 5), (5, 6), (6, 6)]]
+    for slot, path in enumerate(paths):
+        arena.store(slot, path)
+    arena.next_waypoint(3)
+
+    waypoints, lengths = arena.export(np.array([3, 0]))
+    assert lengths.tolist() == [2, 2]
+    assert waypoints.tolist() == [56, 66, 11, 12]
+
+    arena.select(np.array([2, 1]))
+    arena.extend(waypoints, lengths)
+    assert [arena.remaining(k) for k in range(4)] == [
+        [(3, 3)], [], [(5, 6), (6, 6)], [(1, 1), (1, 2)]]
+
+    other = PathArena(0, width)
+    other.load(*arena.export())
+    assert [other.remaining(k) for k in range(4)] == [
+        arena.remaining(k) for k in range(4)]
+
+
+def test_model_imports_without_networkx():
+    # a None entry in sys.modules makes `import networkx` fail
+    code = ('import sys; sys.modules["networkx"] = None; '
+            'import sir_model, pathing')
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.run([sys.executable, '-c', code], check=True, cwd=root)
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from pathing import PathArena
+from planner import PathPlanner
+from sir_model import SIRMap, SIRModel
+
+
+@pytest.mark.parametrize('processes', [0, 2])
+def test_flush_stores_shortest_paths(small_map, processes):
+    sir_map = SIRMap(small_map)
+    rng = np.random.default_rng(22)
+    cells = np.argwhere(sir_map.valid)
+    arena = PathArena(40, sir_map.shape[1])
+    planner = PathPlanner(sir_map, arena, processes=processes, min_batch=1)
+    shared_target = tuple(int(v) for v in cells[0])
+    requests = {}
+    try:
+        for slot in range(40):
+            start = tuple(int(v) for v in cells[rng.integers(len(cells))])
+            target = (shared_target if slot % 3 == 0 else
+                      tuple(int(v) for v in cells[rng.integers(len(cells))]))
+            planner.request(slot, start, target)
+            requests[slot] = (start, target)
+        planner.flush()
+    finally:
+        planner.close()
+
+    assert planner.requests == {}
+    for slot, (start, target) in requests.items():
+        expected = sir_map.find_path(start, target)
+        path = arena.remaining(slot)
+        assert len(path) == len(expected)
+        if path:
+            assert path[0] == start and path[-1] == target
+
+
+def test_planned_model_matches_inline_planning(small_map):
+    params = dict(population=80, seed=5, vectorized=True)
+    inline = SIRModel(small_map, path_workers=0, **params)
+    pooled = SIRModel(small_map, path_workers=2, **params)
+    try:
+        for _ in range(20):
+            inline.model_step()
+            pooled.model_step()
+        for a, b in zip(inline.state_arrays(), pooled.state_arrays()):
+            assert np.array_equal(a, b)
+    finally:
+        pooled.close()
@@ -0,0 +1,43 @@
+import numpy as np
+
+from recorder import TrajectoryReader, TrajectoryRecorder
+from sir_model import SIRModel
+
+
+def test_reader_returns_what_was_recorded(small_map, tmp_path):
+    path = str(tmp_path / 'run.traj')
+    model = SIRModel(small_map, population=50, seed=4, map_cache=False,
+                     vectorized=True)
+    expected = []
+    # a small chunk makes the recorder flush many times
+    with TrajectoryRecorder(path, chunk_records=64) as recorder:
+        model.attach_recorder(recorder)
+        expected.append([a.copy() for a in model.state_arrays()[:3]])
+        for _ in range(12):
+            model.model_step()
+            expected.append([a.copy() for a in model.state_arrays()[:3]])
+
+    reader = TrajectoryReader(path)
+    assert reader.agents == 50 and len(reader) == 13
+    records = reader.steps(0, 13)
+    assert records.shape == (13, 50)
+    for step, (x, y, status) in enumerate(expected):
+        assert (records['step'][step] == step).all()
+        assert (records['node'][step] == np.arange(50)).all()
+        assert np.array_equal(records['x'][step], x)
+        assert np.array_equal(records['y'][step], y)
+        assert np.array_equal(records['status'][step], status)
+
+    track = reader.node(7, 3, 6)
+    assert track['x'].tolist() == [expected[s][0][7] for s in (3, 4, 5)]
+
+
+def test_empty_population(small_map, tmp_path):
+    path = str(tmp_path / 'empty.traj')
+    model = SIRModel(small_map, population=0, carriers=0, map_cache=False)
+    with TrajectoryRecorder(path) as recorder:
+        model.attach_recorder(recorder)
+        model.model_step()
+    reader = TrajectoryReader(path)
+    assert len(reader) == 0
+    assert reader.steps(0, 3).shape == (0, 0)
@@ -0,0 +1,8 @@
+from sir_model import SIRNode
+
+
+def test_node_without_a_map_keeps_a_plain_path():
+    node = SIRNode()
+    assert node.path == []
+    node.path = [(1, 2), (1, 3)]
+    assert node.path == [(1, 2), (1, 3)]
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from status_index import StatusIndex
+
+
+CODES = (1, 2, 4, 3)
+
+
+def assert_consistent(index, status):
+    assert sorted(index.members.tolist()) == list(range(status.size))
+    assert (index.members[index.position] == np.arange(status.size)).all()
+    for g, code in enumerate(CODES):
+        group = index.members[index.bounds[g]:index.bounds[g + 1]]
+        assert (status[group] == code).all()
+        assert index.count(code) == (status == code).sum()
+
+
+def test_moves_keep_the_partition():
+    rng = np.random.default_rng(13)
+    status = rng.choice(CODES, 200)
+    index = StatusIndex(status, CODES)
+    assert_consistent(index, status)
+    for _ in range(2000):
+        node, code = int(rng.integers(status.size)), int(rng.choice(CODES))
+        index.move(node, code)
+        status[node] = code
+    assert_consistent(index, status)
+
+
+def test_members_of_adjacent_groups():
+    status = np.array([3, 2, 4, 1, 2, 4])
+    index = StatusIndex(status, CODES)
+    assert sorted(index.members_of(2, 4).tolist()) == [1, 2, 4, 5]
+    assert sorted(index.members_of(4, 2).tolist()) == [1, 2, 4, 5]
+    with pytest.raises(ValueError):
+        index.members_of(1, 4)
+
+
+def test_rebuild_restores_a_saved_order():
+    rng = np.random.default_rng(1)
+    status = rng.choice(CODES, 50)
+    index = StatusIndex(status, CODES)
+    for node in rng.integers(50, size=30).tolist():
+        index.move(node, 3)
+        status[node] = 3
+    restored = StatusIndex(np.ones(50, int), CODES)
+    restored.rebuild(status, index.members)
+    assert (restored.members == index.members).all()
+    assert (restored.bounds == index.bounds).all()
+    assert_consistent(restored, status)